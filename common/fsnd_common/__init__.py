@@ -0,0 +1,3 @@
+"""
+Code shared by the apps in this repository
+"""
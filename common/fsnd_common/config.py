@@ -0,0 +1,40 @@
+"""
+Settings read from a Flask app's config, then the environment.
+
+Operational endpoints (/metrics, /db/pool, /db/queries) show route
+names, timings and database state, so apps only register them when
+OPS_ENDPOINTS is turned on, e.g. on a host only a monitoring network
+can reach.
+"""
+import os
+
+OPS_ENDPOINTS = False
+
+
+def setting(config, name, default, cast=int):
+    """
+    Read a setting from the config, then the environment
+    :param config: mapping, e.g. app.config
+    :param name:
+    :param default: returned when neither has the setting
+    :param cast: type to convert the value to, bool accepts 1/true/yes/on
+    :return: value
+    """
+    value = config.get(name, os.environ.get(name, None))
+
+    if value is None:
+        return default
+
+    if cast is bool and isinstance(value, str):
+        return value.lower() in ('1', 'true', 'yes', 'on')
+
+    return cast(value)
+
+
+def ops_endpoints(app):
+    """
+    Check whether the app should register its operational endpoints
+    :param app:
+    :return: bool
+    """
+    return setting(app.config, 'OPS_ENDPOINTS', OPS_ENDPOINTS, bool)
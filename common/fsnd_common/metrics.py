@@ -0,0 +1,398 @@
+"""
+Prometheus metrics for a Flask app, served on /metrics in the text
+exposition format, without any dependency besides Flask.
+
+    from fsnd_common.metrics import Metrics, sqlalchemy_pool_collector
+
+    metrics = Metrics(app)
+    metrics.add_collector(sqlalchemy_pool_collector(db))
+
+Records request latency histograms, requests in flight and responses by
+route and status. Collectors add gauges read at scrape time, such as
+database pool state or cache hit counts.
+
+Every worker process writes its own values, so no locks are shared
+between workers. With METRICS_DIR set (app config or environment) each
+worker keeps them in a memory mapped file in that directory and a scrape
+of any worker adds up the files of all of them. Clear the directory when
+deploying, old files are kept so counters of replaced workers still add
+up. Without METRICS_DIR values live in process memory, which is right
+for a single worker. Threads of a worker share its values behind a
+lock, taken once when a request starts and once for all the values it
+writes when it ends.
+
+Metrics are always recorded, but /metrics is only served when
+OPS_ENDPOINTS is turned on (see fsnd_common.config).
+"""
+import glob
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+
+from flask import g, request, Response
+
+from .config import ops_endpoints
+
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+                   5.0, 10.0, math.inf, ]
+
+COUNTER = 'counter'
+GAUGE = 'gauge'
+HISTOGRAM = 'histogram'
+
+HELP = {
+    'http_requests_total': (COUNTER, 'Responses sent, by route and status.'),
+    'http_requests_in_flight': (GAUGE, 'Requests being handled.'),
+    'http_request_duration_seconds': (HISTOGRAM,
+                                      'Time to handle a request.'),
+}
+
+_HEADER = struct.Struct('<Q')
+_ENTRY = struct.Struct('<I')
+_VALUE = struct.Struct('<d')
+
+
+def format_labels(labels):
+    """
+    Format labels as {name="value",...} with the values escaped
+    :param labels: dict
+    :return: str
+    """
+    if not labels:
+        return ''
+
+    return '{' + ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\')
+                         .replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in sorted(labels.items())) + '}'
+
+
+def format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+class MemoryValues:
+    """
+    Sample values of one worker kept in process memory
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def add(self, key, amount):
+        self.add_many([(key, amount)])
+
+    def add_many(self, amounts):
+        """
+        Add to several values under one lock
+        :param amounts: list of (key, amount)
+        """
+        with self._lock:
+            for key, amount in amounts:
+                self._values[key] = self._values.get(key, 0.0) + amount
+
+    def items(self):
+        with self._lock:
+            return list(self._values.items())
+
+
+class MmapValues:
+    """
+    Sample values of one worker kept in a memory mapped file that other
+    workers can read. The file starts with the number of bytes in use,
+    followed by entries of key length, key and value. The writer is the
+    only process changing the file, readers only see whole entries
+    because the used size is updated after an entry is written.
+    """
+
+    INITIAL_SIZE = 64 * 1024
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._offsets = {}
+
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            size = max(os.fstat(fd).st_size, self.INITIAL_SIZE)
+            os.ftruncate(fd, size)
+            self._map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+        self._used = _HEADER.unpack_from(self._map, 0)[0] or _HEADER.size
+        _HEADER.pack_into(self._map, 0, self._used)
+
+        for key, value, offset in read_entries(self._map, self._used):
+            self._offsets[key] = offset
+
+            # Gauges of an earlier process with the same pid are stale
+            if key.startswith(GAUGE):
+                _VALUE.pack_into(self._map, offset, 0.0)
+
+    def _allocate(self, key):
+        encoded = key.encode('utf-8')
+        padded = (_ENTRY.size + len(encoded) + 7) // 8 * 8
+        needed = self._used + padded + _VALUE.size
+
+        if needed > len(self._map):
+            size = len(self._map)
+            while size < needed:
+                size *= 2
+            self._map.resize(size)
+
+        _ENTRY.pack_into(self._map, self._used, len(encoded))
+        self._map[self._used + _ENTRY.size:
+                  self._used + _ENTRY.size + len(encoded)] = encoded
+        offset = self._used + padded
+        _VALUE.pack_into(self._map, offset, 0.0)
+
+        self._used = needed
+        _HEADER.pack_into(self._map, 0, self._used)
+        self._offsets[key] = offset
+        return offset
+
+    def add(self, key, amount):
+        self.add_many([(key, amount)])
+
+    def add_many(self, amounts):
+        """
+        Add to several values under one lock
+        :param amounts: list of (key, amount)
+        """
+        with self._lock:
+            for key, amount in amounts:
+                offset = self._offsets.get(key)
+                if offset is None:
+                    offset = self._allocate(key)
+                value = _VALUE.unpack_from(self._map, offset)[0]
+                _VALUE.pack_into(self._map, offset, value + amount)
+
+    def items(self):
+        with self._lock:
+            return [(key, value) for key, value, offset
+                    in read_entries(self._map, self._used)]
+
+
+def read_entries(buffer, used=None):
+    """
+    Parse the entries of a values file
+    :param buffer: bytes or mmap of the file
+    :param used: bytes in use, read from the file when None
+    :return: generator of (key, value, value offset)
+    """
+    if used is None:
+        if len(buffer) < _HEADER.size:
+            return
+        used = _HEADER.unpack_from(buffer, 0)[0]
+
+    offset = _HEADER.size
+
+    while offset < used:
+        length = _ENTRY.unpack_from(buffer, offset)[0]
+        key = bytes(buffer[offset + _ENTRY.size:
+                           offset + _ENTRY.size + length]).decode('utf-8')
+        offset += (_ENTRY.size + length + 7) // 8 * 8
+        yield key, _VALUE.unpack_from(buffer, offset)[0], offset
+        offset += _VALUE.size
+
+
+def _sort_key(item):
+    # Order histogram buckets by bound instead of as text
+    key = item[0]
+    start = key.find('le="')
+
+    if start < 0:
+        return key, 0.0
+
+    end = key.index('"', start + 4)
+    bound = key[start + 4:end]
+    return key[:start] + key[end:], math.inf if bound == '+Inf' \
+        else float(bound)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def sqlalchemy_pool_collector(db, prefix='db_pool'):
+    """
+    Collector for the connection pool of a Flask-SQLAlchemy db
+    :param db:
+    :param prefix: metric name prefix
+    :return: collector function
+    """
+
+    def collect():
+        pool = db.engine.pool
+
+        for name, method, description in (
+                ('size', 'size', 'Connections the pool keeps open.'),
+                ('checked_out', 'checkedout', 'Connections in use.'),
+                ('overflow', 'overflow',
+                 'Connections above the pool size, negative below it.')):
+            if hasattr(pool, method):
+                yield (f'{prefix}_{name}', GAUGE, description, {},
+                       getattr(pool, method)())
+
+        if hasattr(pool, 'waits'):
+            yield (f'{prefix}_waits_total', COUNTER,
+                   'Checkouts that waited for a connection.', {},
+                   pool.waits)
+
+    return collect
+
+
+class Metrics:
+    """
+    Flask extension recording request metrics and serving /metrics
+    """
+
+    def __init__(self, app=None, path='/metrics'):
+        self.path = path
+        self.collectors = []
+        self.values = None
+        self.directory = None
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.directory = app.config.get(
+            'METRICS_DIR', os.environ.get('METRICS_DIR', None))
+
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            self.values = MmapValues(os.path.join(
+                self.directory, f'metrics_{os.getpid()}.db'))
+        else:
+            self.values = MemoryValues()
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        if ops_endpoints(app):
+            app.add_url_rule(self.path, 'metrics', self.render)
+        app.extensions['metrics'] = self
+
+    def add_collector(self, collector):
+        """
+        Add a function returning samples of (name, type, help, labels,
+        value) to read at every scrape. Values come from the worker
+        serving the scrape.
+        :param collector:
+        """
+        self.collectors.append(collector)
+
+    def _before_request(self):
+        g.metrics_start = time.perf_counter()
+        self.values.add(GAUGE + '|http_requests_in_flight', 1)
+
+    def _after_request(self, response):
+        start = g.pop('metrics_start', None)
+
+        if start is None:
+            return response
+
+        seconds = time.perf_counter() - start
+        rule = request.url_rule.rule if request.url_rule else 'unmatched'
+        labels = {'method': request.method, 'route': rule}
+        name = HISTOGRAM + '|http_request_duration_seconds'
+
+        amounts = [
+            (GAUGE + '|http_requests_in_flight', -1),
+            (COUNTER + '|http_requests_total' + format_labels(
+                dict(labels, status=response.status_code)), 1),
+            (name + '_sum' + format_labels(labels), seconds),
+            (name + '_count' + format_labels(labels), 1),
+        ]
+        for bucket in LATENCY_BUCKETS:
+            if seconds <= bucket:
+                amounts.append((name + '_bucket' + format_labels(
+                    dict(labels, le=format_value(bucket))), 1))
+
+        self.values.add_many(amounts)
+        return response
+
+    def _teardown_request(self, exception):
+        # Only still set when _after_request did not run
+        if g.pop('metrics_start', None) is not None:
+            self.values.add(GAUGE + '|http_requests_in_flight', -1)
+
+    def samples(self):
+        """
+        Add up the values of every worker
+        :return: dict of key to value
+        """
+        totals = {}
+
+        if self.directory:
+            sources = []
+            for path in glob.glob(os.path.join(self.directory,
+                                               'metrics_*.db')):
+                pid = int(os.path.basename(path)[8:-3])
+                with open(path, 'rb') as values_file:
+                    sources.append((_pid_alive(pid),
+                                    list(read_entries(values_file.read()))))
+        else:
+            sources = [(True, [(key, value, None)
+                               for key, value in self.values.items()])]
+
+        for alive, entries in sources:
+            for key, value, offset in entries:
+                if key.startswith(GAUGE) and not alive:
+                    continue
+                totals[key] = totals.get(key, 0.0) + value
+
+        return totals
+
+    def render(self):
+        """
+        Serve the metrics in the Prometheus text format
+        :return: response
+        """
+        families = {}
+        descriptions = dict(HELP)
+
+        for key, value in sorted(self.samples().items(), key=_sort_key):
+            kind, sample = key.split('|', 1)
+            name = sample.split('{', 1)[0]
+            for suffix in ('_bucket', '_sum', '_count'):
+                if kind == HISTOGRAM and name.endswith(suffix):
+                    name = name[:-len(suffix)]
+            families.setdefault(name, (kind, []))[1].append(
+                f'{sample} {format_value(value)}')
+
+        for collector in self.collectors:
+            try:
+                samples = list(collector())
+            except Exception:
+                continue
+            for name, kind, description, labels, value in samples:
+                descriptions.setdefault(name, (kind, description))
+                families.setdefault(name, (kind, []))[1].append(
+                    f'{name}{format_labels(labels)} {format_value(value)}')
+
+        lines = []
+        for name, (kind, samples) in families.items():
+            description = descriptions.get(name, (kind, name))[1]
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(samples)
+
+        return Response('\n'.join(lines) + '\n',
+                        mimetype='text/plain; version=0.0.4')
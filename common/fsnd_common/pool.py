@@ -0,0 +1,114 @@
+"""
+Connection pool settings for the SQLAlchemy engine of a Flask app.
+
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(
+        database_path, app.config)
+
+Settings are read from the app config, then the environment. Pool sizes
+are per worker process, so size them against the database's
+max_connections divided by the number of workers. SQLite databases only
+get pool_pre_ping, their connections are cheap and not pooled the same
+way.
+"""
+import threading
+import time
+
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import QueuePool
+
+from .config import setting
+
+DB_POOL_SIZE = 5
+DB_MAX_OVERFLOW = 10
+DB_POOL_TIMEOUT = 30
+DB_POOL_RECYCLE = 30 * 60
+DB_POOL_PRE_PING = True
+# Milliseconds, 0 leaves the server default (no timeout). PostgreSQL only.
+DB_STATEMENT_TIMEOUT = 0
+
+
+class MeteredQueuePool(QueuePool):
+    """
+    QueuePool that also counts checkouts that had to wait for a
+    connection because the pool and its overflow were all in use
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._wait_lock = threading.Lock()
+        self.waits = 0
+        self.wait_time = 0.0
+
+    def _do_get(self):
+        if self._max_overflow < 0 or self._overflow < self._max_overflow \
+                or not self._pool.empty():
+            return super()._do_get()
+
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            with self._wait_lock:
+                self.waits += 1
+                self.wait_time += time.perf_counter() - start
+
+
+def engine_options(database_path, config=None):
+    """
+    Build the engine options for a database from DB_* settings in the
+    config or the environment
+    :param database_path: database URL
+    :param config: mapping, e.g. app.config
+    :return: dict for SQLALCHEMY_ENGINE_OPTIONS
+    """
+    config = config or {}
+    drivername = make_url(database_path).drivername
+    options = {
+        'pool_pre_ping': setting(config, 'DB_POOL_PRE_PING',
+                                 DB_POOL_PRE_PING, bool),
+    }
+
+    if drivername.startswith('sqlite'):
+        return options
+
+    options.update({
+        'poolclass': MeteredQueuePool,
+        'pool_size': setting(config, 'DB_POOL_SIZE', DB_POOL_SIZE),
+        'max_overflow': setting(config, 'DB_MAX_OVERFLOW',
+                                DB_MAX_OVERFLOW),
+        'pool_timeout': setting(config, 'DB_POOL_TIMEOUT',
+                                DB_POOL_TIMEOUT),
+        'pool_recycle': setting(config, 'DB_POOL_RECYCLE',
+                                DB_POOL_RECYCLE),
+    })
+
+    statement_timeout = setting(config, 'DB_STATEMENT_TIMEOUT',
+                                DB_STATEMENT_TIMEOUT)
+
+    if statement_timeout and drivername.startswith('postgres'):
+        options['connect_args'] = {
+            'options': f'-c statement_timeout={statement_timeout}'}
+
+    return options
+
+
+def pool_stats(engine):
+    """
+    Get the state of an engine's connection pool
+    :param engine: e.g. db.engine
+    :return: dict
+    """
+    pool = engine.pool
+    stats = {'pool': type(pool).__name__}
+
+    for name, method in (('size', 'size'),
+                         ('checked_in', 'checkedin'),
+                         ('checked_out', 'checkedout'),
+                         ('overflow', 'overflow')):
+        if hasattr(pool, method):
+            stats[name] = getattr(pool, method)()
+
+    stats['waits'] = getattr(pool, 'waits', 0)
+    stats['wait_seconds'] = round(getattr(pool, 'wait_time', 0.0), 6)
+
+    return stats
@@ -7,7 +7,9 @@ basedir = os.path.abspath(os.path.dirname(__file__))
 DEBUG = True
 
 # Connect to the database
+SQLALCHEMY_DATABASE_URI = os.environ.get(
+    'DATABASE_URL', 'postgresql://localhost:5432/fyyur')
+SQLALCHEMY_TRACK_MODIFICATIONS = False
 
-
-# TODO IMPLEMENT DATABASE URL
-SQLALCHEMY_DATABASE_URI = '<Put your local database url>'
+# Memory for rendered page fragments, per worker (see fragments.py)
+FRAGMENT_CACHE_BYTES = 64 * 1024 * 1024
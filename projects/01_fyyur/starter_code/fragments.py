@@ -0,0 +1,328 @@
+"""
+Cache of rendered page fragments, so pages whose data did not change
+are not rendered again.
+
+Templates cache part of a page with the cache tag, keyed by what the
+part shows and its version:
+
+    {% cache 'venue', venue_id, version %}
+      ...
+    {% endcache %}
+
+and views can do the same with cached_fragment(key, render).
+
+Versions come from the database: the updated_at of a venue or artist,
+which the listener below moves forward whenever the venue or artist, or
+a show or the other side of a show on its page, is written through the
+ORM. Reading a version is one small query, much cheaper than rendering
+the page, and an edit in any worker changes the key every worker uses.
+Old fragments are never served again and leave the cache as the least
+recently used ones.
+
+Values the cached part of a template shows can be passed as Lazy, so
+they are only loaded when the fragment has to be rendered.
+"""
+import sys
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from flask import current_app
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+from sqlalchemy import event, func, or_, select
+from sqlalchemy.orm import Session, attributes
+
+from models import db, Venue, Artist, Show
+from shows import upcoming_show_count
+
+FRAGMENT_CACHE_BYTES = 64 * 1024 * 1024
+
+STATS = ['hits', 'misses', 'evictions', ]
+
+_MISSING = object()
+
+
+class FragmentCache:
+    """
+    Keep rendered fragments in process memory, evicting the least
+    recently used ones when they take more than max_bytes. Fragments
+    bigger than the whole cache are not kept.
+    """
+
+    def __init__(self, max_bytes=FRAGMENT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._stats = dict.fromkeys(STATS, 0)
+
+    def get(self, key):
+        """
+        Get a cached fragment
+        :param key:
+        :return: str or None
+        """
+        with self._lock:
+            entry = self._entries.get(key, None)
+
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry[1]
+
+    def set(self, key, value):
+        """
+        Store a fragment
+        :param key: hashable, e.g. a tuple of what the fragment shows and
+            its version
+        :param value: str
+        :return: True if stored
+        """
+        size = sys.getsizeof(value)
+
+        if size > self.max_bytes:
+            return False
+
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[0]
+
+            self._entries[key] = (size, value)
+            self._bytes += size
+
+            while self._bytes > self.max_bytes:
+                self._bytes -= self._entries.popitem(last=False)[1][0]
+                self._stats['evictions'] += 1
+
+        return True
+
+    def stats(self):
+        """
+        Get the hit, miss and eviction counters
+        :return: dict
+        """
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries),
+                        bytes=self._bytes)
+
+
+class FragmentCacheExtension(Extension):
+    """
+    The {% cache key, ... %}...{% endcache %} template tag
+    """
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key = [parser.parse_expression()]
+
+        while parser.stream.skip_if('comma'):
+            key.append(parser.parse_expression())
+
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(
+            self.call_method('_cache', [nodes.Tuple(key, 'load')]),
+            [], [], body).set_lineno(lineno)
+
+    def _cache(self, key, caller):
+        return cached_fragment(key, caller)
+
+
+class Lazy:
+    """
+    A template value loaded the first time the template reads it.
+    Reads items of the loaded value as attributes, like Jinja does.
+    """
+
+    def __init__(self, load):
+        self._load = load
+        self._value = _MISSING
+
+    def _get(self):
+        if self._value is _MISSING:
+            self._value = self._load()
+
+        return self._value
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        try:
+            return self._get()[name]
+        except (KeyError, TypeError):
+            raise AttributeError(name)
+
+    def __getitem__(self, key):
+        return self._get()[key]
+
+    def __iter__(self):
+        return iter(self._get())
+
+    def __len__(self):
+        return len(self._get())
+
+
+def init_fragment_cache(app):
+    """
+    Attach a fragment cache to the app and add the cache tag to its
+    templates. A FRAGMENT_CACHE_BYTES of 0 turns caching off.
+    :param app:
+    :return: fragment cache
+    """
+    cache = FragmentCache(app.config.get('FRAGMENT_CACHE_BYTES',
+                                         FRAGMENT_CACHE_BYTES))
+    app.extensions['fyyur_fragment_cache'] = cache
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    return cache
+
+
+def get_fragment_cache():
+    return current_app.extensions['fyyur_fragment_cache']
+
+
+def cached_fragment(key, render):
+    """
+    Get a fragment from the cache, rendering and storing it if missing
+    :param key: hashable, e.g. a tuple of what the fragment shows and its
+        version
+    :param render: function returning the fragment
+    :return: Markup
+    """
+    cache = get_fragment_cache()
+    value = cache.get(key)
+
+    if value is None:
+        value = Markup(render())
+        cache.set(key, value)
+
+    return value
+
+
+def fragment_cache_samples():
+    """
+    Metrics collector for the fragment cache counters
+    :return: generator of (name, type, help, labels, value)
+    """
+    stats = get_fragment_cache().stats()
+
+    for name in STATS:
+        yield (f'fragment_cache_{name}_total', 'counter',
+               f'Fragment cache {name}.', {}, stats[name])
+
+    yield ('fragment_cache_entries', 'gauge', 'Fragments in the cache.',
+           {}, stats['entries'])
+    yield ('fragment_cache_bytes', 'gauge',
+           'Memory taken by cached fragments.', {}, stats['bytes'])
+
+
+def venue_version(venue_id, now=None):
+    """
+    Get the version of a venue page: the past and upcoming shows change
+    with time, so it includes the number of upcoming shows. The name
+    comes along for the parts of the page that are not cached.
+    :param venue_id:
+    :param now: defaults to the current time
+    :return: row of name, updated_at and num_upcoming_shows, or None if
+        there is no such venue
+    """
+    return db.session.query(
+        Venue.name, Venue.updated_at,
+        upcoming_show_count(Show.venue_id, Venue.id, now).label(
+            'num_upcoming_shows')).filter(Venue.id == venue_id).first()
+
+
+def artist_version(artist_id, now=None):
+    """
+    Get the version of an artist page, like venue_version()
+    :param artist_id:
+    :param now: defaults to the current time
+    :return: row of name, updated_at and num_upcoming_shows, or None if
+        there is no such artist
+    """
+    return db.session.query(
+        Artist.name, Artist.updated_at,
+        upcoming_show_count(Show.artist_id, Artist.id, now).label(
+            'num_upcoming_shows')).filter(Artist.id == artist_id).first()
+
+
+def shows_version():
+    """
+    Get the version of the show listing. Adding, moving or deleting a
+    show touches its venue and artist, and deleting a venue or artist
+    touches the other side of its shows, so the latest updated_at of
+    each is enough. Both are read from their index.
+    :return: tuple
+    """
+    return tuple(db.session.query(
+        select([func.max(Venue.updated_at)]).as_scalar(),
+        select([func.max(Artist.updated_at)]).as_scalar()).one())
+
+
+def _show_ids(show, name):
+    # Venue or artist ids of a show, before and after this flush
+    history = attributes.get_history(show, name)
+    return {value for value in history.sum() if value is not None}
+
+
+@event.listens_for(Session, 'before_flush')
+def _touch_changed_pages(session, flush_context, instances):
+    # Move updated_at forward on every venue and artist whose page shows
+    # something written in this flush: itself, its shows, or the name and
+    # image of the venue or artist of one of its shows
+    now = datetime.utcnow()
+    venue_ids = set()
+    artist_ids = set()
+    # Venues and artists whose show partners are touched
+    venue_partners = set()
+    artist_partners = set()
+
+    for target in session.new:
+        if isinstance(target, Show):
+            venue_ids.update(_show_ids(target, 'venue_id'))
+            artist_ids.update(_show_ids(target, 'artist_id'))
+
+    for target in session.dirty:
+        if not session.is_modified(target):
+            continue
+
+        if isinstance(target, Venue):
+            target.updated_at = now
+            venue_partners.add(target.id)
+        elif isinstance(target, Artist):
+            target.updated_at = now
+            artist_partners.add(target.id)
+        elif isinstance(target, Show):
+            venue_ids.update(_show_ids(target, 'venue_id'))
+            artist_ids.update(_show_ids(target, 'artist_id'))
+
+    for target in session.deleted:
+        if isinstance(target, Venue):
+            venue_partners.add(target.id)
+        elif isinstance(target, Artist):
+            artist_partners.add(target.id)
+        elif isinstance(target, Show):
+            venue_ids.update(_show_ids(target, 'venue_id'))
+            artist_ids.update(_show_ids(target, 'artist_id'))
+
+    for model, ids, partners, column, partner_column in (
+            (Venue, venue_ids, artist_partners, Show.venue_id,
+             Show.artist_id),
+            (Artist, artist_ids, venue_partners, Show.artist_id,
+             Show.venue_id)):
+        touched = []
+
+        if ids:
+            touched.append(model.id.in_(ids))
+        if partners:
+            touched.append(model.id.in_(select([column]).where(
+                partner_column.in_(partners))))
+
+        if touched:
+            session.execute(model.__table__.update().where(
+                or_(*touched)).values(updated_at=now))
@@ -0,0 +1,237 @@
+"""
+Genres of venues and artists, and how many venues and artists each
+genre has per state.
+
+Genres are rows of the Genre table, linked to venues and artists through
+the venue_genres and artist_genres tables, which are indexed from both
+sides: "jazz venues in CA" reads the venue ids of the genre from the
+index and fetches only those venues.
+
+The counts shown as facets are kept in GenreFacet, one row per genre
+and state, and adjusted in the same transaction as every venue or
+artist written through the ORM, so reading them takes one small query
+however many venues and artists there are. rebuild-genre-facets
+recounts them, e.g. after writing venues or artists with plain SQL.
+"""
+from collections import Counter
+
+import click
+from sqlalchemy import event, func, text
+from sqlalchemy.orm import Session, attributes
+
+from models import (db, Genre, GenreFacet, Venue, Artist, Show,
+                    venue_genres, artist_genres)
+from shows import upcoming_show_count
+
+# State counted for venues and artists that have none
+NO_STATE = ''
+
+# Facet column, join table and show column of venues and artists
+GENRE_MODELS = {
+    Venue: ('venues', venue_genres.c.venue_id, Show.venue_id),
+    Artist: ('artists', artist_genres.c.artist_id, Show.artist_id),
+}
+
+# PostgreSQL and SQLite (3.24 or newer) both support this upsert
+_COUNT_GENRES = text(
+    'INSERT INTO "GenreFacet" (genre_id, state, venues, artists) '
+    'VALUES (:genre_id, :state, :venues, :artists) '
+    'ON CONFLICT (genre_id, state) DO UPDATE '
+    'SET venues = "GenreFacet".venues + excluded.venues, '
+    'artists = "GenreFacet".artists + excluded.artists')
+
+
+def genres_named(names):
+    """
+    Get the genres of a list of names, adding the ones that do not exist
+    yet to the session
+    :param names: genre names, e.g. from the genres field of a form
+    :return: list of Genre
+    """
+    names = list(dict.fromkeys(name.strip() for name in names
+                               if name.strip()))
+
+    if not names:
+        return []
+
+    genres = {genre.name: genre for genre in
+              Genre.query.filter(Genre.name.in_(names))}
+
+    for name in names:
+        if name not in genres:
+            genres[name] = Genre(name=name)
+            db.session.add(genres[name])
+
+    return [genres[name] for name in names]
+
+
+def genre_facets(state=None):
+    """
+    Get the number of venues and artists of every genre, all over or in
+    one state
+    :param state: state code, or None for every state
+    :return: list of dicts of id, name, venues and artists, by name
+    """
+    query = db.session.query(
+        Genre.id, Genre.name, func.sum(GenreFacet.venues),
+        func.sum(GenreFacet.artists)).join(
+        GenreFacet, GenreFacet.genre_id == Genre.id)
+
+    if state is not None:
+        query = query.filter(GenreFacet.state == state)
+
+    rows = query.group_by(Genre.id, Genre.name).order_by(Genre.name).all()
+
+    return [{'id': genre_id, 'name': name, 'venues': venues or 0,
+             'artists': artists or 0}
+            for genre_id, name, venues, artists in rows
+            if venues or artists]
+
+
+def genre_members(model, genre_id, state=None, now=None):
+    """
+    Get the venues or artists of a genre, optionally in one state, with
+    their number of upcoming shows. Reads the genre's entries of the join
+    table index, then the matching venues or artists by primary key.
+
+    :param model: Venue or Artist
+    :param genre_id:
+    :param state: state code, or None for every state
+    :param now: defaults to the current time
+    :return: dict of count and data, like search()
+    """
+    facet, owner_id, show_column = GENRE_MODELS[model]
+    upcoming = upcoming_show_count(show_column, model.id, now)
+
+    query = db.session.query(
+        model.id, model.name, upcoming.label('num_upcoming_shows')).join(
+        owner_id.table, owner_id == model.id).filter(
+        owner_id.table.c.genre_id == genre_id)
+
+    if state is not None:
+        query = query.filter(model.state == state)
+
+    data = [{'id': row.id, 'name': row.name,
+             'num_upcoming_shows': row.num_upcoming_shows}
+            for row in query.order_by(model.name, model.id)]
+
+    return {'count': len(data), 'data': data}
+
+
+def count_genres(session, changes):
+    """
+    Adjust the genre facets in the session's transaction, so they are
+    committed or rolled back together with what they count
+    :param session:
+    :param changes: Counter of (genre_id, state, 'venues' or 'artists')
+        to venues or artists added, negative for removed
+    """
+    rows = [{'genre_id': genre_id, 'state': state,
+             'venues': count if facet == 'venues' else 0,
+             'artists': count if facet == 'artists' else 0}
+            for (genre_id, state, facet), count in changes.items() if count]
+
+    if rows:
+        session.execute(_COUNT_GENRES, rows)
+
+
+def rebuild_genre_facets():
+    """
+    Recount the venues and artists of every genre and state. Venue and
+    artist writes wait until the new counts are committed, so none is
+    lost or counted twice.
+    :return: number of genres of venues and artists counted
+    """
+    session = db.session
+
+    if db.engine.dialect.name == 'postgresql':
+        session.execute('LOCK TABLE "GenreFacet" IN EXCLUSIVE MODE')
+
+    changes = Counter()
+
+    for model, (facet, owner_id, show_column) in GENRE_MODELS.items():
+        rows = session.query(
+            owner_id.table.c.genre_id, model.state, func.count()).join(
+            model, owner_id == model.id).group_by(
+            owner_id.table.c.genre_id, model.state)
+
+        for genre_id, state, count in rows:
+            changes[genre_id, state or NO_STATE, facet] += count
+
+    session.query(GenreFacet).delete(synchronize_session=False)
+    count_genres(session, changes)
+    session.commit()
+
+    return sum(changes.values())
+
+
+def init_genres(app):
+    """
+    Register the rebuild-genre-facets command
+    :param app:
+    """
+
+    @app.cli.command('rebuild-genre-facets')
+    def rebuild_genre_facets_command():
+        """Recount the venues and artists per genre and state."""
+        counted = rebuild_genre_facets()
+        click.echo(f"Counted {counted} genres of venues and artists")
+
+
+def _history(target, name):
+    # (old values, new values) of an attribute, as in the database before
+    # this flush and after it
+    history = attributes.get_history(target, name)
+    old = list(history.unchanged or ()) + list(history.deleted or ())
+    new = list(history.unchanged or ()) + list(history.added or ())
+    return old, new
+
+
+def _state(values):
+    return (values[0] if values else None) or NO_STATE
+
+
+@event.listens_for(Session, 'before_flush')
+def _collect_genre_changes(session, flush_context, instances):
+    # Genres added in this flush have no id yet: count them by Genre and
+    # write the counts once the flush has inserted them
+    changes = flush_context.attributes['genre_changes'] = Counter()
+
+    for target in session.new:
+        if type(target) in GENRE_MODELS:
+            facet = GENRE_MODELS[type(target)][0]
+            for genre in target.genres:
+                changes[genre, target.state or NO_STATE, facet] += 1
+
+    for target in session.deleted:
+        if type(target) in GENRE_MODELS:
+            facet = GENRE_MODELS[type(target)][0]
+            state = _state(_history(target, 'state')[0])
+            for genre in _history(target, 'genres')[0]:
+                changes[genre, state, facet] -= 1
+
+    for target in session.dirty:
+        if type(target) in GENRE_MODELS:
+            facet = GENRE_MODELS[type(target)][0]
+            old_state, new_state = _history(target, 'state')
+            genres = attributes.get_history(
+                target, 'genres', attributes.PASSIVE_NO_INITIALIZE)
+
+            if old_state == new_state and not genres.has_changes():
+                continue
+
+            old_genres, new_genres = _history(target, 'genres')
+            for genre in old_genres:
+                changes[genre, _state(old_state), facet] -= 1
+            for genre in new_genres:
+                changes[genre, _state(new_state), facet] += 1
+
+
+@event.listens_for(Session, 'after_flush')
+def _count_flushed_genres(session, flush_context):
+    changes = flush_context.attributes.get('genre_changes')
+
+    if changes:
+        count_genres(session, Counter({
+            (genre.id, state, facet): count
+            for (genre, state, facet), count in changes.items()}))
@@ -0,0 +1,90 @@
+"""
+The /venues listing: venues grouped by city and state, with the number
+of upcoming shows of each venue, one page of areas at a time.
+
+A page is a single query. A subquery picks the page's areas from the
+(state, city) index, the venues of those areas are joined with their
+upcoming shows and counted with GROUP BY, and the rows are streamed to
+the template as it renders, so neither the query nor the page grows
+with the number of venues.
+
+Every area comes with a version, its number of venues and their latest
+updated_at, so the template can cache the rendered area (see
+fragments.py) without holding back the rest of the page.
+"""
+from datetime import datetime
+from itertools import groupby
+
+from sqlalchemy import and_, func
+
+from models import db, Venue, Show
+
+AREAS_PER_PAGE = 20
+
+# Rows fetched from the database cursor at a time
+VENUE_CHUNK_SIZE = 500
+
+
+class VenueListing:
+    """
+    Areas of one page of venues, read while the template iterates them.
+    has_next is only known once they have all been read.
+    """
+
+    def __init__(self, page=1, per_page=AREAS_PER_PAGE, now=None):
+        self.page = page
+        self.per_page = per_page
+        self.now = now or datetime.now()
+        self.has_next = False
+
+    @property
+    def has_previous(self):
+        return self.page > 1
+
+    def query(self):
+        """
+        Build the query of the venues in the page's areas, plus the first
+        area of the next page to tell whether there is one
+        :return: query of (id, name, city, state, updated_at,
+            num_upcoming_shows)
+        """
+        areas = db.session.query(Venue.state, Venue.city).group_by(
+            Venue.state, Venue.city).order_by(
+            Venue.state, Venue.city).limit(self.per_page + 1).offset(
+            (self.page - 1) * self.per_page).subquery()
+
+        return db.session.query(
+            Venue.id, Venue.name, Venue.city, Venue.state, Venue.updated_at,
+            func.count(Show.id).label('num_upcoming_shows')).join(
+            areas, and_(Venue.state == areas.c.state,
+                        Venue.city == areas.c.city)).outerjoin(
+            Show, and_(Show.venue_id == Venue.id,
+                       Show.start_time > self.now)).group_by(
+            Venue.id, Venue.name, Venue.city, Venue.state,
+            Venue.updated_at).order_by(
+            Venue.state, Venue.city, Venue.name, Venue.id)
+
+    def __iter__(self):
+        rows = self.query().yield_per(VENUE_CHUNK_SIZE)
+        areas = groupby(rows, key=lambda row: (row.state, row.city))
+
+        for number, ((state, city), venues) in enumerate(areas):
+            if number == self.per_page:
+                self.has_next = True
+                break
+
+            venues = list(venues)
+            # Deletes leave no updated_at behind, the count catches them
+            version = (len(venues),
+                       max(venue.updated_at for venue in venues))
+
+            yield {
+                'city': city,
+                'state': state,
+                'version': version,
+                'venues': [{
+                    'id': venue.id,
+                    'name': venue.name,
+                    'num_upcoming_shows': venue.num_upcoming_shows,
+                } for venue in venues],
+            }
@@ -0,0 +1,115 @@
+"""venues, artists and shows
+
+Revision ID: 5b1f0c7d2e8a
+Revises: 
+Create Date: 2026-10-18 14:40:12.504931
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b1f0c7d2e8a'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# Columns added to the starter's Venue and Artist tables
+VENUE_COLUMNS = [
+    sa.Column('genres', sa.String(length=120), nullable=True),
+    sa.Column('website', sa.String(length=120), nullable=True),
+    sa.Column('seeking_talent', sa.Boolean(), nullable=False,
+              server_default=sa.false()),
+    sa.Column('seeking_description', sa.String(length=500), nullable=True),
+]
+ARTIST_COLUMNS = [
+    sa.Column('website', sa.String(length=120), nullable=True),
+    sa.Column('seeking_venue', sa.Boolean(), nullable=False,
+              server_default=sa.false()),
+    sa.Column('seeking_description', sa.String(length=500), nullable=True),
+]
+
+
+def upgrade():
+    # Databases set up with db.create_all() from the starter models
+    # already have Venue and Artist, only add what they are missing.
+    inspector = sa.inspect(op.get_bind())
+    tables = inspector.get_table_names()
+
+    if 'Venue' not in tables:
+        op.create_table(
+            'Venue',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(), nullable=True),
+            sa.Column('city', sa.String(length=120), nullable=True),
+            sa.Column('state', sa.String(length=120), nullable=True),
+            sa.Column('address', sa.String(length=120), nullable=True),
+            sa.Column('phone', sa.String(length=120), nullable=True),
+            sa.Column('image_link', sa.String(length=500), nullable=True),
+            sa.Column('facebook_link', sa.String(length=120),
+                      nullable=True),
+            *VENUE_COLUMNS,
+            sa.PrimaryKeyConstraint('id')
+        )
+    else:
+        existing = {column['name']
+                    for column in inspector.get_columns('Venue')}
+        for column in VENUE_COLUMNS:
+            if column.name not in existing:
+                op.add_column('Venue', column)
+
+    if 'Artist' not in tables:
+        op.create_table(
+            'Artist',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(), nullable=True),
+            sa.Column('city', sa.String(length=120), nullable=True),
+            sa.Column('state', sa.String(length=120), nullable=True),
+            sa.Column('phone', sa.String(length=120), nullable=True),
+            sa.Column('genres', sa.String(length=120), nullable=True),
+            sa.Column('image_link', sa.String(length=500), nullable=True),
+            sa.Column('facebook_link', sa.String(length=120),
+                      nullable=True),
+            *ARTIST_COLUMNS,
+            sa.PrimaryKeyConstraint('id')
+        )
+    else:
+        existing = {column['name']
+                    for column in inspector.get_columns('Artist')}
+        for column in ARTIST_COLUMNS:
+            if column.name not in existing:
+                op.add_column('Artist', column)
+
+    op.create_table(
+        'Show',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('venue_id', sa.Integer(), nullable=False),
+        sa.Column('artist_id', sa.Integer(), nullable=False),
+        sa.Column('start_time', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'],
+                                ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'],
+                                ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_Show_venue_id_start_time', 'Show',
+                    ['venue_id', 'start_time'])
+    op.create_index('ix_Show_artist_id_start_time', 'Show',
+                    ['artist_id', 'start_time'])
+
+
+def downgrade():
+    op.drop_index('ix_Show_artist_id_start_time', table_name='Show')
+    op.drop_index('ix_Show_venue_id_start_time', table_name='Show')
+    op.drop_table('Show')
+
+    # Venue and Artist may be the starter's tables with its data in them
+    # (see upgrade), only drop the columns this revision adds to them.
+    # On a database this revision created the starter's tables are left,
+    # as if made by db.create_all(), and upgrade picks them up again.
+    for table, columns in (('Venue', VENUE_COLUMNS),
+                           ('Artist', ARTIST_COLUMNS)):
+        with op.batch_alter_table(table) as batch_op:
+            for column in columns:
+                batch_op.drop_column(column.name)
@@ -0,0 +1,150 @@
+"""genre tables
+
+Revision ID: 7a3f9e2b6c41
+Revises: e41a7b3c5d60
+Create Date: 2026-10-18 17:58:03.418290
+
+"""
+from collections import Counter
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7a3f9e2b6c41'
+down_revision = 'e41a7b3c5d60'
+branch_labels = None
+depends_on = None
+
+# Table, join table, id column of the join table and facet column
+OWNERS = [
+    ('Venue', 'venue_genres', 'venue_id', 'venues'),
+    ('Artist', 'artist_genres', 'artist_id', 'artists'),
+]
+
+
+def upgrade():
+    bind = op.get_bind()
+    postgresql = bind.dialect.name == 'postgresql'
+
+    genre = op.create_table(
+        'Genre',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=120), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name'),
+    )
+    for owner, name, owner_id, facet in OWNERS:
+        op.create_table(
+            name,
+            sa.Column(owner_id, sa.Integer(), nullable=False),
+            sa.Column('genre_id', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint([owner_id], [f'{owner}.id'],
+                                    ondelete='CASCADE'),
+            sa.ForeignKeyConstraint(['genre_id'], ['Genre.id'],
+                                    ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint(owner_id, 'genre_id'),
+        )
+        op.create_index(f'ix_{name}_genre_id_{owner_id}', name,
+                        ['genre_id', owner_id])
+    facets = op.create_table(
+        'GenreFacet',
+        sa.Column('genre_id', sa.Integer(), nullable=False),
+        sa.Column('state', sa.String(length=120), nullable=False),
+        sa.Column('venues', sa.Integer(), nullable=False),
+        sa.Column('artists', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['genre_id'], ['Genre.id'],
+                                ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('genre_id', 'state'),
+    )
+
+    # Move the comma separated genres of every venue and artist into the
+    # new tables, counting the facets on the way
+    owners = {}
+    for owner, name, owner_id, facet in OWNERS:
+        table = sa.table(owner, sa.column('id'), sa.column('state'),
+                         sa.column('genres'))
+        owners[owner] = [
+            (row.id, row.state or '',
+             [genre.strip() for genre in (row.genres or '').split(',')
+              if genre.strip()])
+            for row in bind.execute(sa.select(
+                [table.c.id, table.c.state, table.c.genres]))]
+
+    names = sorted({genre for rows in owners.values()
+                    for row_id, state, genres in rows for genre in genres})
+    if names:
+        op.bulk_insert(genre, [{'name': name} for name in names])
+    genre_ids = dict(bind.execute(
+        sa.select([genre.c.name, genre.c.id])).fetchall())
+
+    counts = Counter()
+    for owner, name, owner_id, facet in OWNERS:
+        links = []
+        for row_id, state, genres in owners[owner]:
+            for genre_id in {genre_ids[genre] for genre in genres}:
+                links.append({owner_id: row_id, 'genre_id': genre_id})
+                counts[genre_id, state, facet] += 1
+        if links:
+            op.bulk_insert(sa.table(name, sa.column(owner_id),
+                                    sa.column('genre_id')), links)
+
+    if counts:
+        rows = {}
+        for (genre_id, state, facet), count in counts.items():
+            row = rows.setdefault((genre_id, state), {
+                'genre_id': genre_id, 'state': state, 'venues': 0,
+                'artists': 0})
+            row[facet] = count
+        op.bulk_insert(facets, list(rows.values()))
+
+    for owner, name, owner_id, facet in OWNERS:
+        if postgresql:
+            op.drop_index(f'ix_{owner}_genres_trgm', table_name=owner)
+        with op.batch_alter_table(owner) as batch_op:
+            batch_op.drop_column('genres')
+
+    # Searching genres by part of their name (see search.py)
+    if postgresql:
+        op.create_index('ix_Genre_name_trgm', 'Genre', ['name'],
+                        postgresql_using='gin',
+                        postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade():
+    bind = op.get_bind()
+    postgresql = bind.dialect.name == 'postgresql'
+
+    if postgresql:
+        op.drop_index('ix_Genre_name_trgm', table_name='Genre')
+
+    genre = sa.table('Genre', sa.column('id'), sa.column('name'))
+    for owner, name, owner_id, facet in OWNERS:
+        with op.batch_alter_table(owner) as batch_op:
+            batch_op.add_column(sa.Column('genres', sa.String(length=120),
+                                          nullable=True))
+
+        links = sa.table(name, sa.column(owner_id), sa.column('genre_id'))
+        genres = {}
+        for row_id, genre_name in bind.execute(sa.select(
+                [links.c[owner_id], genre.c.name]).select_from(links.join(
+                genre, links.c.genre_id == genre.c.id)).order_by(
+                genre.c.name)):
+            genres.setdefault(row_id, []).append(genre_name)
+
+        table = sa.table(owner, sa.column('id'), sa.column('genres'))
+        for row_id, names in genres.items():
+            op.execute(table.update().where(table.c.id == row_id).values(
+                genres=','.join(names)))
+
+        if postgresql:
+            op.create_index(f'ix_{owner}_genres_trgm', owner, ['genres'],
+                            postgresql_using='gin',
+                            postgresql_ops={'genres': 'gin_trgm_ops'})
+
+    op.drop_table('GenreFacet')
+    for owner, name, owner_id, facet in reversed(OWNERS):
+        op.drop_index(f'ix_{name}_genre_id_{owner_id}', table_name=name)
+        op.drop_table(name)
+    op.drop_table('Genre')
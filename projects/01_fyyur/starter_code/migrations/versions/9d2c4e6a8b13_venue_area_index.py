@@ -0,0 +1,24 @@
+"""venue area index
+
+Revision ID: 9d2c4e6a8b13
+Revises: 5b1f0c7d2e8a
+Create Date: 2026-10-18 15:12:36.871402
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d2c4e6a8b13'
+down_revision = '5b1f0c7d2e8a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_Venue_state_city', 'Venue', ['state', 'city'])
+
+
+def downgrade():
+    op.drop_index('ix_Venue_state_city', table_name='Venue')
@@ -0,0 +1,37 @@
+"""page versions
+
+Revision ID: c85d1f4a7e29
+Revises: 7a3f9e2b6c41
+Create Date: 2026-10-18 19:21:47.530118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c85d1f4a7e29'
+down_revision = '7a3f9e2b6c41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('Venue', 'Artist'):
+        # Added empty, filled, then made required: SQLite cannot add a
+        # column defaulting to the current time
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(),
+                                       nullable=True))
+        op.execute(sa.table(table, sa.column('updated_at')).update().values(
+            updated_at=sa.func.current_timestamp()))
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column('updated_at', existing_type=sa.DateTime(),
+                                  nullable=False)
+        op.create_index(f'ix_{table}_updated_at', table, ['updated_at'])
+
+
+def downgrade():
+    for table in ('Venue', 'Artist'):
+        op.drop_index(f'ix_{table}_updated_at', table_name=table)
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('updated_at')
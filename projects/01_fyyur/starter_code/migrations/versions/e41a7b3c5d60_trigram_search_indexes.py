@@ -0,0 +1,49 @@
+"""trigram search indexes
+
+Revision ID: e41a7b3c5d60
+Revises: 9d2c4e6a8b13
+Create Date: 2026-10-18 16:40:12.204517
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e41a7b3c5d60'
+down_revision = '9d2c4e6a8b13'
+branch_labels = None
+depends_on = None
+
+# Columns searched with ILIKE '%term%' (see search.py)
+SEARCH_COLUMNS = {
+    'Venue': ['name', 'city', 'genres'],
+    'Artist': ['name', 'city', 'genres'],
+}
+
+
+def upgrade():
+    # Only PostgreSQL has trigram indexes; other databases search an
+    # in-process index instead
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+    for table, columns in SEARCH_COLUMNS.items():
+        for column in columns:
+            op.create_index(f'ix_{table}_{column}_trgm', table, [column],
+                            postgresql_using='gin',
+                            postgresql_ops={column: 'gin_trgm_ops'})
+        op.create_index(f'ix_{table}_lower_state', table,
+                        [sa.text('lower(state)')])
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    for table, columns in SEARCH_COLUMNS.items():
+        op.drop_index(f'ix_{table}_lower_state', table_name=table)
+        for column in columns:
+            op.drop_index(f'ix_{table}_{column}_trgm', table_name=table)
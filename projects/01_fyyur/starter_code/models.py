@@ -0,0 +1,163 @@
+from datetime import datetime
+
+from flask_sqlalchemy import SQLAlchemy
+
+db = SQLAlchemy()
+
+#----------------------------------------------------------------------------#
+# Models.
+#----------------------------------------------------------------------------#
+
+
+class Genre(db.Model):
+    __tablename__ = 'Genre'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=False, unique=True)
+
+
+def _genre_table(name, owner):
+    # The primary key finds the genres of a venue or artist, the second
+    # index the venues or artists of a genre
+    owner_id = f'{owner.lower()}_id'
+
+    return db.Table(
+        name,
+        db.Column(owner_id, db.Integer,
+                  db.ForeignKey(f'{owner}.id', ondelete='CASCADE'),
+                  primary_key=True),
+        db.Column('genre_id', db.Integer,
+                  db.ForeignKey('Genre.id', ondelete='CASCADE'),
+                  primary_key=True),
+        db.Index(f'ix_{name}_genre_id_{owner_id}', 'genre_id', owner_id),
+    )
+
+
+venue_genres = _genre_table('venue_genres', 'Venue')
+artist_genres = _genre_table('artist_genres', 'Artist')
+
+
+class Venue(db.Model):
+    __tablename__ = 'Venue'
+    __table_args__ = (
+        # /venues lists venues grouped and ordered by area
+        db.Index('ix_Venue_state_city', 'state', 'city'),
+        # Version of the venue listing (see fragments.py)
+        db.Index('ix_Venue_updated_at', 'updated_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String)
+    city = db.Column(db.String(120))
+    # Genre facets are counted per state: keep the old value on changes
+    state = db.column_property(db.Column(db.String(120)),
+                               active_history=True)
+    address = db.Column(db.String(120))
+    phone = db.Column(db.String(120))
+    image_link = db.Column(db.String(500))
+    facebook_link = db.Column(db.String(120))
+    website = db.Column(db.String(120))
+    seeking_talent = db.Column(db.Boolean, nullable=False, default=False)
+    seeking_description = db.Column(db.String(500))
+    # Version of the cached venue page, see fragments.py
+    updated_at = db.Column(db.DateTime, nullable=False,
+                           default=datetime.utcnow)
+
+    # A venue can have thousands of shows: never load them all as objects,
+    # read them through the queries in shows.py
+    shows = db.relationship('Show', backref='venue', lazy='dynamic',
+                            passive_deletes=True)
+    genres = db.relationship('Genre', secondary=venue_genres,
+                             order_by=Genre.name)
+
+    def format(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'genres': [genre.name for genre in self.genres],
+            'address': self.address,
+            'city': self.city,
+            'state': self.state,
+            'phone': self.phone,
+            'website': self.website,
+            'facebook_link': self.facebook_link,
+            'seeking_talent': self.seeking_talent,
+            'seeking_description': self.seeking_description,
+            'image_link': self.image_link,
+        }
+
+
+class Artist(db.Model):
+    __tablename__ = 'Artist'
+    __table_args__ = (
+        db.Index('ix_Artist_updated_at', 'updated_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String)
+    city = db.Column(db.String(120))
+    state = db.column_property(db.Column(db.String(120)),
+                               active_history=True)
+    phone = db.Column(db.String(120))
+    image_link = db.Column(db.String(500))
+    facebook_link = db.Column(db.String(120))
+    website = db.Column(db.String(120))
+    seeking_venue = db.Column(db.Boolean, nullable=False, default=False)
+    seeking_description = db.Column(db.String(500))
+    updated_at = db.Column(db.DateTime, nullable=False,
+                           default=datetime.utcnow)
+
+    shows = db.relationship('Show', backref='artist', lazy='dynamic',
+                            passive_deletes=True)
+    genres = db.relationship('Genre', secondary=artist_genres,
+                             order_by=Genre.name)
+
+    def format(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'genres': [genre.name for genre in self.genres],
+            'city': self.city,
+            'state': self.state,
+            'phone': self.phone,
+            'website': self.website,
+            'facebook_link': self.facebook_link,
+            'seeking_venue': self.seeking_venue,
+            'seeking_description': self.seeking_description,
+            'image_link': self.image_link,
+        }
+
+
+class Show(db.Model):
+    __tablename__ = 'Show'
+    __table_args__ = (
+        # Venue and artist pages read the shows of one venue or artist
+        # ordered by start time, split at now: an index range scan each.
+        db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    venue_id = db.Column(db.Integer,
+                         db.ForeignKey('Venue.id', ondelete='CASCADE'),
+                         nullable=False)
+    artist_id = db.Column(db.Integer,
+                          db.ForeignKey('Artist.id', ondelete='CASCADE'),
+                          nullable=False)
+    start_time = db.Column(db.DateTime, nullable=False)
+
+
+class GenreFacet(db.Model):
+    """
+    Number of venues and artists of a genre in a state, maintained by
+    genres.py as they are written
+    """
+    __tablename__ = 'GenreFacet'
+
+    genre_id = db.Column(db.Integer,
+                         db.ForeignKey('Genre.id', ondelete='CASCADE'),
+                         primary_key=True)
+    # '' for venues and artists without a state
+    state = db.Column(db.String(120), primary_key=True)
+    venues = db.Column(db.Integer, nullable=False, default=0)
+    artists = db.Column(db.Integer, nullable=False, default=0)
@@ -0,0 +1,265 @@
+"""
+Case-insensitive partial search of venues and artists by name, city,
+state and genres.
+
+On PostgreSQL the matching runs on pg_trgm trigram indexes (see the
+migrations), so a search for part of a name reads the index instead of
+every row. Other databases, like the SQLite files used in development,
+search an in-process trigram index of the same fields that is rebuilt
+after venues or artists change: right away for writes made by this
+process, and for writes made by other workers once a search sees the
+number of rows or their latest updated_at (see fragments.py) change.
+
+Results are ranked: name matches first, the closest name first, then
+matches on city, state or genres by name. A term of the form
+"City, ST" finds everything in that city and state. The number of
+upcoming shows comes from the same query as the results.
+"""
+import threading
+from datetime import datetime
+
+from sqlalchemy import and_, event, func, or_
+
+from models import db, Genre, Venue, Artist, Show
+from shows import upcoming_show_count
+
+SEARCH_LIMIT = 50
+MAX_SEARCH_LIMIT = 500
+
+SEARCH_MODELS = {
+    Venue: Show.venue_id,
+    Artist: Show.artist_id,
+}
+
+
+def trigrams(text):
+    """
+    Get the trigrams of a text the way pg_trgm does: lower case words
+    padded with two spaces in front and one behind
+    :param text:
+    :return: set of str
+    """
+    grams = set()
+
+    for word in ''.join(c if c.isalnum() else ' '
+                        for c in text.lower()).split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+
+    return grams
+
+
+def similarity(a, b):
+    """
+    pg_trgm similarity(): shared trigrams over all trigrams of a and b
+    :return: float from 0 to 1
+    """
+    a = trigrams(a)
+    b = trigrams(b)
+
+    if not a or not b:
+        return 0.0
+
+    return len(a & b) / len(a | b)
+
+
+def parse_term(term):
+    """
+    Split "City, ST" into its city and state
+    :param term:
+    :return: tuple of (term, city or None, state or None)
+    """
+    term = term.strip()
+    city, comma, state = term.rpartition(',')
+
+    if comma and city.strip() and state.strip():
+        return term, city.strip(), state.strip()
+
+    return term, None, None
+
+
+class NgramIndex:
+    """
+    In-process index of the searchable fields of every venue or artist.
+    Every 3 characters of a field point at the rows containing them, so a
+    search only checks rows that have all of the term's.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self._lock = threading.Lock()
+        self._rows = None
+        self._grams = None
+        self._version = None
+
+    def clear(self):
+        with self._lock:
+            self._rows = None
+            self._grams = None
+            self._version = None
+
+    def version(self):
+        """
+        Get the number of rows and their latest updated_at, one indexed
+        aggregate query. Any write through the ORM, in any worker,
+        changes it.
+        :return: tuple
+        """
+        model = self.model
+        return tuple(db.session.query(func.count(model.id),
+                                      func.max(model.updated_at)).one())
+
+    def _load(self):
+        model = self.model
+        rows = {}
+        grams = {}
+        genres = {}
+
+        for row_id, genre in db.session.query(model.id, Genre.name).join(
+                model.genres):
+            genres.setdefault(row_id, []).append(genre)
+
+        for row in db.session.query(model.id, model.name, model.city,
+                                    model.state):
+            fields = tuple((value or '').lower() for value in row[1:]) + (
+                ','.join(genres.get(row.id, ())).lower(),)
+            rows[row.id] = (row.name or '', fields)
+
+            for field in fields:
+                for i in range(len(field) - 2):
+                    grams.setdefault(field[i:i + 3], set()).add(row.id)
+
+        self._rows = rows
+        self._grams = grams
+
+    def search(self, term):
+        """
+        Find the rows matching a term
+        :param term:
+        :return: list of (id, name, whether the name matched)
+        """
+        term, city, state = parse_term(term)
+        needle = (city or term).lower()
+        # Read before loading: a write in between only causes a reload
+        version = self.version()
+
+        with self._lock:
+            if self._rows is None or self._version != version:
+                self._load()
+                self._version = version
+
+            if len(needle) < 3:
+                candidates = self._rows.keys()
+            else:
+                sets = [self._grams.get(needle[i:i + 3], set())
+                        for i in range(len(needle) - 2)]
+                candidates = set.intersection(*sorted(sets, key=len))
+
+            matches = []
+
+            for row_id in candidates:
+                display_name, fields = self._rows[row_id]
+                name, row_city, row_state, genres = fields
+
+                if city is not None:
+                    if row_city == city.lower() and \
+                            row_state == state.lower():
+                        matches.append((row_id, display_name, False))
+                elif needle in name:
+                    matches.append((row_id, display_name, True))
+                elif needle in row_city or needle == row_state or \
+                        needle in genres:
+                    matches.append((row_id, display_name, False))
+
+        return matches
+
+
+_indexes = {model: NgramIndex(model) for model in SEARCH_MODELS}
+
+
+def _like(term):
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%') \
+        .replace('_', '\\_')
+    return f'%{escaped}%'
+
+
+def _search_postgresql(model, term, limit, now):
+    term, city, state = parse_term(term)
+    upcoming = upcoming_show_count(SEARCH_MODELS[model], model.id, now)
+
+    if city is not None:
+        condition = and_(func.lower(model.city) == city.lower(),
+                         func.lower(model.state) == state.lower())
+        order = []
+    else:
+        pattern = _like(term)
+        name_matched = model.name.ilike(pattern, escape='\\')
+        condition = or_(name_matched,
+                        model.city.ilike(pattern, escape='\\'),
+                        func.lower(model.state) == term.lower(),
+                        model.genres.any(
+                            Genre.name.ilike(pattern, escape='\\')))
+        order = [name_matched.desc(),
+                 func.similarity(model.name, term).desc()]
+
+    rows = db.session.query(
+        model.id, model.name, upcoming.label('num_upcoming_shows'),
+        func.count().over().label('total')).filter(condition).order_by(
+        *order, model.name, model.id).limit(limit).all()
+
+    total = rows[0].total if rows else 0
+    return total, [{'id': row.id, 'name': row.name,
+                    'num_upcoming_shows': row.num_upcoming_shows}
+                   for row in rows]
+
+
+def _search_index(model, term, limit, now):
+    matches = _indexes[model].search(term)
+    matches.sort(key=lambda match: (
+        not match[2], -similarity(match[1], term), match[1], match[0]))
+    ids = [row_id for row_id, name, name_matched in matches[:limit]]
+
+    if not ids:
+        return len(matches), []
+
+    upcoming = upcoming_show_count(SEARCH_MODELS[model], model.id, now)
+    rows = {row.id: row for row in db.session.query(
+        model.id, model.name, upcoming.label('num_upcoming_shows')).filter(
+        model.id.in_(ids))}
+
+    return len(matches), [{'id': row_id, 'name': rows[row_id].name,
+                           'num_upcoming_shows':
+                               rows[row_id].num_upcoming_shows}
+                          for row_id in ids if row_id in rows]
+
+
+def search(model, term, limit=SEARCH_LIMIT, now=None):
+    """
+    Search venues or artists
+    :param model: Venue or Artist
+    :param term: part of a name, city, state or genre, or "City, ST"
+    :param limit: most results to return, up to MAX_SEARCH_LIMIT
+    :param now: defaults to the current time
+    :return: dict of count, the number of matches, and data, the results
+    """
+    limit = max(1, min(limit or SEARCH_LIMIT, MAX_SEARCH_LIMIT))
+    now = now or datetime.now()
+
+    if not term.strip():
+        return {'count': 0, 'data': []}
+
+    if db.engine.dialect.name == 'postgresql':
+        count, data = _search_postgresql(model, term, limit, now)
+    else:
+        count, data = _search_index(model, term, limit, now)
+
+    return {'count': count, 'data': data}
+
+
+def _written(mapper, connection, target):
+    _indexes[type(target)].clear()
+
+
+for _model in SEARCH_MODELS:
+    for _event in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(_model, _event, _written)
@@ -0,0 +1,136 @@
+"""
+Show queries for the venue, artist and show pages.
+
+Every page runs a fixed number of queries however many venues, artists
+and shows it lists: the shows of a venue or artist come from one query
+joined with the other side, and show counts of a list of venues or
+artists are part of the query listing them, instead of loading the
+shows of each one in turn.
+
+Start times are stored without a time zone and compared with the local
+time, the same as the show form's default.
+"""
+from datetime import datetime
+
+from sqlalchemy import func
+
+from models import db, Venue, Artist, Show
+
+
+def upcoming_show_count(column, owner_id, now=None):
+    """
+    Build a subquery counting the upcoming shows of the venue or artist
+    of each row, for the select list of a query of venues or artists.
+    Only the rows the query returns are counted.
+    :param column: Show.venue_id or Show.artist_id
+    :param owner_id: Venue.id or Artist.id
+    :param now: defaults to the current time
+    :return: scalar subquery
+    """
+    return db.session.query(func.count(Show.id)).filter(
+        column == owner_id,
+        Show.start_time > (now or datetime.now())).as_scalar()
+
+
+def _split_shows(rows, names, now):
+    # rows are ordered by start time; past shows are listed latest first
+    past = []
+    upcoming = []
+
+    for start_time, *values in rows:
+        show = dict(zip(names, values), start_time=start_time.isoformat())
+        (upcoming if start_time > now else past).append(show)
+
+    past.reverse()
+
+    return {
+        'past_shows': past,
+        'upcoming_shows': upcoming,
+        'past_shows_count': len(past),
+        'upcoming_shows_count': len(upcoming),
+    }
+
+
+def venue_shows(venue_id, now=None):
+    """
+    Get the past and upcoming shows of a venue with their artists
+    :param venue_id:
+    :param now: defaults to the current time
+    :return: dict of past_shows, upcoming_shows and their counts
+    """
+    rows = db.session.query(
+        Show.start_time, Artist.id, Artist.name, Artist.image_link).join(
+        Artist, Show.artist_id == Artist.id).filter(
+        Show.venue_id == venue_id).order_by(Show.start_time).all()
+
+    return _split_shows(rows, ['artist_id', 'artist_name',
+                               'artist_image_link'], now or datetime.now())
+
+
+def artist_shows(artist_id, now=None):
+    """
+    Get the past and upcoming shows of an artist with their venues
+    :param artist_id:
+    :param now: defaults to the current time
+    :return: dict of past_shows, upcoming_shows and their counts
+    """
+    rows = db.session.query(
+        Show.start_time, Venue.id, Venue.name, Venue.image_link).join(
+        Venue, Show.venue_id == Venue.id).filter(
+        Show.artist_id == artist_id).order_by(Show.start_time).all()
+
+    return _split_shows(rows, ['venue_id', 'venue_name',
+                               'venue_image_link'], now or datetime.now())
+
+
+def venue_details(venue_id, now=None):
+    """
+    Get everything the venue page shows, in two queries
+    :param venue_id:
+    :param now: defaults to the current time
+    :return: dict or None if there is no such venue
+    """
+    venue = Venue.query.get(venue_id)
+
+    if venue is None:
+        return None
+
+    return dict(venue.format(), **venue_shows(venue_id, now))
+
+
+def artist_details(artist_id, now=None):
+    """
+    Get everything the artist page shows, in two queries
+    :param artist_id:
+    :param now: defaults to the current time
+    :return: dict or None if there is no such artist
+    """
+    artist = Artist.query.get(artist_id)
+
+    if artist is None:
+        return None
+
+    return dict(artist.format(), **artist_shows(artist_id, now))
+
+
+def all_shows():
+    """
+    Get every show with its venue and artist, soonest first
+    :return: list of dicts
+    """
+    rows = db.session.query(
+        Show.venue_id, Venue.name, Show.artist_id, Artist.name,
+        Artist.image_link, Show.start_time).join(
+        Venue, Show.venue_id == Venue.id).join(
+        Artist, Show.artist_id == Artist.id).order_by(
+        Show.start_time, Show.id).all()
+
+    return [{
+        'venue_id': venue_id,
+        'venue_name': venue_name,
+        'artist_id': artist_id,
+        'artist_name': artist_name,
+        'artist_image_link': artist_image_link,
+        'start_time': start_time.isoformat(),
+    } for venue_id, venue_name, artist_id, artist_name, artist_image_link,
+        start_time in rows]
@@ -0,0 +1,618 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from flask import Flask
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Venue, Artist, Show, GenreFacet
+from fragments import init_fragment_cache, get_fragment_cache, shows_version
+from genres import genres_named, genre_facets, init_genres
+from listing import VenueListing
+from search import SEARCH_MODELS, search
+from shows import venue_shows, artist_shows, venue_details, \
+    artist_details, all_shows
+import search as search_module
+
+
+class FyyurTestCase(unittest.TestCase):
+    """
+    Runs the models and queries on a scratch SQLite file, like a
+    development database, without the forms and templates of app.py
+    """
+
+    def setUp(self):
+        fd, self.database_path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = \
+            f'sqlite:///{self.database_path}'
+        self.app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        db.init_app(self.app)
+
+        self.context = self.app.app_context()
+        self.context.push()
+        db.create_all()
+
+        # The search index is per process, start from an empty one
+        for model in SEARCH_MODELS:
+            search_module._indexes[model].clear()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+        os.remove(self.database_path)
+
+    def add_venue(self, name, city='San Francisco', state='CA', genres=()):
+        venue = Venue(name=name, city=city, state=state,
+                      genres=genres_named(genres))
+        db.session.add(venue)
+        db.session.commit()
+        return venue
+
+    def add_artist(self, name, city='San Francisco', state='CA',
+                   genres=()):
+        artist = Artist(name=name, city=city, state=state,
+                        genres=genres_named(genres))
+        db.session.add(artist)
+        db.session.commit()
+        return artist
+
+
+class SearchTestCase(FyyurTestCase):
+    """This class represents the venue and artist search"""
+
+    def names(self, result):
+        return [row['name'] for row in result['data']]
+
+    def test_search_ranks_name_matches_first(self):
+        self.add_venue('The Jazz Lounge and Supper Club')
+        self.add_venue('Blue Note', genres=['Jazz'])
+        self.add_venue('Jazz Bar')
+        self.add_venue('Corner Pub', city='Jazzton')
+        self.add_venue('Rock Hall', genres=['Rock n Roll'])
+
+        result = search(Venue, 'jazz')
+
+        self.assertEqual(4, result['count'])
+        # Name matches first, the closest name first, then the other
+        # fields by name
+        self.assertEqual(['Jazz Bar', 'The Jazz Lounge and Supper Club',
+                          'Blue Note', 'Corner Pub'], self.names(result))
+
+    def test_search_is_case_insensitive_and_partial(self):
+        self.add_artist('Guns N Petals')
+
+        self.assertEqual(['Guns N Petals'],
+                         self.names(search(Artist, 'PETAL')))
+        self.assertEqual(0, search(Artist, 'roses')['count'])
+        self.assertEqual(0, search(Artist, '  ')['count'])
+
+    def test_search_city_and_state(self):
+        self.add_venue('Park Square')
+        self.add_venue('The Musical Hop')
+        self.add_venue('Dueling Pianos', city='New York', state='NY')
+        self.add_venue('Elsewhere', city='San Francisco', state='NM')
+
+        result = search(Venue, 'san francisco, ca')
+
+        self.assertEqual(2, result['count'])
+        self.assertEqual(['Park Square', 'The Musical Hop'],
+                         self.names(result))
+        self.assertEqual(['Dueling Pianos'],
+                         self.names(search(Venue, 'New York, NY')))
+        self.assertEqual(0, search(Venue, 'New York, CA')['count'])
+
+    def test_search_counts_upcoming_shows(self):
+        venue = self.add_venue('Park Square')
+        artist = self.add_artist('Guns N Petals')
+        now = datetime.now()
+        db.session.add_all([
+            Show(venue_id=venue.id, artist_id=artist.id,
+                 start_time=now + timedelta(days=1)),
+            Show(venue_id=venue.id, artist_id=artist.id,
+                 start_time=now - timedelta(days=1)),
+        ])
+        db.session.commit()
+
+        result = search(Venue, 'park', now=now)
+
+        self.assertEqual(1, result['data'][0]['num_upcoming_shows'])
+
+    def test_search_limit(self):
+        for number in range(5):
+            self.add_venue(f'Jazz Bar {number}')
+
+        result = search(Venue, 'jazz', limit=2)
+
+        # The count is of every match, the data only the first ones
+        self.assertEqual(5, result['count'])
+        self.assertEqual(['Jazz Bar 0', 'Jazz Bar 1'], self.names(result))
+        self.assertEqual(5, len(search(Venue, 'jazz', limit=10000)['data']))
+
+    def test_search_index_follows_writes(self):
+        self.assertEqual(0, search(Venue, 'blues')['count'])
+
+        venue = self.add_venue('Blues Room')
+        self.assertEqual(['Blues Room'], self.names(search(Venue, 'blues')))
+
+        venue.name = 'Soul Room'
+        db.session.commit()
+        self.assertEqual(0, search(Venue, 'blues')['count'])
+        self.assertEqual(['Soul Room'], self.names(search(Venue, 'soul')))
+
+        venue.genres = genres_named(['Blues'])
+        db.session.commit()
+        self.assertEqual(['Soul Room'], self.names(search(Venue, 'blues')))
+
+        venue.city = 'Memphis'
+        venue.state = 'TN'
+        db.session.commit()
+        self.assertEqual(['Soul Room'],
+                         self.names(search(Venue, 'Memphis, TN')))
+
+        db.session.delete(venue)
+        db.session.commit()
+        self.assertEqual(0, search(Venue, 'soul')['count'])
+        self.assertEqual(0, search(Venue, 'Memphis, TN')['count'])
+
+    def test_search_index_sees_writes_of_other_workers(self):
+        venue = self.add_venue('Blues Room')
+        self.assertEqual(['Blues Room'], self.names(search(Venue, 'blues')))
+
+        # Plain SQL runs no listener here, like a write in another worker
+        table = Venue.__table__
+        db.session.execute(table.update().where(
+            table.c.id == venue.id).values(
+            name='Soul Room', updated_at=datetime(2100, 1, 1)))
+        db.session.commit()
+
+        self.assertEqual(['Soul Room'], self.names(search(Venue, 'soul')))
+
+        db.session.execute(table.insert().values(
+            name='Blues Cellar', updated_at=datetime(2000, 1, 1)))
+        db.session.commit()
+
+        self.assertEqual(['Blues Cellar'],
+                         self.names(search(Venue, 'blues')))
+
+
+class GenreFacetTestCase(FyyurTestCase):
+    """This class represents the genre counts per state"""
+
+    def facets(self, state=None):
+        return {facet['name']: (facet['venues'], facet['artists'])
+                for facet in genre_facets(state)}
+
+    def test_facets_count_created_venues_and_artists(self):
+        self.add_venue('Park Square', genres=['Jazz', 'Blues'])
+        self.add_venue('Dueling Pianos', state='NY', genres=['Jazz'])
+        self.add_artist('Guns N Petals', genres=['Jazz'])
+
+        self.assertEqual({'Blues': (1, 0), 'Jazz': (1, 1)},
+                         self.facets('CA'))
+        self.assertEqual({'Jazz': (1, 0)}, self.facets('NY'))
+        self.assertEqual({'Blues': (1, 0), 'Jazz': (2, 1)}, self.facets())
+        self.assertEqual({}, self.facets('NV'))
+
+    def test_facets_follow_state_changes(self):
+        venue = self.add_venue('Park Square', genres=['Jazz'])
+        self.add_artist('Guns N Petals', genres=['Jazz'])
+
+        venue.state = 'NV'
+        db.session.commit()
+
+        self.assertEqual({'Jazz': (0, 1)}, self.facets('CA'))
+        self.assertEqual({'Jazz': (1, 0)}, self.facets('NV'))
+
+        venue.state = None
+        db.session.commit()
+
+        self.assertEqual({}, self.facets('NV'))
+        self.assertEqual({'Jazz': (1, 0)}, self.facets(''))
+        self.assertEqual({'Jazz': (1, 1)}, self.facets())
+
+    def test_facets_follow_genre_changes(self):
+        venue = self.add_venue('Park Square', genres=['Jazz', 'Blues'])
+
+        venue.genres = genres_named(['Blues', 'Rock n Roll'])
+        db.session.commit()
+
+        self.assertEqual({'Blues': (1, 0), 'Rock n Roll': (1, 0)},
+                         self.facets('CA'))
+
+        # Both at once
+        venue.genres = genres_named(['Jazz'])
+        venue.state = 'NY'
+        db.session.commit()
+
+        self.assertEqual({}, self.facets('CA'))
+        self.assertEqual({'Jazz': (1, 0)}, self.facets('NY'))
+
+        # Other fields leave the counts alone
+        venue.name = 'Park Square 2'
+        db.session.commit()
+
+        self.assertEqual({'Jazz': (1, 0)}, self.facets())
+
+    def test_facets_follow_deletes(self):
+        venue = self.add_venue('Park Square', genres=['Jazz'])
+        artist = self.add_artist('Guns N Petals', genres=['Jazz', 'Blues'])
+
+        db.session.delete(venue)
+        db.session.commit()
+
+        self.assertEqual({'Blues': (0, 1), 'Jazz': (0, 1)},
+                         self.facets('CA'))
+
+        db.session.delete(artist)
+        db.session.commit()
+
+        self.assertEqual({}, self.facets('CA'))
+        self.assertEqual({}, self.facets())
+
+    def test_facets_roll_back_with_their_write(self):
+        venue = self.add_venue('Park Square', genres=['Jazz'])
+
+        # A flush failing on the primary key counts nothing
+        db.session.add(Venue(id=venue.id + 1, name='Broken', state='CA',
+                             genres=genres_named(['Jazz'])))
+        db.session.add(Venue(id=venue.id + 1, name='Copy', state='CA'))
+        with self.assertRaises(IntegrityError):
+            db.session.commit()
+        db.session.rollback()
+
+        self.assertEqual({'Jazz': (1, 0)}, self.facets('CA'))
+
+    def test_rebuild_genre_facets_command(self):
+        init_genres(self.app)
+        self.add_venue('Park Square', genres=['Jazz'])
+        self.add_venue('Dueling Pianos', state='NY', genres=['Jazz'])
+        self.add_artist('Guns N Petals', genres=['Blues'])
+        expected = {state: self.facets(state) for state in ('CA', 'NY')}
+
+        # Counts gone wrong, e.g. after writes with plain SQL
+        GenreFacet.query.delete()
+        db.session.execute('UPDATE "Venue" SET state = \'NV\' '
+                           'WHERE name = \'Dueling Pianos\'')
+        db.session.commit()
+        self.assertEqual({}, self.facets())
+
+        result = self.app.test_cli_runner().invoke(
+            args=['rebuild-genre-facets'])
+
+        self.assertEqual(0, result.exit_code, result.output)
+        self.assertIn('Counted 3 genres of venues and artists', result.output)
+        self.assertEqual(expected['CA'], self.facets('CA'))
+        self.assertEqual({}, self.facets('NY'))
+        self.assertEqual({'Jazz': (1, 0)}, self.facets('NV'))
+
+        # Listeners keep counting from the rebuilt numbers
+        self.add_artist('Sax', state='NV', genres=['Jazz'])
+        self.assertEqual({'Jazz': (1, 1)}, self.facets('NV'))
+
+
+class FragmentTestCase(FyyurTestCase):
+    """This class represents the cached parts of the venue and show pages"""
+
+    def setUp(self):
+        super().setUp()
+        init_fragment_cache(self.app)
+
+        # Endpoints the layout links to
+        for endpoint in ('venues', 'artists', 'shows', 'genres'):
+            self.app.add_url_rule(f'/{endpoint}', endpoint, lambda: '')
+
+    def render_venues(self, page=1):
+        context = {'areas': VenueListing(page)}
+
+        with self.app.test_request_context('/venues'):
+            self.app.update_template_context(context)
+            template = self.app.jinja_env.get_template('pages/venues.html')
+            return ''.join(template.stream(context))
+
+    def area_versions(self):
+        return {(area['state'], area['city']): area['version']
+                for area in VenueListing()}
+
+    def test_area_versions_follow_writes(self):
+        venue = self.add_venue('Park Square')
+        self.add_venue('The Musical Hop')
+        self.add_venue('Dueling Pianos', city='New York', state='NY')
+        before = self.area_versions()
+
+        self.assertEqual(2, before['CA', 'San Francisco'][0])
+
+        venue.name = 'Park Square 2'
+        db.session.commit()
+        after_edit = self.area_versions()
+
+        self.assertNotEqual(before['CA', 'San Francisco'],
+                            after_edit['CA', 'San Francisco'])
+        self.assertEqual(before['NY', 'New York'],
+                         after_edit['NY', 'New York'])
+
+        db.session.delete(Venue.query.filter_by(
+            name='The Musical Hop').one())
+        db.session.commit()
+
+        self.assertNotEqual(after_edit['CA', 'San Francisco'],
+                            self.area_versions()['CA', 'San Francisco'])
+
+    def test_venues_page_caches_each_area(self):
+        venue = self.add_venue('Park Square')
+        self.add_venue('Dueling Pianos', city='New York', state='NY')
+        cache = get_fragment_cache()
+
+        page = self.render_venues()
+
+        self.assertIn('Park Square', page)
+        self.assertIn('Dueling Pianos', page)
+        self.assertEqual(2, cache.stats()['misses'])
+
+        self.assertEqual(page, self.render_venues())
+        self.assertEqual(2, cache.stats()['hits'])
+
+        # Only the edited area is rendered again
+        venue.name = 'Park Square 2'
+        db.session.commit()
+        page = self.render_venues()
+
+        self.assertIn('Park Square 2', page)
+        self.assertEqual(3, cache.stats()['misses'])
+        self.assertEqual(3, cache.stats()['hits'])
+
+    def test_shows_version_follows_writes(self):
+        venue = self.add_venue('Park Square')
+        artist = self.add_artist('Guns N Petals')
+        other = self.add_artist('Matt Quevedo')
+        versions = [shows_version()]
+
+        show = Show(venue_id=venue.id, artist_id=artist.id,
+                    start_time=datetime.now())
+        db.session.add(show)
+        db.session.commit()
+        versions.append(shows_version())
+
+        db.session.delete(show)
+        db.session.commit()
+        versions.append(shows_version())
+
+        db.session.add(Show(venue_id=venue.id, artist_id=other.id,
+                            start_time=datetime.now()))
+        db.session.commit()
+        versions.append(shows_version())
+
+        # Takes its shows along, and touches their artists
+        db.session.delete(venue)
+        db.session.commit()
+        versions.append(shows_version())
+
+        self.assertEqual(len(versions), len(set(versions)))
+
+
+class ShowTestCase(FyyurTestCase):
+    """This class represents the shows of the venue, artist and show pages"""
+
+    def setUp(self):
+        super().setUp()
+        self.now = datetime(2026, 10, 18, 20, 0)
+        self.venue = self.add_venue('Park Square')
+        self.other_venue = self.add_venue('Dueling Pianos', city='New York',
+                                          state='NY')
+        self.artist = self.add_artist('Guns N Petals')
+        self.other_artist = self.add_artist('Matt Quevedo')
+
+    def add_show(self, venue, artist, hours):
+        show = Show(venue_id=venue.id, artist_id=artist.id,
+                    start_time=self.now + timedelta(hours=hours))
+        db.session.add(show)
+        db.session.commit()
+        return show
+
+    def start_times(self, shows):
+        return [show['start_time'] for show in shows]
+
+    def at(self, hours):
+        return (self.now + timedelta(hours=hours)).isoformat()
+
+    def test_venue_shows_split_at_now(self):
+        self.add_show(self.venue, self.artist, -48)
+        self.add_show(self.venue, self.other_artist, -1)
+        self.add_show(self.venue, self.artist, 2)
+        self.add_show(self.venue, self.artist, 24)
+        self.add_show(self.other_venue, self.artist, 3)
+
+        shows = venue_shows(self.venue.id, self.now)
+
+        # Past shows latest first, upcoming soonest first
+        self.assertEqual([self.at(-1), self.at(-48)],
+                         self.start_times(shows['past_shows']))
+        self.assertEqual([self.at(2), self.at(24)],
+                         self.start_times(shows['upcoming_shows']))
+        self.assertEqual(2, shows['past_shows_count'])
+        self.assertEqual(2, shows['upcoming_shows_count'])
+        self.assertEqual({'artist_id': self.other_artist.id,
+                          'artist_name': 'Matt Quevedo',
+                          'artist_image_link': None,
+                          'start_time': self.at(-1)},
+                         shows['past_shows'][0])
+
+    def test_artist_shows_split_at_now(self):
+        self.add_show(self.venue, self.artist, -2)
+        self.add_show(self.other_venue, self.artist, 5)
+        self.add_show(self.venue, self.other_artist, 1)
+
+        shows = artist_shows(self.artist.id, self.now)
+
+        self.assertEqual([self.at(-2)], self.start_times(shows['past_shows']))
+        self.assertEqual([{'venue_id': self.other_venue.id,
+                           'venue_name': 'Dueling Pianos',
+                           'venue_image_link': None,
+                           'start_time': self.at(5)}],
+                         shows['upcoming_shows'])
+        self.assertEqual(1, shows['past_shows_count'])
+        self.assertEqual(1, shows['upcoming_shows_count'])
+
+    def test_show_moves_from_upcoming_to_past(self):
+        self.add_show(self.venue, self.artist, 1)
+
+        before = venue_details(self.venue.id, self.now)
+        after = venue_details(self.venue.id, self.now + timedelta(hours=2))
+
+        self.assertEqual((0, 1), (before['past_shows_count'],
+                                  before['upcoming_shows_count']))
+        self.assertEqual((1, 0), (after['past_shows_count'],
+                                  after['upcoming_shows_count']))
+        self.assertEqual([self.at(1)], self.start_times(after['past_shows']))
+
+        # A show starting right now has started
+        details = artist_details(self.artist.id, self.now + timedelta(hours=1))
+
+        self.assertEqual(1, details['past_shows_count'])
+        self.assertEqual('Guns N Petals', details['name'])
+
+    def test_details_of_missing_venue_or_artist(self):
+        self.assertIsNone(venue_details(self.venue.id + 100, self.now))
+        self.assertIsNone(artist_details(self.artist.id + 100, self.now))
+
+    def test_details_without_shows(self):
+        details = venue_details(self.venue.id, self.now)
+
+        self.assertEqual('Park Square', details['name'])
+        self.assertEqual([], details['past_shows'])
+        self.assertEqual([], details['upcoming_shows'])
+
+    def test_all_shows(self):
+        self.add_show(self.other_venue, self.other_artist, 4)
+        self.add_show(self.venue, self.artist, -4)
+        # Same start time, listed in the order they were added
+        self.add_show(self.venue, self.other_artist, 4)
+
+        shows = all_shows()
+
+        self.assertEqual([self.at(-4), self.at(4), self.at(4)],
+                         self.start_times(shows))
+        self.assertEqual({'venue_id': self.other_venue.id,
+                          'venue_name': 'Dueling Pianos',
+                          'artist_id': self.other_artist.id,
+                          'artist_name': 'Matt Quevedo',
+                          'artist_image_link': None,
+                          'start_time': self.at(4)}, shows[1])
+        self.assertEqual(self.venue.id, shows[2]['venue_id'])
+
+    def test_shows_go_with_their_venue(self):
+        self.add_show(self.venue, self.artist, 1)
+
+        db.session.delete(self.venue)
+        db.session.commit()
+
+        self.assertEqual([], all_shows())
+        self.assertEqual(0, artist_shows(
+            self.artist.id, self.now)['upcoming_shows_count'])
+
+
+class VenueListingTestCase(FyyurTestCase):
+    """This class represents the /venues listing"""
+
+    def setUp(self):
+        super().setUp()
+        self.now = datetime(2026, 10, 18, 20, 0)
+
+    def listing(self, page=1, per_page=2):
+        return VenueListing(page, per_page, now=self.now)
+
+    def areas(self, listing):
+        return [(area['state'], area['city'],
+                 [venue['name'] for venue in area['venues']])
+                for area in listing]
+
+    def test_venues_grouped_by_area(self):
+        self.add_venue('The Musical Hop')
+        self.add_venue('Dueling Pianos', city='New York', state='NY')
+        self.add_venue('Park Square')
+        self.add_venue('Sunset Room', city='Oakland')
+
+        # Areas by state then city, venues by name
+        self.assertEqual([
+            ('CA', 'Oakland', ['Sunset Room']),
+            ('CA', 'San Francisco', ['Park Square', 'The Musical Hop']),
+            ('NY', 'New York', ['Dueling Pianos']),
+        ], self.areas(self.listing(per_page=10)))
+
+    def test_venues_count_upcoming_shows(self):
+        venue = self.add_venue('Park Square')
+        self.add_venue('The Musical Hop')
+        artist = self.add_artist('Guns N Petals')
+        db.session.add_all([
+            Show(venue_id=venue.id, artist_id=artist.id,
+                 start_time=self.now + timedelta(days=days))
+            for days in (-1, 1, 2)])
+        db.session.commit()
+
+        area, = list(self.listing())
+
+        self.assertEqual({'Park Square': 2, 'The Musical Hop': 0},
+                         {venue['name']: venue['num_upcoming_shows']
+                          for venue in area['venues']})
+
+        # Shows that have started no longer count
+        listing = VenueListing(now=self.now + timedelta(days=3))
+        self.assertEqual(0, list(listing)[0]['venues'][0][
+            'num_upcoming_shows'])
+
+    def test_venues_paged_by_area(self):
+        for number, city in enumerate(['Albany', 'Berkeley', 'Carmel',
+                                       'Davis', 'Eureka']):
+            self.add_venue(f'Venue {number}', city=city)
+            self.add_venue(f'Venue {number} Annex', city=city)
+
+        listing = self.listing()
+        self.assertEqual([('CA', 'Albany', ['Venue 0', 'Venue 0 Annex']),
+                          ('CA', 'Berkeley', ['Venue 1', 'Venue 1 Annex'])],
+                         self.areas(listing))
+        self.assertTrue(listing.has_next)
+        self.assertFalse(listing.has_previous)
+
+        listing = self.listing(2)
+        self.assertEqual(['Carmel', 'Davis'],
+                         [city for state, city, names
+                          in self.areas(listing)])
+        self.assertTrue(listing.has_next)
+        self.assertTrue(listing.has_previous)
+
+        listing = self.listing(3)
+        self.assertEqual(['Eureka'], [city for state, city, names
+                                      in self.areas(listing)])
+        self.assertFalse(listing.has_next)
+        self.assertTrue(listing.has_previous)
+
+        listing = self.listing(4)
+        self.assertEqual([], self.areas(listing))
+        self.assertFalse(listing.has_next)
+
+    def test_has_next_known_once_read(self):
+        for city in ('Albany', 'Berkeley', 'Carmel'):
+            self.add_venue(f'Venue in {city}', city=city)
+
+        listing = self.listing()
+
+        self.assertFalse(listing.has_next)
+        list(listing)
+        self.assertTrue(listing.has_next)
+
+    def test_area_version(self):
+        self.add_venue('Park Square')
+        venue = self.add_venue('The Musical Hop')
+
+        area, = list(self.listing())
+
+        self.assertEqual((2, venue.updated_at), area['version'])
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+"""
+Helpers shared by the benchmark scripts
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from flaskr.stats import rebuild_question_stats  # noqa: E402
+from models import db, Question, Category  # noqa: E402
+
+CATEGORY_TYPES = ['Science', 'Art', 'Geography', 'History',
+                  'Entertainment', 'Sports', ]
+
+# Vocabulary of the synthetic questions, so searches have realistic hit
+# rates instead of every row matching the same word
+WORDS = ['ocean', 'painter', 'river', 'planet', 'empire', 'novel',
+         'mountain', 'battle', 'album', 'island', 'element', 'composer',
+         'desert', 'treaty', 'galaxy', 'sculpture', 'volcano', 'dynasty',
+         'marathon', 'opera', 'glacier', 'satellite', 'cathedral',
+         'championship', 'festival', 'language', 'harbor', 'molecule',
+         'pyramid', 'symphony', 'tournament', 'canyon', ]
+
+SEED_CHUNK_SIZE = 10000
+
+
+def temporary_database():
+    """
+    URL of a new SQLite file in a temporary directory
+    :return: str
+    """
+    return 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'benchmark.db')
+
+
+def synthetic_question(number, rng):
+    words = rng.sample(WORDS, 6)
+    return {'question': f"Which {' '.join(words[:4])} is number {number}?",
+            'answer': ' '.join(words[4:]).title(),
+            'category': number % len(CATEGORY_TYPES) + 1,
+            'difficulty': number % 5 + 1}
+
+
+def seed(rows, random_seed=0):
+    """
+    Fill the database up to rows synthetic questions. Needs an app
+    context. Creates the tables of an empty database first.
+    :param rows:
+    :param random_seed: makes the question text repeatable
+    """
+    db.create_all()
+    rng = random.Random(random_seed)
+
+    if not Category.query.count():
+        db.session.bulk_insert_mappings(Category, [
+            {'id': number, 'type': category_type}
+            for number, category_type in enumerate(CATEGORY_TYPES,
+                                                   start=1)])
+
+    existing = Question.query.count()
+
+    for start in range(existing, rows, SEED_CHUNK_SIZE):
+        db.session.bulk_insert_mappings(Question, [
+            synthetic_question(number, rng)
+            for number in range(start, min(start + SEED_CHUNK_SIZE, rows))])
+        db.session.commit()
+
+    db.session.commit()
+
+    # Bulk inserts skip the question counters
+    rebuild_question_stats()
+
+
+def percentile(timings, fraction):
+    ordered = sorted(timings)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def summarize(timings, errors, seconds):
+    """
+    Latency percentiles and throughput of a run
+    :param timings: list of seconds per request
+    :param errors: number of failed requests
+    :param seconds: wall clock time of the run
+    :return: dict
+    """
+    if not timings:
+        return {'requests': 0, 'errors': errors}
+
+    return {
+        'requests': len(timings),
+        'errors': errors,
+        'seconds': round(seconds, 3),
+        'throughput': round(len(timings) / seconds, 1),
+        'p50_ms': round(statistics.median(timings) * 1000, 2),
+        'p95_ms': round(percentile(timings, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(timings, 0.99) * 1000, 2),
+    }
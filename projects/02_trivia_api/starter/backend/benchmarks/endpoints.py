@@ -0,0 +1,239 @@
+"""
+Seed a synthetic question bank and time every trivia route, through the
+Flask test client and over HTTP, reporting p50/p95/p99 latency and
+throughput per route as JSON so runs can be diffed.
+
+Run from the backend directory:
+    python benchmarks/endpoints.py --rows 100000 --output before.json
+    python benchmarks/endpoints.py --rows 100000 --output after.json
+
+Uses a temporary SQLite file unless --database names another database.
+A PostgreSQL database has to be migrated (flask db upgrade) first.
+Questions are only added, so a database can be reused across runs.
+"""
+import argparse
+import http.client
+import json
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+from werkzeug.serving import make_server
+
+from common import CATEGORY_TYPES, WORDS, seed, summarize, \
+    temporary_database
+from flaskr import create_app
+from flaskr.pagination import QUESTIONS_PER_PAGE
+from models import db
+
+DRIVERS = ['client', 'http', ]
+
+
+def list_questions(send, rng, rows):
+    page = rng.randint(1, max(rows // QUESTIONS_PER_PAGE, 1))
+    return [send('GET', f'/questions?page={page}')[0]]
+
+
+def category_questions(send, rng, rows):
+    category = rng.randrange(len(CATEGORY_TYPES))
+    return [send('GET', f'/categories/{category}/questions')[0]]
+
+
+def question_stats(send, rng, rows):
+    return [send('GET', '/questions/stats')[0]]
+
+
+def search_questions(send, rng, rows):
+    term = ' '.join(rng.sample(WORDS, rng.randint(1, 2)))
+    return [send('POST', '/questions/search', {'searchTerm': term})[0]]
+
+
+def quiz(send, rng, rows):
+    category = rng.randrange(len(CATEGORY_TYPES))
+    previous = [rng.randint(1, rows) for _ in range(rng.randint(0, 5))]
+    return [send('POST', '/quizzes', {
+        'previous_questions': previous,
+        'quiz_category': {'type': CATEGORY_TYPES[category],
+                          'id': category}})[0]]
+
+
+def create_and_delete(send, rng, rows):
+    status, body = send('POST', '/questions', {
+        'question': 'Benchmark question?', 'answer': 'Benchmark answer',
+        'category': rng.randrange(len(CATEGORY_TYPES)), 'difficulty': 1})
+
+    if status != 200:
+        return [status]
+
+    question_id = json.loads(body)['id']
+    return [status, send('DELETE', f'/questions/{question_id}')[0]]
+
+
+SCENARIOS = {
+    'list_questions': list_questions,
+    'category_questions': category_questions,
+    'search_questions': search_questions,
+    'question_stats': question_stats,
+    'quiz': quiz,
+    'create_and_delete': create_and_delete,
+}
+
+
+def client_sender(app):
+    client = app.test_client()
+
+    def send(method, path, body=None):
+        response = client.open(path, method=method, json=body)
+        return response.status_code, response.get_data()
+
+    return send
+
+
+def http_sender(url):
+    connection = http.client.HTTPConnection(url.hostname, url.port or 80,
+                                            timeout=30)
+    headers = {'Content-Type': 'application/json'}
+
+    def send(method, path, body=None):
+        try:
+            connection.request(method, path, headers=headers,
+                               body=None if body is None
+                               else json.dumps(body))
+            response = connection.getresponse()
+            return response.status, response.read()
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            return 599, b''
+
+    return send
+
+
+def run_scenario(make_sender, scenario, rows, requests, concurrency,
+                 random_seed):
+    """
+    Run a scenario requests times spread over concurrency threads.
+    One timing is one run of the scenario, which is one request except
+    for create_and_delete. Any status of 500 or more counts as an error.
+    """
+    timings = []
+    errors = []
+    lock = threading.Lock()
+    per_thread = max(requests // concurrency, 1)
+
+    def worker(number):
+        send = make_sender()
+        rng = random.Random(random_seed * 1000 + number)
+
+        for _ in range(per_thread):
+            start = time.perf_counter()
+            statuses = scenario(send, rng, rows)
+            elapsed = time.perf_counter() - start
+
+            with lock:
+                timings.append(elapsed)
+                if max(statuses) >= 500:
+                    errors.append(elapsed)
+
+    threads = [threading.Thread(target=worker, args=(number,))
+               for number in range(concurrency)]
+
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return summarize(timings, len(errors), time.perf_counter() - start)
+
+
+def serve(app):
+    """
+    Serve the app over HTTP on a free local port in a background thread
+    :return: tuple of (server, url)
+    """
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000,
+                        help='questions in the bank, e.g. 1000 to 1000000')
+    parser.add_argument('--database', default=None,
+                        help='database URL, defaults to a temporary '
+                             'SQLite file')
+    parser.add_argument('--driver', choices=DRIVERS + ['all'],
+                        default='all')
+    parser.add_argument('--url', default=None,
+                        help='drive an already running server on the same '
+                             'database instead of serving one')
+    parser.add_argument('--scenario', choices=list(SCENARIOS),
+                        action='append', default=None,
+                        help='defaults to every scenario')
+    parser.add_argument('--requests', type=int, default=1000,
+                        help='runs per scenario and driver')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--no-response-cache', action='store_true',
+                        help='measure the views instead of the cache')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None,
+                        help='also write the results to this file')
+    args = parser.parse_args()
+
+    config = {'SQLALCHEMY_DATABASE_URI':
+              args.database or temporary_database()}
+    if args.no_response_cache:
+        config['RESPONSE_CACHE_SIZE'] = 0
+
+    app = create_app(config)
+
+    with app.app_context():
+        seed(args.rows, args.seed)
+        dialect = db.engine.dialect.name
+
+    drivers = DRIVERS if args.driver == 'all' else [args.driver]
+    scenarios = args.scenario or list(SCENARIOS)
+    results = {}
+    server = None
+
+    for driver in drivers:
+        if driver == 'client':
+            def make_sender():
+                return client_sender(app)
+        else:
+            url = args.url
+            if url is None:
+                server, url = serve(app)
+
+            def make_sender(url=urlsplit(url)):
+                return http_sender(url)
+
+        results[driver] = {
+            name: run_scenario(make_sender, SCENARIOS[name], args.rows,
+                               args.requests, args.concurrency, args.seed)
+            for name in scenarios}
+
+    if server is not None:
+        server.shutdown()
+
+    report = json.dumps({
+        'rows': args.rows,
+        'database': dialect,
+        'concurrency': args.concurrency,
+        'requests': args.requests,
+        'response_cache': not args.no_response_cache,
+        'results': results,
+    }, indent=2, sort_keys=True)
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(report + '\n')
+
+    print(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Send concurrent requests to a running trivia server and report latency
+percentiles and throughput, e.g. to compare gunicorn settings:
+
+    gunicorn -k gthread -w 4 --threads 15 -b 127.0.0.1:5000 \
+        'flaskr:create_app()'
+    gunicorn -k gthread -w 8 --threads 4 -b 127.0.0.1:5001 \
+        'flaskr:create_app()'
+
+    python benchmarks/load.py --url http://127.0.0.1:5000 --concurrency 200
+    python benchmarks/load.py --url http://127.0.0.1:5001 --concurrency 200
+"""
+import argparse
+import http.client
+import json
+import threading
+import time
+from urllib.parse import urlsplit
+
+from common import summarize
+
+QUIZ_BODY = json.dumps({'previous_questions': [],
+                        'quiz_category': {'type': 'click', 'id': 0}})
+
+
+def worker(url, method, path, body, count, timings, errors, lock):
+    connection = http.client.HTTPConnection(url.hostname, url.port or 80,
+                                            timeout=30)
+    headers = {'Content-Type': 'application/json'}
+
+    for _ in range(count):
+        start = time.perf_counter()
+        try:
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            failed = response.status >= 500
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            failed = True
+
+        elapsed = time.perf_counter() - start
+
+        with lock:
+            timings.append(elapsed)
+            if failed:
+                errors.append(elapsed)
+
+    connection.close()
+
+
+def run(url, method, path, body, concurrency, requests):
+    timings = []
+    errors = []
+    lock = threading.Lock()
+    per_worker = max(requests // concurrency, 1)
+    threads = [threading.Thread(target=worker,
+                                args=(url, method, path, body, per_worker,
+                                      timings, errors, lock))
+               for _ in range(concurrency)]
+
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    return summarize(timings, len(errors), elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--method', default='POST')
+    parser.add_argument('--path', default='/quizzes')
+    parser.add_argument('--body', default=QUIZ_BODY,
+                        help='JSON body, defaults to a quiz draw')
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=5000)
+    args = parser.parse_args()
+
+    body = args.body if args.method in ('POST', 'PATCH') else None
+    result = run(urlsplit(args.url), args.method, args.path, body,
+                 args.concurrency, args.requests)
+
+    print(json.dumps(dict({'url': args.url, 'method': args.method,
+                           'path': args.path,
+                           'concurrency': args.concurrency}, **result),
+                     indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Compare the ORM read path (Question.query + format() + jsonify) with the
+column read path (question_rows() + format_rows() + json_response).
+
+Run from the backend directory:
+    python benchmarks/serialization.py --rows 100000
+"""
+import argparse
+import json
+import statistics
+import time
+
+from flask import jsonify
+
+from common import seed, temporary_database
+from flaskr import create_app
+from flaskr.serialize import question_rows, format_rows, \
+    json_response, orjson
+from models import db, Question
+
+
+def orm_path():
+    selection = Question.query.order_by(Question.id).all()
+    questions = [question.format() for question in selection]
+    return jsonify({'success': True, 'questions': questions}).get_data()
+
+
+def column_path():
+    questions = format_rows(question_rows().order_by(Question.id).all())
+    return json_response({'success': True, 'questions': questions}).get_data()
+
+
+def measure(path, repeat):
+    timings = []
+
+    for _ in range(repeat):
+        db.session.expunge_all()
+        start = time.perf_counter()
+        path()
+        timings.append(time.perf_counter() - start)
+
+    return {'best_ms': round(min(timings) * 1000, 2),
+            'median_ms': round(statistics.median(timings) * 1000, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--database', default=None,
+                        help='Database URL, defaults to a temporary '
+                             'SQLite file')
+    args = parser.parse_args()
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI':
+                      args.database or temporary_database()})
+
+    with app.test_request_context():
+        seed(args.rows)
+        orm = measure(orm_path, args.repeat)
+        columns = measure(column_path, args.repeat)
+
+    print(json.dumps({
+        'rows': args.rows,
+        'encoder': 'orjson' if orjson is not None else 'json',
+        'orm': orm,
+        'columns': columns,
+        'speedup': round(orm['median_ms'] / columns['median_ms'], 2),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,32 +1,95 @@
 import os
-from flask import Flask, request, abort, jsonify, Response
+from flask import Flask, request, abort, jsonify, Response, g, \
+    stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
+from fsnd_common.config import ops_endpoints
+from fsnd_common.metrics import Metrics, sqlalchemy_pool_collector
+from fsnd_common.pool import pool_stats
 import random
 
-from models import setup_db, Question, Category
+from models import db, setup_db, database_path, Question, Category
+from .aggregates import init_aggregates, get_aggregates
+from .batch import apply_batch
+from .cache import QUESTIONS_TAG, CATEGORY_TAG, init_response_cache, \
+    get_response_cache, cached, category_tag, response_cache_samples
+from .instrument import init_instrumentation, get_instrumentation
+from .pagination import paginate
+from .quiz import init_quiz, get_deck, draw_question, quiz_category_id, \
+    valid_previous_questions, valid_quiz_category
+from .search import init_search, search_questions, stream_search
+from .serialize import STREAM_FORMATS, question_rows, format_rows, \
+    get_question, json_response, stream_rows, stream_response
+from .sessions import init_sessions, get_sessions
+from .stats import init_stats, question_stats
+from .transfer import KNOWN_JSON_PROPERTIES, TRANSFER_FORMATS, \
+    init_transfer, import_questions, export_questions
+from .versions import init_versions, get_versions
+
+# Read endpoints whose responses only change when these tables do.
+# They get an ETag built from the table versions and conditional GETs
+# are answered with 304 Not Modified before the view runs.
+CONDITIONAL_ENDPOINTS = {
+    'categories': ['categories', ],
+    'get_specific_category': ['categories', ],
+    'get_questions_for_category': ['questions', 'categories', ],
+    'get_questions': ['questions', 'categories', ],
+    'get_question_stats': ['questions', 'categories', ],
+}
+CONDITIONAL_MAX_AGE = 0
+
+# Conditional endpoints that can stream their list (see stream_format).
+# Each representation gets its own ETag.
+STREAMING_ENDPOINTS = {'get_questions_for_category', }
+
+
+def minimal_response(request):
+    """
+    Check if the client only wants the id and question count back from
+    a write, instead of a page of questions. Ask for it with a
+    response=minimal query parameter or a Prefer: return=minimal header.
+
+    :param request:
+    :return: bool
+    """
+    if request.args.get('response', None) == 'minimal':
+        return True
 
-QUESTIONS_PER_PAGE = 10
-KNOWN_JSON_PROPERTIES = ['question', 'answer', 'category', 'difficulty', ]
+    preferences = request.headers.get('Prefer', '').lower().split(',')
 
+    return 'return=minimal' in [preference.split(';')[0].strip()
+                                for preference in preferences]
 
-def paginate(request, selection):
+
+def stream_format(request):
     """
-    Take in a web request and check for the desired output page.
-    If none is provided default to page one.
-    Take all objects in selection and return 10 per page.
+    Check if the client wants a list streamed as it is read, instead
+    of built in memory first. Ask for it with stream=json or
+    stream=ndjson, or an Accept: application/x-ndjson header.
 
     :param request:
-    :param selection:
-    :return: list
+    :return: 'json', 'ndjson' or None
     """
-    page = request.args.get('page', 1, type=int)
-    start = (page - 1) * QUESTIONS_PER_PAGE
-    end = start + QUESTIONS_PER_PAGE
+    fmt = request.args.get('stream', None)
+
+    if fmt is None:
+        if request.accept_mimetypes.best == 'application/x-ndjson':
+            return 'ndjson'
+        return None
+
+    if fmt not in STREAM_FORMATS:
+        abort(422, f"Unsupported stream format {fmt}")
+
+    return fmt
 
-    some_models = [some_model.format() for some_model in selection]
 
-    return some_models[start:end]
+def write_response(json_message, minimal):
+    response = jsonify(json_message)
+
+    if minimal:
+        response.headers['Preference-Applied'] = 'return=minimal'
+
+    return response
 
 
 """
@@ -37,9 +100,49 @@ Init web service
 def create_app(test_config=None):
     # create and configure the app
     app = Flask(__name__)
-    setup_db(app)
+
+    if test_config:
+        app.config.from_mapping(test_config)
+
+    setup_db(app, app.config.get('SQLALCHEMY_DATABASE_URI', database_path))
+    init_instrumentation(app)
+    metrics = Metrics(app)
+    init_aggregates(app)
+    init_search(app)
+    init_quiz(app)
+    init_sessions(app)
+    init_stats(app)
+    init_transfer(app)
+    init_versions(app)
+    init_response_cache(app)
+    metrics.add_collector(sqlalchemy_pool_collector(db))
+    metrics.add_collector(response_cache_samples)
     cors = CORS(app, resources={r"/*": {"origins": "*"}})
 
+    @app.before_request
+    def before_request():
+        """
+        Answer a conditional GET whose ETag still matches the table
+        versions with 304 Not Modified, without touching the database
+        :return: response or None to run the view
+        """
+        tables = CONDITIONAL_ENDPOINTS.get(request.endpoint, None)
+
+        if tables is None or request.method not in ('GET', 'HEAD'):
+            return None
+
+        g.etag = get_versions().etag(tables)
+
+        if request.endpoint in STREAMING_ENDPOINTS:
+            fmt = stream_format(request)
+            if fmt is not None:
+                g.etag = f'{g.etag}-{fmt}'
+
+        if request.if_none_match.contains_weak(g.etag):
+            return Response(status=304)
+
+        return None
+
     @app.after_request
     def after_request(response):
         """
@@ -51,6 +154,18 @@ def create_app(test_config=None):
                              'Content-Type,Authorization,true')
         response.headers.add('Access-Control-Allow-Methods',
                              'GET,PATCH,POST,DELETE,OPTIONS')
+
+        etag = g.get('etag', None)
+
+        if etag is not None and response.status_code in (200, 304):
+            response.set_etag(etag)
+            # The stream format can come from the Accept header
+            response.vary.add('Accept')
+            response.headers['Cache-Control'] = \
+                'public, max-age={}, must-revalidate'.format(
+                    app.config.get('CONDITIONAL_MAX_AGE',
+                                   CONDITIONAL_MAX_AGE))
+
         return response
 
     @app.route('/categories', methods=['GET'])
@@ -59,9 +174,7 @@ def create_app(test_config=None):
         Get all categories
         :return: json object
         """
-        selection = Category.query.order_by(Category.id).all()
-
-        categories = [category.format() for category in selection]
+        categories = get_aggregates().categories()
 
         category_names = []
         for category in categories:
@@ -86,15 +199,26 @@ def create_app(test_config=None):
         })
 
     @app.route('/categories/<int:cat_id>/questions', methods=['GET', ])
+    @cached(lambda cat_id: [category_tag(cat_id + 1), CATEGORY_TAG])
     def get_questions_for_category(cat_id):
         """
-        Get set of questions that are associated with a category
+        Get set of questions that are associated with a category.
+        Large categories can be streamed, see stream_format.
         :param cat_id:
         :return: json object
         """
         cat_id = cat_id + 1
-        selection = Question.query.filter(Question.category == cat_id).all()
-        formatted_questions = [some_model.format() for some_model in selection]
+        query = question_rows().filter(
+            Question.category == cat_id).order_by(Question.id)
+        fmt = stream_format(request)
+
+        if fmt is not None:
+            return stream_response(
+                stream_rows(query), fmt,
+                f"No questions found for category id {cat_id}")
+
+        selection = query.all()
+        formatted_questions = format_rows(selection)
 
         if not formatted_questions:
             abort(404, f"No questions found for category id {cat_id}")
@@ -105,9 +229,10 @@ def create_app(test_config=None):
             "total_questions": len(formatted_questions),
         }
 
-        return jsonify(json_message)
+        return json_response(json_message)
 
     @app.route('/questions', methods=['GET'])
+    @cached(lambda: [QUESTIONS_TAG])
     def get_questions():
         """
         Get all questions in the database but paginate
@@ -118,40 +243,34 @@ def create_app(test_config=None):
         """
         json_message = ""
 
-        selection_questions = Question.query.order_by(Question.id).all()
-        current_questions = paginate(request, selection_questions)
-        selection_categories = Category.query.order_by(Category.id).all()
+        current_questions, page, next_cursor = paginate(
+            request, question_rows(), Question.id)
 
-        if request.args.get('page', None):
+        if request.args.get('page', None) or request.args.get('cursor', None):
             if len(current_questions) == 0:
                 abort(404, "")
 
-            categories = []
-
-            for category in selection_categories:
-                categories.append(category.type)
-
-            json_message = {
-                "success": True,
-                "questions": current_questions,
-                "total_questions": len(Question.query.all()),
-                "categories": categories,
-            }
-
-        else:
-            categories = []
+        aggregates = get_aggregates()
 
-            for category in selection_categories:
-                categories.append(category.type)
+        json_message = {
+            "success": True,
+            "questions": current_questions,
+            "total_questions": aggregates.total_questions(),
+            "categories": aggregates.category_types(),
+            "page": page,
+            "next_cursor": next_cursor,
+        }
 
-            json_message = {
-                "success": True,
-                "questions": current_questions,
-                "total_questions": len(Question.query.all()),
-                "categories": categories,
-            }
+        return json_response(json_message)
 
-        return jsonify(json_message)
+    @app.route('/questions/stats', methods=['GET'])
+    def get_question_stats():
+        """
+        Get the number of questions per category and per difficulty,
+        read from counters instead of the questions table
+        :return: json object
+        """
+        return jsonify(dict(question_stats(), success=True))
 
     @app.route('/questions/<int:question_id>', methods=['DELETE'])
     def delete_question(question_id):
@@ -168,13 +287,19 @@ def create_app(test_config=None):
 
         question.delete()
 
-        selection = Question.query.order_by(Question.id).all()
-        current_questions = paginate(request, selection)
-
-        return jsonify({'success': True,
+        minimal = minimal_response(request)
+        json_message = {'success': True,
                         'deleted': question_id,
-                        'questions': current_questions,
-                        'total_questions': len(selection)})
+                        'total_questions': get_aggregates().total_questions()}
+
+        if not minimal:
+            current_questions, page, next_cursor = paginate(
+                request, question_rows(), Question.id)
+            json_message.update({'questions': current_questions,
+                                 'page': page,
+                                 'next_cursor': next_cursor})
+
+        return write_response(json_message, minimal)
 
     @app.route('/questions', methods=['POST', ])
     def create_question():
@@ -214,26 +339,96 @@ def create_app(test_config=None):
                                     difficulty=difficulty)
             new_question.insert()
 
-            selection = Question.query.order_by(Question.id).all()
-            current_questions = paginate(request, selection)
-
-            return jsonify({
-                'success': True,
-                'id': new_question.id,
-                'questions': current_questions,
-                'total_questions': len(selection)
-            })
-
         except Exception as e:
             abort(500)
 
-        return jsonify({'success': False})
+        minimal = minimal_response(request)
+        json_message = {'success': True,
+                        'id': new_question.id,
+                        'total_questions': get_aggregates().total_questions()}
+
+        if not minimal:
+            current_questions, page, next_cursor = paginate(
+                request, question_rows(), Question.id)
+            json_message.update({'questions': current_questions,
+                                 'page': page,
+                                 'next_cursor': next_cursor})
+
+        return write_response(json_message, minimal)
+
+    @app.route('/questions/batch', methods=['POST', ])
+    def batch_questions():
+        """
+        Delete or update sets of questions picked by a list of ids
+        and/or a category and difficulty filter. Every operation runs
+        as one statement and all operations share one transaction.
+        Category ids are database ids.
+        :return: json object
+        """
+        body = request.get_json()
+
+        operations = body.get('operations', None)
+        affected = apply_batch(operations)
+
+        return jsonify({
+            'success': True,
+            'affected': affected,
+            'total_affected': sum(affected),
+            'total_questions': get_aggregates().total_questions()
+        })
+
+    @app.route('/questions/import', methods=['POST', ])
+    def import_question_batch():
+        """
+        Bulk load questions from the request body, one question per
+        line as JSON Lines (default) or CSV with a header row.
+        The body is read as a stream and inserted in chunks.
+        Category ids are database ids, the same as in an export.
+        :return: json object
+        """
+        fmt = request.args.get('format', None)
+
+        if fmt is None:
+            fmt = 'csv' if request.mimetype == 'text/csv' else 'jsonl'
+
+        if fmt not in TRANSFER_FORMATS:
+            abort(422, f"Unsupported import format {fmt}")
+
+        lines = (line.decode('utf-8', 'replace') for line in request.stream)
+        imported, failed, errors = import_questions(lines, fmt)
+
+        return jsonify({'success': True,
+                        'imported': imported,
+                        'failed': failed,
+                        'errors': errors,
+                        'total_questions': get_aggregates().total_questions()})
+
+    @app.route('/questions/export', methods=['GET', ])
+    def export_question_batch():
+        """
+        Stream every question as JSON Lines (default) or CSV
+        :return: streamed response
+        """
+        fmt = request.args.get('format', 'jsonl')
+
+        if fmt not in TRANSFER_FORMATS:
+            abort(422, f"Unsupported export format {fmt}")
+
+        mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+
+        return Response(stream_with_context(export_questions(fmt)),
+                        mimetype=mimetype,
+                        headers={'Content-Disposition':
+                                 f'attachment; filename=questions.{fmt}'})
 
     @app.route('/questions/search', methods=['POST', ])
+    @cached(lambda: [QUESTIONS_TAG])
     def find_question():
         """
-        Take in provided string and return all
-        questions that partially match search term.
+        Take in provided string and return one page of
+        questions whose question or answer text matches
+        every word of the search term, best matches first.
+        Streamed responses (see stream_format) hold every match.
         :return: json object
         """
         body = request.get_json()
@@ -243,24 +438,73 @@ def create_app(test_config=None):
         if search_term is None:
             abort(422, 'Missing question search term')
 
-        selection = Question.query.filter(
-            Question.question.ilike(f'%{search_term}%')).all()
+        fmt = stream_format(request)
+
+        if fmt is not None:
+            return stream_response(
+                stream_search(search_term), fmt,
+                f"Unable to locate any questions "
+                f"based on search term {search_term}",
+                totals=('totalQuestions', 'total_questions'))
+
+        page = body.get('page', request.args.get('page', 1, type=int))
+
+        try:
+            page = int(page)
+        except (TypeError, ValueError):
+            abort(422, 'Invalid page number')
+
+        if page < 1:
+            abort(422, 'Invalid page number')
 
-        if not selection:
+        questions, total = search_questions(search_term, page)
+
+        if not questions:
             abort(
                 404, f"Unable to locate any questions "
                      f"based on search term {search_term}")
 
-        questions = [some_model.format() for some_model in selection]
-
         json_message = {
             "success": True,
             "questions": questions,
-            "totalQuestions": len(questions),
-            "currentCategory": None
+            "totalQuestions": total,
+            "total_questions": total,
+            "currentCategory": None,
+            "page": page
         }
 
-        return jsonify(json_message)
+        return json_response(json_message)
+
+    @app.route('/cache/stats', methods=['GET', ])
+    def response_cache_stats():
+        """
+        Get the response cache hit, miss and eviction counters
+        :return: json object
+        """
+        return jsonify(dict(get_response_cache().stats(), success=True))
+
+    if ops_endpoints(app):
+        @app.route('/db/pool', methods=['GET', ])
+        def database_pool_stats():
+            """
+            Get the database connection pool state and wait counters
+            :return: json object
+            """
+            return jsonify(dict(pool_stats(db.engine), success=True))
+
+        @app.route('/db/queries', methods=['GET', ])
+        def database_query_stats():
+            """
+            Get query counts, rows and timings per endpoint
+            :return: json object
+            """
+            instrumentation = get_instrumentation()
+
+            if instrumentation is None:
+                abort(404, 'SQL instrumentation is turned off')
+
+            return jsonify({'success': True,
+                            'endpoints': instrumentation.stats()})
 
     @app.route('/quizzes', methods=['POST', ])
     def get_quizzes():
@@ -275,75 +519,122 @@ def create_app(test_config=None):
 
         body = request.get_json()
 
+        if not isinstance(body, dict):
+            abort(400, 'Request body must be a JSON object')
+
         previous_questions = body.get('previous_questions', None)
 
+        if not valid_previous_questions(previous_questions):
+            abort(422, 'Previous questions must be a list of question ids')
+
         quiz_category = body.get('quiz_category', None)
 
-        real_id = 0
+        if quiz_category is None:
+            abort(422, 'Missing quiz category property')
+
+        if not valid_quiz_category(quiz_category):
+            abort(422, 'Quiz category must have a type and a numeric id')
 
-        if quiz_category['type'] == 'click':
-            possible_categories = Category.query.all()
-            id_list = []
+        real_id = quiz_category_id(quiz_category)
 
-            for category in possible_categories:
-                id_list.append(category.id)
+        if not get_deck().question_ids(real_id):
+            abort(
+                404, f"Provided category id {quiz_category['id']} not found!")
 
-            real_id = random.choice(id_list)
+        new_question, question_count = draw_question(real_id,
+                                                     previous_questions)
 
+        if new_question:
+            json_message = jsonify({'success': True,
+                                    'question': new_question,
+                                    'question_count': question_count})
         else:
-            real_id = int(quiz_category['id'])
-            real_id = real_id + 1
+            json_message = jsonify({'success': False,
+                                    'question': None})
+
+        return json_message
+
+    @app.route('/quizzes/sessions', methods=['POST', ])
+    def start_quiz_session():
+        """
+        Start a quiz on the server so the client does not need to
+        send previously presented question ids with every question.
+        The questions of the category are shuffled into a deck kept
+        with the session.
+        :return: json object
+        """
+        body = request.get_json()
+
+        if not isinstance(body, dict):
+            abort(400, 'Request body must be a JSON object')
+
+        quiz_category = body.get('quiz_category', None)
 
-        selection = Question.query.filter(Question.category == real_id).all()
+        if quiz_category is None:
+            abort(422, 'Missing quiz category property')
 
-        if not selection:
+        if not valid_quiz_category(quiz_category):
+            abort(422, 'Quiz category must have a type and a numeric id')
+
+        real_id = quiz_category_id(quiz_category)
+        question_ids = get_deck().question_ids(real_id)
+
+        if not question_ids:
             abort(
                 404, f"Provided category id {quiz_category['id']} not found!")
 
-        question_ids = []
+        session_id, question_count = get_sessions().create(question_ids)
 
-        for question in selection:
-            safe_to_add = True
-            for old_question in previous_questions:
-                if question.id == old_question:
-                    safe_to_add = False
-                    break
-            if safe_to_add:
-                question_ids.append(question.id)
+        return jsonify({'success': True,
+                        'session_id': session_id,
+                        'question_count': question_count})
 
-        id_count = len(question_ids)
+    @app.route('/quizzes/sessions/<session_id>/next', methods=['POST', ])
+    def next_quiz_question(session_id):
+        """
+        Take the next question off a quiz session's deck
+        :param session_id:
+        :return: json object
+        """
+        sessions = get_sessions()
+        new_question = None
 
-        picked_id = None
+        try:
+            while new_question is None:
+                question_id, question_count = sessions.pop(session_id)
 
-        if id_count > 1:
-            picked_id = random.choice(question_ids)
-        elif id_count == 1:
-            picked_id = question_ids[0]
+                if question_id is None:
+                    break
 
-        new_question = None
+                # Questions deleted since the deck was dealt are skipped
+                new_question = get_question(question_id)
 
-        for question in selection:
-            if question.id == picked_id:
-                new_question = question
-                break
+        except KeyError:
+            abort(404, f"Quiz session {session_id} not found!")
 
         if new_question:
-            # abort(500)
             json_message = jsonify({'success': True,
-                                    'question': {
-                                        'id': new_question.id,
-                                        'question': new_question.question,
-                                        'answer': new_question.answer,
-                                        'category': new_question.category,
-                                        'difficulty': new_question.difficulty
-                                    },
-                                    'question_count': len(question_ids)})
+                                    'question': new_question,
+                                    'question_count': question_count})
         else:
             json_message = jsonify({'success': False,
                                     'question': None})
 
         return json_message
 
+    @app.route('/quizzes/sessions/<session_id>', methods=['DELETE', ])
+    def end_quiz_session(session_id):
+        """
+        End a quiz session
+        :param session_id:
+        :return: json object
+        """
+        if not get_sessions().delete(session_id):
+            abort(404, f"Quiz session {session_id} not found!")
+
+        return jsonify({'success': True,
+                        'deleted': session_id})
+
     @app.errorhandler(400)
     def not_found(error):
         message = "bad request"
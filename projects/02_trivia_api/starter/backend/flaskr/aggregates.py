@@ -0,0 +1,130 @@
+import threading
+import time
+
+from flask import current_app, has_app_context
+from sqlalchemy import func
+
+from models import db, Question, Category, question_listeners
+
+AGGREGATE_CACHE_TTL = 60
+
+
+class AggregateCache:
+    """
+    Keep per-category question counts and the category list in memory
+    so list endpoints do not have to scan the questions table.
+    A cold cache is filled with one grouped COUNT(*). Writes made through
+    Question.insert()/delete() keep the counts current, anything else
+    drops them. Entries also expire after ttl seconds so writes made by
+    other workers are picked up.
+    """
+
+    def __init__(self, ttl=AGGREGATE_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._counts = None
+        self._counts_loaded = 0
+        self._categories = None
+        self._categories_loaded = 0
+
+    def _expired(self, loaded):
+        return time.monotonic() - loaded > self.ttl
+
+    def category_counts(self):
+        """
+        Get the number of questions in each category
+        :return: dict of category id to count
+        """
+        with self._lock:
+            if self._counts is None or self._expired(self._counts_loaded):
+                rows = db.session.query(
+                    Question.category, func.count(Question.id)).group_by(
+                    Question.category).all()
+                self._counts = dict(rows)
+                self._counts_loaded = time.monotonic()
+
+            return dict(self._counts)
+
+    def total_questions(self):
+        """
+        Get the number of questions in all categories
+        :return: int
+        """
+        return sum(self.category_counts().values())
+
+    def categories(self):
+        """
+        Get all categories ordered by id
+        :return: list of formatted categories
+        """
+        with self._lock:
+            if self._categories is None or \
+                    self._expired(self._categories_loaded):
+                selection = Category.query.order_by(Category.id).all()
+                self._categories = [category.format()
+                                    for category in selection]
+                self._categories_loaded = time.monotonic()
+
+            return list(self._categories)
+
+    def category_types(self):
+        """
+        Get the names of all categories ordered by id
+        :return: list of str
+        """
+        return [category['type'] for category in self.categories()]
+
+    def question_written(self, action, category):
+        """
+        Adjust the counts after a committed question write
+        :param action: 'insert', 'update' or 'delete'
+        :param category: category of the question or None if unknown
+        """
+        with self._lock:
+            if self._counts is None:
+                return
+
+            key = int(category) if category is not None else None
+
+            if action == 'insert' and key is not None:
+                self._counts[key] = self._counts.get(key, 0) + 1
+            elif action == 'delete' and self._counts.get(key):
+                self._counts[key] = self._counts[key] - 1
+            else:
+                self._counts = None
+
+    def clear(self):
+        with self._lock:
+            self._counts = None
+            self._categories = None
+
+
+def init_aggregates(app):
+    """
+    Attach an aggregate cache to the app
+    :param app:
+    :return: AggregateCache
+    """
+    cache = AggregateCache(app.config.get('AGGREGATE_CACHE_TTL',
+                                          AGGREGATE_CACHE_TTL))
+    app.extensions['trivia_aggregates'] = cache
+    return cache
+
+
+def get_aggregates():
+    return current_app.extensions['trivia_aggregates']
+
+
+def _question_written(action, category):
+    # Writes made outside of a request (scripts, tests) have no app
+    # to look a cache up on; the ttl takes care of those.
+    if not has_app_context():
+        return
+
+    cache = current_app.extensions.get('trivia_aggregates')
+
+    if cache is not None:
+        cache.question_written(action, category)
+
+
+question_listeners.append(_question_written)
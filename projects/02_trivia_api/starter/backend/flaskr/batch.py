@@ -0,0 +1,157 @@
+from collections import Counter
+
+from flask import abort
+from sqlalchemy.exc import SQLAlchemyError
+
+from models import db, Question, Category, notify_question_listeners
+from .stats import count_questions, counted_write, question_changes
+
+BATCH_ACTIONS = ['delete', 'update', ]
+BATCH_FILTERS = ['category', 'difficulty', ]
+BATCH_VALUES = ['question', 'answer', 'category', 'difficulty', ]
+
+
+def _whole_number(value, name):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        abort(422, f"Batch {name} must be a whole number")
+
+
+def batch_query(operation):
+    """
+    Build the query selecting the questions an operation applies to.
+    An operation needs a list of ids, a filter or both, so that an
+    empty request can not touch the whole table.
+
+    :param operation: dict with optional ids and filter
+    :return: query
+    """
+    ids = operation.get('ids', None)
+    filters = operation.get('filter', None) or {}
+
+    if not ids and not filters:
+        abort(422, 'Batch operation needs ids or a filter')
+
+    if not isinstance(filters, dict):
+        abort(422, 'Batch filter must be an object')
+
+    unknown = set(filters) - set(BATCH_FILTERS)
+    if unknown:
+        abort(422, f"Unknown batch filter {', '.join(sorted(unknown))}")
+
+    query = Question.query
+
+    if ids:
+        if not isinstance(ids, list):
+            abort(422, 'Batch ids must be a list')
+        query = query.filter(Question.id.in_(
+            [_whole_number(question_id, 'id') for question_id in ids]))
+
+    if 'category' in filters:
+        query = query.filter(Question.category == _whole_number(
+            filters['category'], 'category'))
+
+    if 'difficulty' in filters:
+        query = query.filter(Question.difficulty == _whole_number(
+            filters['difficulty'], 'difficulty'))
+
+    return query
+
+
+def batch_values(operation, category_ids):
+    """
+    Check the new values of an update operation
+    :param operation: dict with values
+    :param category_ids: set of valid category ids
+    :return: dict of column values
+    """
+    values = operation.get('values', None)
+
+    if not values or not isinstance(values, dict):
+        abort(422, 'Batch update needs values')
+
+    unknown = set(values) - set(BATCH_VALUES)
+    if unknown:
+        abort(422, f"Unknown batch value {', '.join(sorted(unknown))}")
+
+    checked = {}
+
+    for name, value in values.items():
+        if value in (None, ''):
+            abort(422, f"Batch value {name} can not be empty")
+
+        if name == 'category':
+            value = _whole_number(value, 'category')
+            if value not in category_ids:
+                abort(422, f"Unknown category {value}")
+        elif name == 'difficulty':
+            value = _whole_number(value, 'difficulty')
+        else:
+            value = str(value)
+
+        checked[getattr(Question, name)] = value
+
+    return checked
+
+
+def apply_batch(operations):
+    """
+    Run delete and update operations on sets of questions.
+    Each operation is a single DELETE or UPDATE statement and all of
+    them share one transaction, so either every operation is applied
+    or none is. On PostgreSQL the statement also updates question_stats
+    from the rows it returns, elsewhere the counters are read before
+    the write. Category ids are database ids.
+
+    :param operations: list of dicts with action, ids, filter and values
+    :return: list of number of questions affected per operation
+    """
+    if not operations or not isinstance(operations, list):
+        abort(422, 'Missing batch operations')
+
+    category_ids = {row[0] for row in db.session.query(Category.id).all()}
+    statements = []
+
+    # Validate everything before writing anything
+    for operation in operations:
+        if not isinstance(operation, dict):
+            abort(422, 'Batch operations must be objects')
+
+        action = operation.get('action', None)
+
+        if action not in BATCH_ACTIONS:
+            abort(422, f"Unknown batch action {action}")
+
+        query = batch_query(operation)
+        values = batch_values(operation, category_ids) \
+            if action == 'update' else None
+        statements.append((action, query, values))
+
+    affected = []
+    changes = Counter()
+    postgresql = db.engine.dialect.name == 'postgresql'
+
+    try:
+        for action, query, values in statements:
+            if postgresql:
+                # The statement adjusts question_stats itself
+                affected.append(counted_write(db.session, query, values))
+            elif action == 'delete':
+                changes.update(question_changes(query))
+                affected.append(query.delete(synchronize_session=False))
+            else:
+                changes.update(question_changes(query, values))
+                affected.append(query.update(values,
+                                             synchronize_session=False))
+        count_questions(db.session, changes)
+        db.session.commit()
+
+    except SQLAlchemyError:
+        db.session.rollback()
+        abort(500)
+
+    if any(affected):
+        notify_question_listeners('batch')
+
+    return affected
@@ -0,0 +1,405 @@
+import functools
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+from flask import current_app, has_app_context, request, Response
+
+from models import question_listeners
+from .sqlite import Transaction
+from .versions import VERSIONED_TABLES, get_versions
+
+RESPONSE_CACHE_TTL = 60
+RESPONSE_CACHE_SIZE = 1024
+
+# Cached question responses are tagged with what they were built from.
+# Lists and searches depend on every question, category pages only on
+# the questions of their category (and on the category tag, for writes
+# that do not say which category they touched).
+QUESTIONS_TAG = 'questions'
+CATEGORY_TAG = 'category'
+
+STATS = ['hits', 'misses', 'evictions', 'expirations', 'invalidations', ]
+
+
+def category_tag(category_id):
+    return f'{CATEGORY_TAG}:{category_id}'
+
+
+class MemoryResponseCache:
+    """
+    Keep responses in process memory.
+    Holds at most limit responses, evicting the least recently used one
+    when full, and drops responses older than ttl seconds. Each worker
+    has its own cache and only sees its own invalidations, but cache
+    keys carry the shared table versions, so a write made through
+    another worker still stops the old responses from being served.
+    """
+
+    def __init__(self, ttl=RESPONSE_CACHE_TTL, limit=RESPONSE_CACHE_SIZE):
+        self.ttl = ttl
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._tags = defaultdict(set)
+        self._generation = 0
+        self._stats = dict.fromkeys(STATS, 0)
+
+    def _remove(self, key):
+        expires, tags, value = self._entries.pop(key)
+
+        for tag in tags:
+            keys = self._tags[tag]
+            keys.discard(key)
+            if not keys:
+                del self._tags[tag]
+
+    def generation(self):
+        """
+        Get a number that changes on every invalidation.
+        Take it before building a response and hand it to set(), so a
+        response built while its data changed is not stored.
+        :return: int
+        """
+        return self._generation
+
+    def get(self, key):
+        """
+        Get a cached response
+        :param key:
+        :return: tuple of (status, mimetype, body) or None
+        """
+        with self._lock:
+            entry = self._entries.get(key, None)
+
+            if entry is not None and entry[0] <= time.monotonic():
+                self._remove(key)
+                self._stats['expirations'] += 1
+                entry = None
+
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry[2]
+
+    def set(self, key, value, tags, generation):
+        """
+        Store a response
+        :param key:
+        :param value: tuple of (status, mimetype, body)
+        :param tags: list of tags to invalidate the response by
+        :param generation: generation() from before the response was built
+        :return: True if stored
+        """
+        if self.limit <= 0:
+            return False
+
+        with self._lock:
+            if generation != self._generation:
+                return False
+
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (time.monotonic() + self.ttl, tags, value)
+            for tag in tags:
+                self._tags[tag].add(key)
+
+            while len(self._entries) > self.limit:
+                self._remove(next(iter(self._entries)))
+                self._stats['evictions'] += 1
+
+        return True
+
+    def invalidate(self, tags):
+        """
+        Drop every response carrying any of the tags
+        :param tags:
+        :return: number of responses dropped
+        """
+        with self._lock:
+            self._generation += 1
+            keys = set()
+            for tag in tags:
+                keys.update(self._tags.get(tag, ()))
+            for key in keys:
+                self._remove(key)
+            self._stats['invalidations'] += len(keys)
+
+        return len(keys)
+
+    def stats(self):
+        """
+        Get the hit, miss and eviction counters
+        :return: dict
+        """
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries))
+
+
+class SqliteResponseCache:
+    """
+    Keep responses in a local SQLite file so every worker on the host
+    shares them, their invalidations and their counters.
+    Same eviction rules as MemoryResponseCache.
+    """
+
+    def __init__(self, path, ttl=RESPONSE_CACHE_TTL,
+                 limit=RESPONSE_CACHE_SIZE):
+        self.path = path
+        self.ttl = ttl
+        self.limit = limit
+
+        connection = sqlite3.connect(self.path, timeout=10)
+        try:
+            connection.execute('PRAGMA journal_mode=WAL')
+        finally:
+            connection.close()
+
+        with self._connect() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS response_cache ('
+                'key TEXT PRIMARY KEY, status INTEGER NOT NULL, '
+                'mimetype TEXT NOT NULL, body BLOB NOT NULL, '
+                'expires REAL NOT NULL, used REAL NOT NULL)')
+            connection.execute(
+                'CREATE INDEX IF NOT EXISTS ix_response_cache_used '
+                'ON response_cache (used)')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS response_cache_tags ('
+                'tag TEXT NOT NULL, key TEXT NOT NULL '
+                'REFERENCES response_cache (key) ON DELETE CASCADE, '
+                'PRIMARY KEY (tag, key))')
+            connection.execute(
+                'CREATE INDEX IF NOT EXISTS ix_response_cache_tags_key '
+                'ON response_cache_tags (key)')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS response_cache_stats ('
+                'name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+            connection.executemany(
+                'INSERT OR IGNORE INTO response_cache_stats VALUES (?, 0)',
+                [(name,) for name in STATS + ['generation']])
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=10,
+                                     isolation_level=None)
+        connection.execute('PRAGMA foreign_keys=ON')
+        connection.execute('BEGIN IMMEDIATE')
+        return Transaction(connection)
+
+    @staticmethod
+    def _count(connection, name, value=1):
+        connection.execute(
+            'UPDATE response_cache_stats SET value = value + ? '
+            'WHERE name = ?', (value, name))
+
+    def generation(self):
+        with self._connect() as connection:
+            return connection.execute(
+                'SELECT value FROM response_cache_stats '
+                'WHERE name = ?', ('generation',)).fetchone()[0]
+
+    def get(self, key):
+        with self._connect() as connection:
+            now = time.time()
+            row = connection.execute(
+                'SELECT status, mimetype, body, expires FROM response_cache '
+                'WHERE key = ?', (key,)).fetchone()
+
+            if row is not None and row[3] <= now:
+                connection.execute('DELETE FROM response_cache '
+                                   'WHERE key = ?', (key,))
+                self._count(connection, 'expirations')
+                row = None
+
+            if row is None:
+                self._count(connection, 'misses')
+                return None
+
+            connection.execute('UPDATE response_cache SET used = ? '
+                               'WHERE key = ?', (now, key))
+            self._count(connection, 'hits')
+
+        return row[0], row[1], bytes(row[2])
+
+    def set(self, key, value, tags, generation):
+        if self.limit <= 0:
+            return False
+
+        status, mimetype, body = value
+
+        with self._connect() as connection:
+            if generation != connection.execute(
+                    'SELECT value FROM response_cache_stats '
+                    'WHERE name = ?', ('generation',)).fetchone()[0]:
+                return False
+
+            now = time.time()
+            cursor = connection.execute(
+                'DELETE FROM response_cache WHERE expires <= ?', (now,))
+            self._count(connection, 'expirations', cursor.rowcount)
+
+            connection.execute('DELETE FROM response_cache WHERE key = ?',
+                               (key,))
+            cursor = connection.execute(
+                'DELETE FROM response_cache WHERE key IN ('
+                'SELECT key FROM response_cache ORDER BY used DESC '
+                'LIMIT -1 OFFSET ?)', (self.limit - 1,))
+            self._count(connection, 'evictions', cursor.rowcount)
+
+            connection.execute(
+                'INSERT INTO response_cache VALUES (?, ?, ?, ?, ?, ?)',
+                (key, status, mimetype, body, now + self.ttl, now))
+            connection.executemany(
+                'INSERT INTO response_cache_tags VALUES (?, ?)',
+                [(tag, key) for tag in set(tags)])
+
+        return True
+
+    def invalidate(self, tags):
+        tags = list(tags)
+
+        with self._connect() as connection:
+            cursor = connection.execute(
+                'DELETE FROM response_cache WHERE key IN ('
+                'SELECT key FROM response_cache_tags WHERE tag IN ({}))'
+                .format(', '.join('?' for tag in tags)), tags)
+            self._count(connection, 'invalidations', cursor.rowcount)
+            self._count(connection, 'generation')
+
+        return cursor.rowcount
+
+    def stats(self):
+        with self._connect() as connection:
+            stats = dict(connection.execute(
+                'SELECT name, value FROM response_cache_stats '
+                'WHERE name != ?', ('generation',)).fetchall())
+            stats['entries'] = connection.execute(
+                'SELECT COUNT(*) FROM response_cache').fetchone()[0]
+
+        return stats
+
+
+def init_response_cache(app):
+    """
+    Attach a response cache to the app. Responses are kept in memory
+    unless RESPONSE_CACHE_DB names a SQLite file to keep them in.
+    A RESPONSE_CACHE_SIZE of 0 turns caching off.
+    :param app:
+    :return: response cache
+    """
+    ttl = app.config.get('RESPONSE_CACHE_TTL', RESPONSE_CACHE_TTL)
+    limit = app.config.get('RESPONSE_CACHE_SIZE', RESPONSE_CACHE_SIZE)
+    path = app.config.get('RESPONSE_CACHE_DB',
+                          os.environ.get('RESPONSE_CACHE_DB', None))
+
+    if path:
+        cache = SqliteResponseCache(path, ttl, limit)
+    else:
+        cache = MemoryResponseCache(ttl, limit)
+
+    app.extensions['trivia_response_cache'] = cache
+    return cache
+
+
+def get_response_cache():
+    return current_app.extensions['trivia_response_cache']
+
+
+def response_cache_samples():
+    """
+    Metrics collector for the response cache counters
+    :return: generator of (name, type, help, labels, value)
+    """
+    stats = get_response_cache().stats()
+
+    for name in STATS:
+        yield (f'response_cache_{name}_total', 'counter',
+               f'Response cache {name}.', {}, stats[name])
+
+    yield ('response_cache_entries', 'gauge', 'Responses in the cache.',
+           {}, stats['entries'])
+
+
+def cache_key():
+    """
+    Key the current request by the table versions, method, path, query
+    arguments, Accept header and, for POST requests, a hash of the body
+    :return: str
+    """
+    key = hashlib.sha256()
+    key.update(f'{get_versions().etag(VERSIONED_TABLES)}\n'.encode('utf-8'))
+    key.update(f'{request.method} {request.path}\n'.encode('utf-8'))
+    key.update(f"{request.headers.get('Accept', '')}\n".encode('utf-8'))
+
+    for name, value in sorted(request.args.items(multi=True)):
+        key.update(f'{name}={value}\n'.encode('utf-8'))
+
+    if request.method == 'POST':
+        key.update(hashlib.sha256(request.get_data(cache=True)).digest())
+
+    return key.hexdigest()
+
+
+def cached(tags):
+    """
+    Serve a view's successful responses from the response cache.
+    Only use on views that do not change anything, including POST views
+    like search that only read.
+
+    :param tags: function of the view arguments returning the tags to
+        invalidate the cached response by
+    :return: decorator
+    """
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            cache = get_response_cache()
+            key = cache_key()
+            value = cache.get(key)
+
+            if value is not None:
+                status, mimetype, body = value
+                response = Response(body, status=status, mimetype=mimetype)
+                response.headers['X-Cache'] = 'HIT'
+                return response
+
+            generation = cache.generation()
+            response = current_app.make_response(view(*args, **kwargs))
+
+            if response.status_code == 200 and not response.is_streamed:
+                cache.set(key, (response.status_code, response.mimetype,
+                                response.get_data()),
+                          tags(*args, **kwargs), generation)
+
+            response.headers['X-Cache'] = 'MISS'
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def _question_written(action, category):
+    if not has_app_context():
+        return
+
+    cache = current_app.extensions.get('trivia_response_cache')
+
+    if cache is None:
+        return
+
+    if category is None:
+        cache.invalidate([QUESTIONS_TAG, CATEGORY_TAG])
+    else:
+        cache.invalidate([QUESTIONS_TAG, category_tag(category)])
+
+
+question_listeners.append(_question_written)
@@ -0,0 +1,194 @@
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+
+from flask import current_app, g, has_app_context, has_request_context, \
+    request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Queries slower than this many milliseconds are logged
+SLOW_QUERY_MS = 100
+
+# A statement run this many times in one request is logged as a likely
+# N+1 query, e.g. a lazy load inside a loop
+N_PLUS_ONE_THRESHOLD = 5
+
+ENDPOINT_STATS = ['requests', 'queries', 'rows', 'db_ms', 'serialize_ms',
+                  'total_ms', ]
+
+
+class RequestQueries:
+    """
+    Queries run while handling one request
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.count = 0
+        self.seconds = 0.0
+        self.rows = 0
+        self.serialize_seconds = 0.0
+        self.statements = Counter()
+
+    def record(self, statement, seconds, rows, repeat_threshold):
+        """
+        Count a query and warn the first time its statement reaches
+        repeat_threshold runs
+        """
+        self.count += 1
+        self.seconds += seconds
+        self.rows += rows
+        self.statements[statement] += 1
+
+        if self.statements[statement] == repeat_threshold:
+            logger.warning('Possible N+1 query, statement ran %d times '
+                           'in one request to %s: %s', repeat_threshold,
+                           request.endpoint, statement)
+
+    def server_timing(self):
+        """
+        Format the timings as a Server-Timing header value
+        :return: str
+        """
+        total = time.perf_counter() - self.start
+
+        return ', '.join([
+            f'db;dur={self.seconds * 1000:.2f};desc="{self.count} queries"',
+            f'serialize;dur={self.serialize_seconds * 1000:.2f}',
+            f'total;dur={total * 1000:.2f}',
+        ])
+
+
+class Instrumentation:
+    """
+    Per endpoint totals of queries, rows fetched, database time,
+    serialization time and request time
+    """
+
+    def __init__(self, slow_query_ms=SLOW_QUERY_MS,
+                 repeat_threshold=N_PLUS_ONE_THRESHOLD):
+        self.slow_query_ms = slow_query_ms
+        self.repeat_threshold = repeat_threshold
+        self._lock = threading.Lock()
+        self._endpoints = defaultdict(lambda: dict.fromkeys(ENDPOINT_STATS,
+                                                            0))
+
+    def add(self, endpoint, queries):
+        """
+        Add a finished request to its endpoint's totals
+        :param endpoint:
+        :param queries: RequestQueries
+        """
+        total = time.perf_counter() - queries.start
+
+        with self._lock:
+            stats = self._endpoints[endpoint]
+            stats['requests'] += 1
+            stats['queries'] += queries.count
+            stats['rows'] += queries.rows
+            stats['db_ms'] += queries.seconds * 1000
+            stats['serialize_ms'] += queries.serialize_seconds * 1000
+            stats['total_ms'] += total * 1000
+
+    def stats(self):
+        """
+        Get the totals per endpoint
+        :return: dict of endpoint to dict
+        """
+        with self._lock:
+            return {endpoint: {name: round(value, 3)
+                               for name, value in stats.items()}
+                    for endpoint, stats in self._endpoints.items()}
+
+
+def record_serialization(seconds):
+    """
+    Count time spent encoding a response body
+    :param seconds:
+    """
+    if has_request_context():
+        queries = g.get('trivia_queries', None)
+        if queries is not None:
+            queries.serialize_seconds += seconds
+
+
+def init_instrumentation(app):
+    """
+    Count queries per request, add a Server-Timing header to every
+    response and log slow and repeated queries.
+    SLOW_QUERY_MS and N_PLUS_ONE_THRESHOLD tune the logging,
+    SQL_INSTRUMENTATION = False turns it all off.
+    :param app:
+    :return: Instrumentation or None
+    """
+    if not app.config.get('SQL_INSTRUMENTATION', True):
+        return None
+
+    instrumentation = Instrumentation(
+        app.config.get('SLOW_QUERY_MS', SLOW_QUERY_MS),
+        app.config.get('N_PLUS_ONE_THRESHOLD', N_PLUS_ONE_THRESHOLD))
+    app.extensions['trivia_instrumentation'] = instrumentation
+
+    @app.before_request
+    def start_request_queries():
+        g.trivia_queries = RequestQueries()
+
+    @app.after_request
+    def finish_request_queries(response):
+        queries = g.get('trivia_queries', None)
+
+        if queries is not None:
+            response.headers['Server-Timing'] = queries.server_timing()
+            instrumentation.add(request.endpoint, queries)
+
+        return response
+
+    return instrumentation
+
+
+def get_instrumentation():
+    return current_app.extensions.get('trivia_instrumentation', None)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(connection, cursor, statement, parameters,
+                           context, executemany):
+    if context is not None:
+        context.trivia_query_start = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(connection, cursor, statement, parameters,
+                          context, executemany):
+    start = getattr(context, 'trivia_query_start', None)
+
+    if start is None or not has_app_context():
+        return
+
+    instrumentation = current_app.extensions.get('trivia_instrumentation')
+
+    if instrumentation is None:
+        return
+
+    seconds = time.perf_counter() - start
+
+    if seconds * 1000 >= instrumentation.slow_query_ms:
+        logger.warning('Slow query took %.1f ms: %s', seconds * 1000,
+                       statement)
+
+    queries = g.get('trivia_queries', None) \
+        if has_request_context() else None
+
+    if queries is not None:
+        # Drivers that buffer results (psycopg2) report the rows a select
+        # returned, others (SQLite) report -1
+        rows = 0
+        if not (context.isinsert or context.isupdate or context.isdelete):
+            rows = max(cursor.rowcount, 0)
+
+        queries.record(statement, seconds, rows,
+                       instrumentation.repeat_threshold)
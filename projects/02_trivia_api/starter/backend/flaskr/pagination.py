@@ -0,0 +1,77 @@
+import base64
+import binascii
+import json
+
+from flask import abort
+
+from .serialize import format_rows
+
+QUESTIONS_PER_PAGE = 10
+
+
+def encode_cursor(last_id, page):
+    """
+    Build an opaque cursor pointing just past the last row of a page.
+    The page number travels with it so a client following cursors still
+    knows which page it is on.
+
+    :param last_id: id of the last row on the current page
+    :param page: number of the current page
+    :return: str
+    """
+    raw = json.dumps({'id': last_id, 'page': page}).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """
+    Unpack a cursor built by encode_cursor. A cursor that has been
+    tampered with or truncated is a bad request.
+
+    :param cursor:
+    :return: tuple of (last_id, page)
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii'))
+        values = json.loads(raw.decode('utf-8'))
+        return int(values['id']), int(values['page'])
+    except (binascii.Error, UnicodeError, ValueError, TypeError, KeyError):
+        abort(400, 'Invalid page cursor')
+
+
+def paginate(request, query, key):
+    """
+    Take in a web request and check for the desired output page.
+    If a cursor is provided seek past the row it points at (keyset),
+    otherwise use the page number, defaulting to page one (offset).
+    Either way only one page of rows is read from the database. Pages
+    are numbered from one, a lower page number is a bad request.
+
+    :param request:
+    :param query: un-ordered question_rows() query to page through
+    :param key: unique, indexed column the pages are ordered by
+    :return: tuple of (list, page number, cursor for the next page or None)
+    """
+    cursor = request.args.get('cursor', None)
+    offset = 0
+
+    if cursor:
+        last_id, page = decode_cursor(cursor)
+        query = query.filter(key > last_id)
+        page = page + 1
+    else:
+        page = request.args.get('page', 1, type=int)
+        if page < 1:
+            abort(400, 'Invalid page number')
+        offset = (page - 1) * QUESTIONS_PER_PAGE
+
+    # Read one extra row to find out if there is a next page
+    selection = query.order_by(key).offset(offset).limit(
+        QUESTIONS_PER_PAGE + 1).all()
+
+    next_cursor = None
+    if len(selection) > QUESTIONS_PER_PAGE:
+        selection = selection[:QUESTIONS_PER_PAGE]
+        next_cursor = encode_cursor(getattr(selection[-1], key.key), page)
+
+    return format_rows(selection), page, next_cursor
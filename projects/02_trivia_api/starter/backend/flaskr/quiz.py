@@ -0,0 +1,198 @@
+import random
+import threading
+import time
+
+from flask import current_app, has_app_context
+
+from models import db, Question, question_listeners
+from .aggregates import get_aggregates
+from .serialize import get_question
+
+QUIZ_CACHE_TTL = 60
+
+# Random picks tried before falling back to listing every unseen id
+QUIZ_DRAW_ATTEMPTS = 8
+
+
+class QuizDeck:
+    """
+    Keep the question ids of each category in memory so a quiz draw
+    never has to load the questions of a category.
+    A draw counts the seen ids against a cached set of the category's
+    ids and samples the cached ids, skipping ones the player has already
+    seen, so it costs O(previous questions) instead of O(category size).
+    Ids are reloaded after ttl seconds or after a question write to
+    their category.
+    """
+
+    def __init__(self, ttl=QUIZ_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._ids = {}
+
+    def _cached_ids(self, category):
+        # (time loaded, tuple of ids, frozenset of the same ids)
+        key = int(category)
+
+        with self._lock:
+            cached = self._ids.get(key)
+
+            if cached is None or time.monotonic() - cached[0] > self.ttl:
+                rows = db.session.query(Question.id).filter(
+                    Question.category == category).all()
+                ids = tuple(row[0] for row in rows)
+                cached = (time.monotonic(), ids, frozenset(ids))
+                self._ids[key] = cached
+
+            return cached
+
+    def question_ids(self, category):
+        """
+        Get the ids of all questions in a category
+        :param category: category id
+        :return: tuple of int
+        """
+        return self._cached_ids(category)[1]
+
+    def draw(self, category, previous_questions):
+        """
+        Pick a random question the player has not seen yet
+        :param category: category id
+        :param previous_questions: list of ids already asked
+        :return: tuple of (question id or None, number of unseen questions)
+        """
+        _, question_ids, id_set = self._cached_ids(category)
+        seen = set(previous_questions or [])
+        remaining = len(question_ids) - len(seen & id_set)
+
+        if remaining <= 0:
+            return None, 0
+
+        for _ in range(QUIZ_DRAW_ATTEMPTS):
+            question_id = random.choice(question_ids)
+            if question_id not in seen:
+                return question_id, remaining
+
+        # Most of the category has been seen, list what is left instead
+        unseen = [question_id for question_id in question_ids
+                  if question_id not in seen]
+
+        return random.choice(unseen), remaining
+
+    def forget(self, category=None):
+        """
+        Drop the cached ids of one category or of all of them
+        :param category: category id or None for all categories
+        """
+        with self._lock:
+            if category is None:
+                self._ids.clear()
+            else:
+                self._ids.pop(int(category), None)
+
+
+def init_quiz(app):
+    """
+    Attach a quiz deck to the app
+    :param app:
+    :return: QuizDeck
+    """
+    deck = QuizDeck(app.config.get('QUIZ_CACHE_TTL', QUIZ_CACHE_TTL))
+    app.extensions['trivia_quiz'] = deck
+    return deck
+
+
+def quiz_category_id(quiz_category):
+    """
+    Work out the category to quiz on.
+    Note incoming category ids start at 0 so we need to
+    increment the value by 1 to get desired category.
+    A category of type 'click' (all categories) picks one at random.
+
+    :param quiz_category: dict with type and id
+    :return: int
+    """
+    if quiz_category['type'] == 'click':
+        id_list = [category['id']
+                   for category in get_aggregates().categories()]
+
+        return random.choice(id_list)
+
+    return int(quiz_category['id']) + 1
+
+
+def valid_previous_questions(previous_questions):
+    """
+    Check the ids a client sent as already asked
+    :param previous_questions: value of the request body
+    :return: True if missing or a list of int
+    """
+    if previous_questions is None:
+        return True
+
+    return isinstance(previous_questions, list) and all(
+        isinstance(question_id, int) and not isinstance(question_id, bool)
+        for question_id in previous_questions)
+
+
+def valid_quiz_category(quiz_category):
+    """
+    Check the category a client asked to be quizzed on
+    :param quiz_category: value of the request body
+    :return: True if a dict with a type and, unless the type is 'click',
+        a whole number id
+    """
+    if not isinstance(quiz_category, dict) or 'type' not in quiz_category:
+        return False
+
+    if quiz_category['type'] == 'click':
+        return True
+
+    try:
+        int(quiz_category.get('id', None))
+    except (TypeError, ValueError):
+        return False
+
+    return True
+
+
+def get_deck():
+    return current_app.extensions['trivia_quiz']
+
+
+def draw_question(category, previous_questions):
+    """
+    Draw a random unseen question from a category
+    :param category: category id
+    :param previous_questions: ids already asked
+    :return: tuple of (formatted question or None, unseen questions)
+    """
+    deck = get_deck()
+    question_id, remaining = deck.draw(category, previous_questions)
+
+    if question_id is None:
+        return None, remaining
+
+    question = get_question(question_id)
+
+    if question is None:
+        # Deleted by another worker since the ids were cached
+        deck.forget(category)
+        question_id, remaining = deck.draw(category, previous_questions)
+        if question_id is not None:
+            question = get_question(question_id)
+
+    return question, remaining
+
+
+def _question_written(action, category):
+    if not has_app_context():
+        return
+
+    deck = current_app.extensions.get('trivia_quiz')
+
+    if deck is not None:
+        deck.forget(category)
+
+
+question_listeners.append(_question_written)
@@ -0,0 +1,217 @@
+import bisect
+import re
+import threading
+from collections import Counter, defaultdict
+
+from flask import current_app, has_app_context
+from sqlalchemy import func, literal_column
+
+from models import db, Question, question_listeners
+from .pagination import QUESTIONS_PER_PAGE
+from .serialize import STREAM_CHUNK_SIZE, question_rows, format_rows, \
+    stream_rows
+
+# Text search config of the search_vector column (see the migrations).
+# 'simple' neither stems nor drops stop words, so PostgreSQL matches the
+# same questions as InvertedIndex.
+SEARCH_CONFIG = 'simple'
+WORD_PATTERN = re.compile(r'[^\W_]+')
+
+
+def search_words(text):
+    """
+    Split text into lower case words
+    :param text:
+    :return: list of str
+    """
+    return WORD_PATTERN.findall((text or '').lower())
+
+
+class InvertedIndex:
+    """
+    In-process full-text index over question and answer text, used when
+    the database has no full-text search of its own (e.g. SQLite in
+    tests). Every word of the search term has to prefix-match a word of
+    the question or answer. Hits in the question weigh more than hits in
+    the answer, matching the weights of the PostgreSQL search vector.
+    The index is built on first use and dropped on any question write.
+    """
+
+    QUESTION_WEIGHT = 2
+    ANSWER_WEIGHT = 1
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = None
+        self._words = None
+
+    def _build(self):
+        postings = defaultdict(Counter)
+        rows = db.session.query(
+            Question.id, Question.question, Question.answer).all()
+
+        for question_id, question, answer in rows:
+            for word in search_words(question):
+                postings[word][question_id] += self.QUESTION_WEIGHT
+            for word in search_words(answer):
+                postings[word][question_id] += self.ANSWER_WEIGHT
+
+        self._postings = postings
+        self._words = sorted(postings)
+
+    def _prefix_matches(self, prefix):
+        scores = Counter()
+        start = bisect.bisect_left(self._words, prefix)
+
+        for word in self._words[start:]:
+            if not word.startswith(prefix):
+                break
+            scores.update(self._postings[word])
+
+        return scores
+
+    def search(self, words):
+        """
+        Find questions matching every word
+        :param words: list of lower case words
+        :return: list of question ids, best match first
+        """
+        with self._lock:
+            if self._postings is None:
+                self._build()
+
+            scores = None
+            for word in words:
+                matches = self._prefix_matches(word)
+                if scores is None:
+                    scores = matches
+                else:
+                    scores = Counter({question_id: scores[question_id] +
+                                      matches[question_id]
+                                      for question_id in scores
+                                      if question_id in matches})
+                if not scores:
+                    return []
+
+        return sorted(scores, key=lambda question_id: (-scores[question_id],
+                                                       question_id))
+
+    def clear(self):
+        with self._lock:
+            self._postings = None
+            self._words = None
+
+
+def init_search(app):
+    """
+    Attach a fallback search index to the app
+    :param app:
+    :return: InvertedIndex
+    """
+    index = InvertedIndex()
+    app.extensions['trivia_search'] = index
+    return index
+
+
+def _postgresql_matches(words):
+    # Prefix match every word so results keep up with the search box
+    tsquery = func.to_tsquery(SEARCH_CONFIG,
+                              ' & '.join(word + ':*' for word in words))
+    vector = literal_column('questions.search_vector')
+
+    matches = question_rows().filter(vector.op('@@')(tsquery))
+    ranking = (func.ts_rank_cd(vector, tsquery).desc(), Question.id)
+
+    return matches, ranking
+
+
+def _search_postgresql(words, page):
+    matches, ranking = _postgresql_matches(words)
+    total = matches.count()
+
+    selection = matches.order_by(*ranking).offset(
+        (page - 1) * QUESTIONS_PER_PAGE).limit(QUESTIONS_PER_PAGE).all()
+
+    return selection, total
+
+
+def _rows_in_order(question_ids):
+    found = {row.id: row for row in
+             question_rows().filter(Question.id.in_(question_ids)).all()}
+
+    return [found[question_id] for question_id in question_ids
+            if question_id in found]
+
+
+def _search_index(words, page):
+    question_ids = current_app.extensions['trivia_search'].search(words)
+    start = (page - 1) * QUESTIONS_PER_PAGE
+    page_ids = question_ids[start:start + QUESTIONS_PER_PAGE]
+
+    if not page_ids:
+        return [], len(question_ids)
+
+    return _rows_in_order(page_ids), len(question_ids)
+
+
+def _stream_index(words, chunk_size):
+    question_ids = current_app.extensions['trivia_search'].search(words)
+
+    for start in range(0, len(question_ids), chunk_size):
+        yield from _rows_in_order(question_ids[start:start + chunk_size])
+
+
+def search_questions(search_term, page=1):
+    """
+    Search question and answer text, best matches first.
+    PostgreSQL uses the search_vector column and its GIN index,
+    other databases use the in-process index.
+
+    :param search_term:
+    :param page: page of results to return
+    :return: tuple of (list of formatted questions, total matches)
+    """
+    words = search_words(search_term)
+
+    if not words:
+        return [], 0
+
+    if db.engine.dialect.name == 'postgresql':
+        selection, total = _search_postgresql(words, page)
+    else:
+        selection, total = _search_index(words, page)
+
+    return format_rows(selection), total
+
+
+def stream_search(search_term, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Iterate every question matching the search term, best matches
+    first, reading chunk_size rows at a time
+    :param search_term:
+    :param chunk_size:
+    :return: iterator of rows
+    """
+    words = search_words(search_term)
+
+    if not words:
+        return iter(())
+
+    if db.engine.dialect.name == 'postgresql':
+        matches, ranking = _postgresql_matches(words)
+        return stream_rows(matches.order_by(*ranking), chunk_size)
+
+    return _stream_index(words, chunk_size)
+
+
+def _question_written(action, category):
+    if not has_app_context():
+        return
+
+    index = current_app.extensions.get('trivia_search')
+
+    if index is not None:
+        index.clear()
+
+
+question_listeners.append(_question_written)
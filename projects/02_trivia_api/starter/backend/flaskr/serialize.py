@@ -0,0 +1,158 @@
+import itertools
+import json
+import time
+
+from flask import Response, abort, stream_with_context
+
+from models import db, Question
+from .instrument import record_serialization
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+QUESTION_FIELDS = ['id', 'question', 'answer', 'category', 'difficulty', ]
+QUESTION_COLUMNS = [getattr(Question, field) for field in QUESTION_FIELDS]
+
+STREAM_FORMATS = ['json', 'ndjson', ]
+STREAM_CHUNK_SIZE = 1000
+
+# Streamed bodies are written in pieces of about this many bytes
+STREAM_BUFFER_SIZE = 64 * 1024
+
+
+def question_rows():
+    """
+    Query the question columns as plain rows.
+    Read-only endpoints use this instead of Question.query, which
+    builds a change-tracked Question object for every row.
+
+    :return: query
+    """
+    return db.session.query(*QUESTION_COLUMNS)
+
+
+def format_rows(rows):
+    """
+    Same output as Question.format(), straight from column rows
+    :param rows: rows from question_rows()
+    :return: list of dict
+    """
+    return [dict(zip(QUESTION_FIELDS, row)) for row in rows]
+
+
+def stream_rows(query, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Iterate a question_rows() query through a server-side cursor,
+    holding chunk_size rows in memory at a time
+    :param query:
+    :param chunk_size:
+    :return: iterator of rows
+    """
+    return iter(query.execution_options(stream_results=True)
+                .yield_per(chunk_size))
+
+
+def dumps(json_message):
+    """
+    Encode as compact JSON, with orjson when it is installed
+    :param json_message:
+    :return: bytes
+    """
+    if orjson is not None:
+        return orjson.dumps(json_message)
+
+    return json.dumps(json_message, separators=(',', ':')).encode('utf-8')
+
+
+def _buffered(pieces):
+    buffer = []
+    size = 0
+
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+
+        if size >= STREAM_BUFFER_SIZE:
+            yield b''.join(buffer)
+            buffer = []
+            size = 0
+
+    if buffer:
+        yield b''.join(buffer)
+
+
+def stream_response(rows, fmt, not_found, totals=('total_questions', )):
+    """
+    Stream questions as they are read instead of building the whole
+    list first. 'json' writes the usual object, with the questions
+    first and the totals after them; 'ndjson' writes one question per
+    line and nothing else.
+
+    :param rows: iterator of rows from question_rows()
+    :param fmt: 'json' or 'ndjson'
+    :param not_found: message to abort with when there are no rows
+    :param totals: keys to write the number of questions to
+    :return: streamed response
+    """
+    first = next(rows, None)
+
+    if first is None:
+        abort(404, not_found)
+
+    rows = itertools.chain([first], rows)
+
+    def ndjson():
+        for row in rows:
+            yield dumps(dict(zip(QUESTION_FIELDS, row))) + b'\n'
+
+    def json_object():
+        count = 0
+        yield b'{"success":true,"questions":['
+
+        for row in rows:
+            if count:
+                yield b','
+            yield dumps(dict(zip(QUESTION_FIELDS, row)))
+            count += 1
+
+        yield b'],' + dumps({key: count for key in totals})[1:]
+
+    if fmt == 'ndjson':
+        pieces, mimetype = ndjson(), 'application/x-ndjson'
+    else:
+        pieces, mimetype = json_object(), 'application/json'
+
+    return Response(stream_with_context(_buffered(pieces)),
+                    mimetype=mimetype)
+
+
+def get_question(question_id):
+    """
+    Get one formatted question by id
+    :param question_id:
+    :return: dict or None
+    """
+    row = question_rows().filter(Question.id == question_id).first()
+
+    if row is None:
+        return None
+
+    return dict(zip(QUESTION_FIELDS, row))
+
+
+def json_response(json_message, status=200):
+    """
+    Like jsonify, but encoded with orjson when it is installed.
+    Only use for payloads of plain dicts, lists, strings and numbers.
+
+    :param json_message:
+    :param status:
+    :return: response
+    """
+    start = time.perf_counter()
+    body = dumps(json_message)
+    record_serialization(time.perf_counter() - start)
+
+    return Response(body, status=status, mimetype='application/json')
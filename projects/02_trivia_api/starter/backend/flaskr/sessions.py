@@ -0,0 +1,194 @@
+import json
+import os
+import random
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+from .sqlite import Transaction
+
+QUIZ_SESSION_TTL = 60 * 60
+QUIZ_SESSION_LIMIT = 10000
+
+
+def new_session_id():
+    return secrets.token_urlsafe(16)
+
+
+def shuffled(question_ids):
+    deck = list(question_ids)
+    random.shuffle(deck)
+    return deck
+
+
+class MemorySessionStore:
+    """
+    Keep quiz decks in process memory.
+    Holds at most limit sessions, evicting the least recently used one
+    when full, and forgets sessions that have not been used for ttl
+    seconds. Each worker has its own store, so run a single worker or
+    use SqliteSessionStore when the app is served by several.
+    """
+
+    def __init__(self, ttl=QUIZ_SESSION_TTL, limit=QUIZ_SESSION_LIMIT):
+        self.ttl = ttl
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()
+
+    def _evict(self, now):
+        while self._sessions:
+            session_id, (expires, deck) = next(iter(self._sessions.items()))
+            if expires > now and len(self._sessions) <= self.limit:
+                break
+            del self._sessions[session_id]
+
+    def create(self, question_ids):
+        """
+        Start a session with a shuffled deck of question ids
+        :param question_ids:
+        :return: tuple of (session id, deck size)
+        """
+        session_id = new_session_id()
+        deck = shuffled(question_ids)
+
+        with self._lock:
+            now = time.monotonic()
+            self._sessions[session_id] = (now + self.ttl, deck)
+            self._evict(now)
+
+        return session_id, len(deck)
+
+    def pop(self, session_id):
+        """
+        Take the next question id off a session's deck
+        :param session_id:
+        :return: tuple of (question id or None, ids left before the pop)
+        :raises KeyError: if the session does not exist or has expired
+        """
+        with self._lock:
+            now = time.monotonic()
+            expires, deck = self._sessions[session_id]
+
+            if expires <= now:
+                del self._sessions[session_id]
+                raise KeyError(session_id)
+
+            self._sessions[session_id] = (now + self.ttl, deck)
+            self._sessions.move_to_end(session_id)
+
+            if not deck:
+                return None, 0
+
+            return deck.pop(), len(deck) + 1
+
+    def delete(self, session_id):
+        """
+        End a session
+        :param session_id:
+        :return: True if the session existed
+        """
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+
+class SqliteSessionStore:
+    """
+    Keep quiz decks in a local SQLite file so every worker on the host
+    sees the same sessions. Same eviction rules as MemorySessionStore.
+    """
+
+    def __init__(self, path, ttl=QUIZ_SESSION_TTL, limit=QUIZ_SESSION_LIMIT):
+        self.path = path
+        self.ttl = ttl
+        self.limit = limit
+
+        with self._connect() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS quiz_sessions ('
+                'id TEXT PRIMARY KEY, deck TEXT NOT NULL, '
+                'expires REAL NOT NULL)')
+            connection.execute(
+                'CREATE INDEX IF NOT EXISTS ix_quiz_sessions_expires '
+                'ON quiz_sessions (expires)')
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=10,
+                                     isolation_level=None)
+        connection.execute('BEGIN IMMEDIATE')
+        return Transaction(connection)
+
+    def create(self, question_ids):
+        session_id = new_session_id()
+        deck = shuffled(question_ids)
+
+        with self._connect() as connection:
+            now = time.time()
+            connection.execute('DELETE FROM quiz_sessions WHERE expires <= ?',
+                               (now,))
+            connection.execute(
+                'DELETE FROM quiz_sessions WHERE id IN ('
+                'SELECT id FROM quiz_sessions ORDER BY expires DESC '
+                'LIMIT -1 OFFSET ?)', (self.limit - 1,))
+            connection.execute('INSERT INTO quiz_sessions VALUES (?, ?, ?)',
+                               (session_id, json.dumps(deck), now + self.ttl))
+
+        return session_id, len(deck)
+
+    def pop(self, session_id):
+        with self._connect() as connection:
+            now = time.time()
+            row = connection.execute(
+                'SELECT deck FROM quiz_sessions WHERE id = ? AND expires > ?',
+                (session_id, now)).fetchone()
+
+            if row is None:
+                raise KeyError(session_id)
+
+            deck = json.loads(row[0])
+            question_id = deck.pop() if deck else None
+
+            connection.execute(
+                'UPDATE quiz_sessions SET deck = ?, expires = ? WHERE id = ?',
+                (json.dumps(deck), now + self.ttl, session_id))
+
+        if question_id is None:
+            return None, 0
+
+        return question_id, len(deck) + 1
+
+    def delete(self, session_id):
+        with self._connect() as connection:
+            cursor = connection.execute(
+                'DELETE FROM quiz_sessions WHERE id = ?', (session_id,))
+
+        return cursor.rowcount > 0
+
+
+def init_sessions(app):
+    """
+    Attach a quiz session store to the app. Sessions are kept in memory
+    unless QUIZ_SESSION_DB names a SQLite file to keep them in.
+    :param app:
+    :return: session store
+    """
+    ttl = app.config.get('QUIZ_SESSION_TTL', QUIZ_SESSION_TTL)
+    limit = app.config.get('QUIZ_SESSION_LIMIT', QUIZ_SESSION_LIMIT)
+    path = app.config.get('QUIZ_SESSION_DB',
+                          os.environ.get('QUIZ_SESSION_DB', None))
+
+    if path:
+        store = SqliteSessionStore(path, ttl, limit)
+    else:
+        store = MemorySessionStore(ttl, limit)
+
+    app.extensions['trivia_sessions'] = store
+    return store
+
+
+def get_sessions():
+    return current_app.extensions['trivia_sessions']
@@ -0,0 +1,18 @@
+class Transaction:
+    """
+    Commit on success, roll back on error, always close the connection.
+    Wraps a sqlite3 connection opened with isolation_level=None on which
+    BEGIN has already been executed.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self.connection
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            self.connection.execute('ROLLBACK' if exc_type else 'COMMIT')
+        finally:
+            self.connection.close()
@@ -0,0 +1,259 @@
+from collections import Counter
+
+import click
+from sqlalchemy import event, func, literal_column, select, text
+from sqlalchemy.orm import Session, attributes
+
+from models import db, Question, QuestionStat, notify_question_listeners
+from .aggregates import get_aggregates
+
+# Category and difficulty counted for questions that have none
+NO_VALUE = 0
+
+# PostgreSQL and SQLite (3.24 or newer) both support this upsert
+_COUNT_QUESTIONS = text(
+    'INSERT INTO question_stats (category, difficulty, questions) '
+    'VALUES (:category, :difficulty, :questions) '
+    'ON CONFLICT (category, difficulty) DO UPDATE '
+    'SET questions = question_stats.questions + excluded.questions')
+
+# PostgreSQL batch writes count the rows they return in the same
+# statement. {changed} is the DELETE or UPDATE, {moves} selects
+# (category, difficulty, questions) from its rows.
+_COUNTED_WRITE = (
+    'WITH changed AS ({changed}), '
+    'counted AS ('
+    'INSERT INTO question_stats (category, difficulty, questions) '
+    'SELECT category, difficulty, SUM(questions) FROM ({moves}) AS moves '
+    'GROUP BY category, difficulty '
+    'ON CONFLICT (category, difficulty) DO UPDATE '
+    'SET questions = question_stats.questions + excluded.questions) '
+    'SELECT COUNT(*) FROM changed')
+
+_DELETE_MOVES = (
+    f'SELECT COALESCE(category, {NO_VALUE}) AS category, '
+    f'COALESCE(difficulty, {NO_VALUE}) AS difficulty, -1 AS questions '
+    'FROM changed')
+
+# UPDATE ... RETURNING only sees new values, the old ones come from a
+# locked self join
+_UPDATE_MOVES = (
+    f'SELECT COALESCE(old_category, {NO_VALUE}) AS category, '
+    f'COALESCE(old_difficulty, {NO_VALUE}) AS difficulty, -1 AS questions '
+    'FROM changed UNION ALL '
+    f'SELECT COALESCE(category, {NO_VALUE}), '
+    f'COALESCE(difficulty, {NO_VALUE}), 1 FROM changed')
+
+
+def stat_key(category, difficulty):
+    """
+    Get the question_stats row a question is counted in
+    :param category:
+    :param difficulty:
+    :return: tuple of (category, difficulty)
+    """
+    return (NO_VALUE if category is None else int(category),
+            NO_VALUE if difficulty is None else int(difficulty))
+
+
+def count_questions(session, changes):
+    """
+    Adjust the question counters in the session's transaction, so they
+    are committed or rolled back together with the questions they count
+    :param session:
+    :param changes: Counter of stat_key() to questions added, negative
+        for questions removed
+    """
+    rows = [{'category': category, 'difficulty': difficulty,
+             'questions': questions}
+            for (category, difficulty), questions in changes.items()
+            if questions]
+
+    if rows:
+        session.execute(_COUNT_QUESTIONS, rows)
+
+
+def question_changes(query, values=None):
+    """
+    Get the counter changes of deleting, or updating with values, the
+    questions a query selects, for databases without counted_write().
+    Run it right before the statement, in the same transaction; rows
+    changed by others in between are only counted right again by a
+    rebuild.
+
+    :param query: query of Question
+    :param values: dict of Question column to new value for an update
+    :return: Counter of stat_key() to questions added
+    """
+    changes = Counter()
+    rows = query.with_entities(
+        Question.category, Question.difficulty,
+        func.count(Question.id)).group_by(
+        Question.category, Question.difficulty).all()
+
+    for category, difficulty, questions in rows:
+        changes[stat_key(category, difficulty)] -= questions
+
+        if values is not None:
+            changes[stat_key(values.get(Question.category, category),
+                             values.get(Question.difficulty, difficulty))] \
+                += questions
+
+    return changes
+
+
+def counted_write(session, query, values=None):
+    """
+    Delete, or update with values, the questions a query selects and
+    adjust their counters in one PostgreSQL statement, so no rows are
+    read beforehand and concurrent writes are counted right.
+
+    :param session:
+    :param query: query of Question, filtered on questions columns only
+    :param values: dict of Question column to new value for an update
+    :return: number of questions written
+    """
+    # Filters are validated whole numbers, safe to render inline
+    where = str(query.whereclause.compile(
+        dialect=session.bind.dialect,
+        compile_kwargs={'literal_binds': True}))
+
+    if values is None:
+        changed = (f'DELETE FROM questions WHERE {where} '
+                   'RETURNING category, difficulty')
+        moves = _DELETE_MOVES
+        params = {}
+    else:
+        params = {f'value_{column.name}': value
+                  for column, value in values.items()}
+        changed = (
+            'UPDATE questions SET {} FROM ('
+            'SELECT id, category, difficulty FROM questions '
+            'WHERE {} FOR UPDATE) AS old '
+            'WHERE questions.id = old.id '
+            'RETURNING old.category AS old_category, '
+            'old.difficulty AS old_difficulty, '
+            'questions.category, questions.difficulty').format(
+            ', '.join(f'{column.name} = :value_{column.name}'
+                      for column in values), where)
+        moves = _UPDATE_MOVES
+
+    return session.execute(
+        text(_COUNTED_WRITE.format(changed=changed, moves=moves)),
+        params).scalar()
+
+
+def rebuild_question_stats():
+    """
+    Recount every question into question_stats, e.g. after questions were
+    written with plain SQL. Question writes wait until the new counts are
+    committed, so none is lost or counted twice.
+    :return: number of questions counted
+    """
+    session = db.session
+
+    if db.engine.dialect.name == 'postgresql':
+        session.execute('LOCK TABLE question_stats IN EXCLUSIVE MODE')
+
+    # A literal, so PostgreSQL sees the same expression in GROUP BY
+    category = func.coalesce(Question.category, literal_column(str(NO_VALUE)))
+    difficulty = func.coalesce(Question.difficulty,
+                               literal_column(str(NO_VALUE)))
+
+    session.query(QuestionStat).delete(synchronize_session=False)
+    session.execute(QuestionStat.__table__.insert().from_select(
+        ['category', 'difficulty', 'questions'],
+        select([category, difficulty, func.count(Question.id)]).group_by(
+            category, difficulty)))
+    counted = session.query(func.sum(QuestionStat.questions)).scalar()
+    session.commit()
+
+    return counted or 0
+
+
+def question_stats():
+    """
+    Get question counts per category and per difficulty.
+    Reads one row per category and difficulty that has questions,
+    however many questions there are.
+
+    :return: dict with total_questions, categories, difficulties and
+        uncategorized
+    """
+    rows = db.session.query(
+        QuestionStat.category, QuestionStat.difficulty,
+        QuestionStat.questions).filter(QuestionStat.questions != 0).all()
+
+    categories = {category['id']: dict(category, total_questions=0,
+                                       difficulties={})
+                  for category in get_aggregates().categories()}
+    difficulties = Counter()
+    uncategorized = 0
+
+    for category, difficulty, questions in rows:
+        difficulties[str(difficulty)] += questions
+
+        if category in categories:
+            histogram = categories[category]
+            histogram['total_questions'] += questions
+            histogram['difficulties'][str(difficulty)] = questions
+        else:
+            uncategorized += questions
+
+    return {
+        'total_questions': sum(difficulties.values()),
+        'categories': [categories[key] for key in sorted(categories)],
+        'difficulties': dict(difficulties),
+        'uncategorized': uncategorized,
+    }
+
+
+def init_stats(app):
+    """
+    Register the rebuild-question-stats command
+    :param app:
+    """
+
+    @app.cli.command('rebuild-question-stats')
+    def rebuild_question_stats_command():
+        """Recount the questions per category and difficulty."""
+        counted = rebuild_question_stats()
+
+        # Drop ETags and cached responses built from the old counts
+        notify_question_listeners('rebuild')
+
+        click.echo(f"Counted {counted} questions")
+
+
+def _stored_key(question):
+    # Category and difficulty as in the database, before this flush.
+    # Both attributes keep their old value when changed (active_history).
+    values = []
+
+    for name in ('category', 'difficulty'):
+        history = attributes.get_history(question, name)
+        values.append((history.deleted or history.unchanged or [None])[0])
+
+    return stat_key(*values)
+
+
+@event.listens_for(Session, 'before_flush')
+def _count_flushed_questions(session, flush_context, instances):
+    # Counts questions added, deleted or moved through the ORM, which is
+    # every Question.insert(), update() and delete()
+    changes = Counter()
+
+    for question in session.new:
+        if isinstance(question, Question):
+            changes[stat_key(question.category, question.difficulty)] += 1
+
+    for question in session.deleted:
+        if isinstance(question, Question):
+            changes[_stored_key(question)] -= 1
+
+    for question in session.dirty:
+        if isinstance(question, Question):
+            changes[_stored_key(question)] -= 1
+            changes[stat_key(question.category, question.difficulty)] += 1
+
+    count_questions(session, changes)
@@ -0,0 +1,232 @@
+import csv
+import io
+import json
+from collections import Counter
+
+import click
+from sqlalchemy.exc import SQLAlchemyError
+
+from models import db, Question, Category, notify_question_listeners
+from .serialize import QUESTION_FIELDS, question_rows
+from .stats import count_questions, stat_key
+
+KNOWN_JSON_PROPERTIES = ['question', 'answer', 'category', 'difficulty', ]
+EXPORT_PROPERTIES = QUESTION_FIELDS
+TRANSFER_FORMATS = ['jsonl', 'csv', ]
+
+IMPORT_CHUNK_SIZE = 1000
+EXPORT_CHUNK_SIZE = 1000
+
+# Errors kept for the import report, the rest are only counted
+MAX_REPORTED_ERRORS = 1000
+
+
+def read_jsonl(lines):
+    """
+    Parse JSON Lines, one question per line. Blank lines are skipped.
+    :param lines: iterable of str
+    :return: generator of (line number, dict or None, error or None)
+    """
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, None, f"Invalid JSON: {e}"
+            continue
+
+        if not isinstance(row, dict):
+            yield line_number, None, "Expected a JSON object"
+            continue
+
+        yield line_number, row, None
+
+
+def read_csv(lines):
+    """
+    Parse CSV with a header row naming the question properties
+    :param lines: iterable of str
+    :return: generator of (line number, dict or None, error or None)
+    """
+    reader = csv.DictReader(lines)
+
+    for row in reader:
+        if None in row:
+            yield reader.line_num, None, "Too many columns"
+            continue
+
+        yield reader.line_num, row, None
+
+
+def validate_question(row, category_ids):
+    """
+    Check a row has every known property and nothing else.
+    An id is allowed, so exports can be imported again, but is ignored.
+
+    :param row: dict
+    :param category_ids: set of valid category ids
+    :return: tuple of (mapping for bulk insert or None, error or None)
+    """
+    unknown = set(row) - set(EXPORT_PROPERTIES)
+    if unknown:
+        return None, f"Unknown properties {', '.join(sorted(unknown))}"
+
+    for name in KNOWN_JSON_PROPERTIES:
+        if row.get(name) in (None, ''):
+            return None, f"Missing {name} property"
+
+    try:
+        category = int(row['category'])
+        difficulty = int(row['difficulty'])
+    except (TypeError, ValueError):
+        return None, "Category and difficulty must be whole numbers"
+
+    if category not in category_ids:
+        return None, f"Unknown category {category}"
+
+    return {
+        'question': str(row['question']),
+        'answer': str(row['answer']),
+        'category': category,
+        'difficulty': difficulty,
+    }, None
+
+
+def import_questions(lines, fmt='jsonl', chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Validate and insert questions read from a stream.
+    Valid rows are inserted with executemany, one transaction per chunk,
+    so memory use does not grow with the size of the input. Categories
+    are database ids, the same as in an export.
+
+    :param lines: iterable of str
+    :param fmt: 'jsonl' or 'csv'
+    :param chunk_size: rows per insert
+    :return: tuple of (number imported, number failed, list of errors)
+    """
+    reader = read_csv if fmt == 'csv' else read_jsonl
+    category_ids = {row[0] for row in db.session.query(Category.id).all()}
+
+    imported = 0
+    failed = 0
+    errors = []
+    chunk = []
+
+    def report(line_number, message):
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({'line': line_number, 'message': message})
+
+    def flush():
+        try:
+            db.session.bulk_insert_mappings(
+                Question, [mapping for line_number, mapping in chunk])
+            count_questions(db.session, Counter(
+                stat_key(mapping['category'], mapping['difficulty'])
+                for line_number, mapping in chunk))
+            db.session.commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            for line_number, mapping in chunk:
+                report(line_number, f"Insert failed: {e.__class__.__name__}")
+            return 0, len(chunk)
+
+        return len(chunk), 0
+
+    for line_number, row, error in reader(lines):
+        mapping = None
+
+        if error is None:
+            mapping, error = validate_question(row, category_ids)
+
+        if error is not None:
+            failed += 1
+            report(line_number, error)
+            continue
+
+        chunk.append((line_number, mapping))
+
+        if len(chunk) >= chunk_size:
+            done, lost = flush()
+            imported += done
+            failed += lost
+            chunk = []
+
+    if chunk:
+        done, lost = flush()
+        imported += done
+        failed += lost
+
+    if imported:
+        notify_question_listeners('import')
+
+    return imported, failed, errors
+
+
+def export_questions(fmt='jsonl', chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Write every question in id order, reading the table in chunks
+    through a server-side cursor so rows are written as they are read.
+
+    :param fmt: 'jsonl' or 'csv'
+    :param chunk_size: rows fetched at a time
+    :return: generator of str
+    """
+    query = question_rows().order_by(Question.id).execution_options(
+        stream_results=True).yield_per(chunk_size)
+
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_PROPERTIES)
+
+        for row in query:
+            writer.writerow(row)
+
+            if buffer.tell() > 64 * 1024:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+
+        yield buffer.getvalue()
+
+    else:
+        for row in query:
+            yield json.dumps(dict(zip(EXPORT_PROPERTIES, row))) + '\n'
+
+
+def init_transfer(app):
+    """
+    Register the import-questions and export-questions commands
+    :param app:
+    """
+
+    @app.cli.command('import-questions')
+    @click.argument('source', type=click.File('r', encoding='utf-8'))
+    @click.option('--format', 'fmt', type=click.Choice(TRANSFER_FORMATS),
+                  default=None, help='Defaults to the file extension.')
+    @click.option('--chunk-size', default=IMPORT_CHUNK_SIZE)
+    def import_questions_command(source, fmt, chunk_size):
+        """Import questions from a JSON Lines or CSV file."""
+        if fmt is None:
+            fmt = 'csv' if source.name.endswith('.csv') else 'jsonl'
+
+        imported, failed, errors = import_questions(source, fmt, chunk_size)
+
+        for error in errors:
+            click.echo(f"line {error['line']}: {error['message']}", err=True)
+
+        click.echo(f"Imported {imported} questions, {failed} failed")
+
+    @app.cli.command('export-questions')
+    @click.argument('target', type=click.File('w', encoding='utf-8'))
+    @click.option('--format', 'fmt', type=click.Choice(TRANSFER_FORMATS),
+                  default=None, help='Defaults to the file extension.')
+    def export_questions_command(target, fmt):
+        """Export all questions to a JSON Lines or CSV file."""
+        if fmt is None:
+            fmt = 'csv' if target.name.endswith('.csv') else 'jsonl'
+
+        for chunk in export_questions(fmt):
+            target.write(chunk)
@@ -0,0 +1,142 @@
+import fcntl
+import hashlib
+import mmap
+import os
+import secrets
+import struct
+import tempfile
+import threading
+
+from flask import current_app, has_app_context
+
+from models import question_listeners
+
+VERSIONED_TABLES = ['questions', 'categories', ]
+
+_COUNTER = struct.Struct('<Q')
+
+
+class TableVersions:
+    """
+    Write counters per table, bumped whenever the table changes.
+    They make cheap ETags: a response built from a set of tables is
+    unchanged for as long as their counters are.
+
+    Counters live in process memory unless a path is given, in which
+    case they live in a small memory mapped file shared by every worker
+    on the host. A random token stored with the counters is part of
+    every ETag, so counters that start again from zero (restart, new
+    file) never repeat an old ETag.
+    """
+
+    def __init__(self, tables=VERSIONED_TABLES, path=None):
+        self._slots = {table: (index + 1) * _COUNTER.size
+                       for index, table in enumerate(tables)}
+        self._lock = threading.Lock()
+        self._fd = None
+        size = (len(tables) + 1) * _COUNTER.size
+
+        if path is None:
+            self._counters = bytearray(size)
+            _COUNTER.pack_into(
+                self._counters, 0,
+                int.from_bytes(secrets.token_bytes(8), 'little'))
+        else:
+            self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                if os.fstat(self._fd).st_size < size:
+                    os.ftruncate(self._fd, size)
+                self._counters = mmap.mmap(self._fd, size)
+                if not _COUNTER.unpack_from(self._counters, 0)[0]:
+                    _COUNTER.pack_into(
+                        self._counters, 0,
+                        int.from_bytes(secrets.token_bytes(8), 'little'))
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+        self.token = format(_COUNTER.unpack_from(self._counters, 0)[0], 'x')
+
+    def get(self, table):
+        """
+        Get the current version of a table
+        :param table:
+        :return: int
+        """
+        return _COUNTER.unpack_from(self._counters, self._slots[table])[0]
+
+    def bump(self, table):
+        """
+        Record a write to a table
+        :param table:
+        :return: new version
+        """
+        offset = self._slots[table]
+
+        with self._lock:
+            if self._fd is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                version = _COUNTER.unpack_from(self._counters, offset)[0] + 1
+                _COUNTER.pack_into(self._counters, offset, version)
+            finally:
+                if self._fd is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+        return version
+
+    def etag(self, tables):
+        """
+        Build an ETag for a response that only depends on tables
+        :param tables: list of table names
+        :return: str
+        """
+        return '{}-{}'.format(self.token, '.'.join(
+            str(self.get(table)) for table in tables))
+
+
+def init_versions(app):
+    """
+    Attach table versions to the app. They are shared through the file
+    named by TABLE_VERSIONS_FILE, by default one in the temporary
+    directory named after the database URL, so every worker serving the
+    same database on the host sees the same counters.
+    :param app:
+    :return: TableVersions
+    """
+    path = app.config.get('TABLE_VERSIONS_FILE',
+                          os.environ.get('TABLE_VERSIONS_FILE', None))
+
+    if path is None:
+        path = default_versions_file(app.config['SQLALCHEMY_DATABASE_URI'])
+
+    versions = TableVersions(path=path)
+    app.extensions['trivia_versions'] = versions
+    return versions
+
+
+def default_versions_file(database_path):
+    """
+    Get the file table versions are shared through for a database
+    :param database_path: database URL
+    :return: str
+    """
+    digest = hashlib.sha1(database_path.encode()).hexdigest()[:16]
+    return os.path.join(tempfile.gettempdir(), f'trivia-versions-{digest}')
+
+
+def get_versions():
+    return current_app.extensions['trivia_versions']
+
+
+def _question_written(action, category):
+    if not has_app_context():
+        return
+
+    versions = current_app.extensions.get('trivia_versions')
+
+    if versions is not None:
+        versions.bump('questions')
+
+
+question_listeners.append(_question_written)
@@ -0,0 +1,39 @@
+"""question stats
+
+Revision ID: 3c5e8a1d9f42
+Revises: 7f7f01109b1b
+Create Date: 2026-10-18 14:02:41.318205
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c5e8a1d9f42'
+down_revision = '7f7f01109b1b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'question_stats',
+        sa.Column('category', sa.Integer(), autoincrement=False,
+                  nullable=False),
+        sa.Column('difficulty', sa.Integer(), autoincrement=False,
+                  nullable=False),
+        sa.Column('questions', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('category', 'difficulty')
+    )
+
+    # Same counts as `flask rebuild-question-stats`, questions without a
+    # category or difficulty are counted under 0
+    op.execute("INSERT INTO question_stats (category, difficulty, questions) "
+               "SELECT coalesce(category, 0), coalesce(difficulty, 0), "
+               "count(*) FROM questions "
+               "GROUP BY coalesce(category, 0), coalesce(difficulty, 0)")
+
+
+def downgrade():
+    op.drop_table('question_stats')
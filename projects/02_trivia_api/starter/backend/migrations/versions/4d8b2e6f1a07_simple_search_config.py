@@ -0,0 +1,48 @@
+"""simple search config
+
+Revision ID: 4d8b2e6f1a07
+Revises: 3c5e8a1d9f42
+Create Date: 2026-10-18 15:36:08.904512
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4d8b2e6f1a07'
+down_revision = '3c5e8a1d9f42'
+branch_labels = None
+depends_on = None
+
+
+def _search_vector(config):
+    # Generated columns cannot be altered: drop and add the column again
+    op.drop_index('ix_questions_search_vector', table_name='questions')
+    op.drop_column('questions', 'search_vector')
+    op.execute(f"""
+        ALTER TABLE questions ADD COLUMN search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('{config}', coalesce(question, '')), 'A') ||
+            setweight(to_tsvector('{config}', coalesce(answer, '')), 'B')
+        ) STORED
+    """)
+    op.create_index('ix_questions_search_vector', 'questions',
+                    ['search_vector'], postgresql_using='gin')
+
+
+def upgrade():
+    # The english config drops stop words, so terms like "the" or
+    # "What is" found nothing. 'simple' keeps every word, like the
+    # in-process index used on other databases.
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    _search_vector('simple')
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    _search_vector('english')
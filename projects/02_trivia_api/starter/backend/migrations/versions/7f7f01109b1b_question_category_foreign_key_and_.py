@@ -0,0 +1,92 @@
+"""question category foreign key and indexes
+
+Revision ID: 7f7f01109b1b
+Revises: bf550ea724bc
+Create Date: 2026-10-18 01:23:29.672167
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7f7f01109b1b'
+down_revision = 'bf550ea724bc'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    columns = {column['name']: column
+               for column in inspector.get_columns('questions')}
+    has_foreign_key = any(
+        key['constrained_columns'] == ['category']
+        for key in inspector.get_foreign_keys('questions'))
+
+    # Databases created by the baseline revision store category as text.
+    # Blank or non numeric values can not be converted, clear them first.
+    if not isinstance(columns['category']['type'], sa.Integer):
+        if bind.dialect.name == 'postgresql':
+            op.execute("UPDATE questions SET category = NULL "
+                       "WHERE category !~ '^[0-9]+$'")
+        else:
+            op.execute("UPDATE questions SET category = NULL "
+                       "WHERE trim(category, '0123456789') != '' "
+                       "OR category = ''")
+
+    # Questions pointing at a category that does not exist would break
+    # the foreign key. trivia.psql already has one (named "category").
+    if not has_foreign_key:
+        op.execute("UPDATE questions SET category = NULL "
+                   "WHERE category IS NOT NULL AND CAST(category AS INTEGER) "
+                   "NOT IN (SELECT id FROM categories)")
+
+    with op.batch_alter_table('questions') as batch_op:
+        if not isinstance(columns['category']['type'], sa.Integer):
+            batch_op.alter_column(
+                'category', type_=sa.Integer(),
+                postgresql_using='category::integer')
+
+        if not has_foreign_key:
+            batch_op.create_foreign_key(
+                'fk_questions_category_categories', 'categories',
+                ['category'], ['id'],
+                onupdate='CASCADE', ondelete='SET NULL')
+
+    # setup_db() may already have created them on a new database
+    indexes = {index['name']
+               for index in sa.inspect(bind).get_indexes('questions')}
+
+    if 'ix_questions_category_id' not in indexes:
+        op.create_index('ix_questions_category_id', 'questions',
+                        ['category', 'id'])
+
+    if 'ix_questions_difficulty' not in indexes:
+        op.create_index('ix_questions_difficulty', 'questions',
+                        ['difficulty'])
+
+
+def downgrade():
+    bind = op.get_bind()
+    foreign_keys = {key['name'] for key in
+                    sa.inspect(bind).get_foreign_keys('questions')}
+
+    op.drop_index('ix_questions_difficulty', table_name='questions')
+    op.drop_index('ix_questions_category_id', table_name='questions')
+
+    # trivia.psql came with an integer category and its own foreign key,
+    # which upgrade left alone. Any other database started from the
+    # baseline schema, where category is text without a foreign key.
+    if 'category' in foreign_keys:
+        return
+
+    with op.batch_alter_table('questions') as batch_op:
+        if 'fk_questions_category_categories' in foreign_keys:
+            batch_op.drop_constraint('fk_questions_category_categories',
+                                     type_='foreignkey')
+
+        batch_op.alter_column(
+            'category', type_=sa.String(),
+            postgresql_using='category::text')
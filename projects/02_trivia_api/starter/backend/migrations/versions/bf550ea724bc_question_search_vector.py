@@ -0,0 +1,41 @@
+"""question search vector
+
+Revision ID: bf550ea724bc
+Revises: ce820fc1a3cf
+Create Date: 2026-10-18 01:17:22.128715
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'bf550ea724bc'
+down_revision = 'ce820fc1a3cf'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Other databases search with the in-process index in flaskr.search
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    # Generated columns need PostgreSQL 12 or newer
+    op.execute("""
+        ALTER TABLE questions ADD COLUMN search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', coalesce(question, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(answer, '')), 'B')
+        ) STORED
+    """)
+    op.create_index('ix_questions_search_vector', 'questions',
+                    ['search_vector'], postgresql_using='gin')
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.drop_index('ix_questions_search_vector', table_name='questions')
+    op.drop_column('questions', 'search_vector')
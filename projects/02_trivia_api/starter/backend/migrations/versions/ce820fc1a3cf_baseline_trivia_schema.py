@@ -0,0 +1,47 @@
+"""baseline trivia schema
+
+Revision ID: ce820fc1a3cf
+Revises: 
+Create Date: 2026-10-18 01:17:12.051877
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'ce820fc1a3cf'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases restored from trivia.psql already have both tables,
+    # only create them on an empty database.
+    tables = sa.inspect(op.get_bind()).get_table_names()
+
+    if 'categories' not in tables:
+        op.create_table(
+            'categories',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('type', sa.String(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if 'questions' not in tables:
+        op.create_table(
+            'questions',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('question', sa.String(), nullable=True),
+            sa.Column('answer', sa.String(), nullable=True),
+            sa.Column('category', sa.String(), nullable=True),
+            sa.Column('difficulty', sa.Integer(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+
+def downgrade():
+    # The tables and their rows come from trivia.psql, downgrading past
+    # the baseline leaves them alone.
+    pass
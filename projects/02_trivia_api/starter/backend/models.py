@@ -1,28 +1,131 @@
 import os
-from sqlalchemy import Column, String, Integer, create_engine
-from flask_sqlalchemy import SQLAlchemy
+import random
+from flask import g, has_request_context, request
+from sqlalchemy import Column, String, Integer, ForeignKey, Index, \
+    create_engine, orm
+from sqlalchemy.sql.dml import UpdateBase
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from flask_migrate import Migrate
+from fsnd_common.pool import engine_options
 import json
 
 database_name = "trivia"
-database_path = "postgres://{}/{}".format('localhost:5432', database_name)
+database_path = os.environ.get(
+    'DATABASE_URL',
+    "postgres://{}/{}".format('localhost:5432', database_name))
+
+# Endpoints other than GET ones that only read and can use a replica
+REPLICA_ENDPOINTS = ['find_question', 'get_quizzes', ]
+
+
+class RoutingSession(SignallingSession):
+    """
+    Session sending the reads of read-only requests to a read replica.
+    GET requests and REPLICA_ENDPOINTS read from one replica, picked at
+    random per request. Everything else goes to the primary: writes,
+    reads outside of a request (CLI, migrations, tests) and every read
+    of a request after it has written, so a request sees its own writes.
+    """
+
+    def __init__(self, db, **options):
+        self.db = db
+        super().__init__(db, **options)
+
+    def _replica_allowed(self):
+        if not has_request_context() or g.get('db_wrote', False):
+            return False
+
+        return request.method in ('GET', 'HEAD') or \
+            request.endpoint in REPLICA_ENDPOINTS
+
+    def get_bind(self, mapper=None, clause=None):
+        if self._flushing or isinstance(clause, UpdateBase):
+            if has_request_context():
+                g.db_wrote = True
+            return super().get_bind(mapper, clause)
+
+        replicas = self.app.extensions.get('trivia_replicas', [])
+
+        if not replicas or not self._replica_allowed():
+            return super().get_bind(mapper, clause)
+
+        if 'db_replica' not in g:
+            g.db_replica = random.choice(replicas)
+
+        return self.db.get_engine(self.app, bind=g.db_replica)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+db = RoutingSQLAlchemy()
+migrate = Migrate()
+
+
+def setup_replicas(app):
+    """
+    Register the read replicas listed in DATABASE_REPLICA_URLS (config or
+    environment, a list or a comma separated string) as binds named
+    replica_1, replica_2, ... for RoutingSession to read from
+    :param app:
+    :return: list of bind names
+    """
+    urls = app.config.get('DATABASE_REPLICA_URLS',
+                          os.environ.get('DATABASE_REPLICA_URLS', None))
+
+    if isinstance(urls, str):
+        urls = [url.strip() for url in urls.split(',') if url.strip()]
+
+    binds = dict(app.config.get('SQLALCHEMY_BINDS', None) or {})
+    replicas = []
+
+    for number, url in enumerate(urls or [], start=1):
+        name = f'replica_{number}'
+        binds[name] = url
+        replicas.append(name)
+
+    app.config['SQLALCHEMY_BINDS'] = binds
+    app.extensions['trivia_replicas'] = replicas
+    return replicas
 
-db = SQLAlchemy()
 
 '''
 setup_db(app)
-    binds a flask application and a SQLAlchemy service
+    binds a flask application and a SQLAlchemy service.
+    The schema is not created here, run `flask db upgrade` once
+    (or db.create_all() for a scratch database) before serving.
 '''
 
 
 def setup_db(app, database_path=database_path):
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(database_path,
+                                                             app.config)
+    setup_replicas(app)
     db.app = app
     db.init_app(app)
-    db.create_all()
+    migrate.init_app(app, db)
     return db
 
 
+'''
+question_listeners
+    callables run as listener(action, category) once a question
+    write has been committed. category is None when the write may
+    have touched more than one category.
+'''
+
+question_listeners = []
+
+
+def notify_question_listeners(action, category=None):
+    for listener in question_listeners:
+        listener(action, category)
+
+
 '''
 Question
 
@@ -31,12 +134,23 @@ Question
 
 class Question(db.Model):
     __tablename__ = 'questions'
+    __table_args__ = (
+        # Category listings and quiz draws read questions of one category
+        # in id order, this makes them an index range scan.
+        Index('ix_questions_category_id', 'category', 'id'),
+    )
 
     id = Column(Integer, primary_key=True)
     question = Column(String)
     answer = Column(String)
-    category = Column(String)
-    difficulty = Column(Integer)
+    # Changing category or difficulty loads the old value first, so the
+    # question can be moved between question_stats counters.
+    category = orm.column_property(
+        Column(Integer, ForeignKey('categories.id', onupdate='CASCADE',
+                                   ondelete='SET NULL')),
+        active_history=True)
+    difficulty = orm.column_property(Column(Integer, index=True),
+                                     active_history=True)
 
     def __init__(self, question, answer, category, difficulty):
         self.question = question
@@ -45,15 +159,20 @@ class Question(db.Model):
         self.difficulty = difficulty
 
     def insert(self):
+        category = self.category
         db.session.add(self)
         db.session.commit()
+        notify_question_listeners('insert', category)
 
     def update(self):
         db.session.commit()
+        notify_question_listeners('update')
 
     def delete(self):
+        category = self.category
         db.session.delete(self)
         db.session.commit()
+        notify_question_listeners('delete', category)
 
     def format(self):
         return {
@@ -85,3 +204,19 @@ class Category(db.Model):
             'id': self.id,
             'type': self.type
         }
+
+
+'''
+QuestionStat
+    number of questions per category and difficulty, kept current by
+    the question writes of the app (see flaskr.stats). Questions
+    without a category or difficulty are counted under 0.
+'''
+
+
+class QuestionStat(db.Model):
+    __tablename__ = 'question_stats'
+
+    category = Column(Integer, primary_key=True, autoincrement=False)
+    difficulty = Column(Integer, primary_key=True, autoincrement=False)
+    questions = Column(Integer, nullable=False, default=0)
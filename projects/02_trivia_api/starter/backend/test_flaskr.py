@@ -1,9 +1,18 @@
 import os
+import sqlite3
+import tempfile
 import unittest
 import json
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.exc import TimeoutError
+from fsnd_common.metrics import MmapValues
+from fsnd_common.pool import MeteredQueuePool, engine_options
 
 from flaskr import create_app
+from flaskr.cache import MemoryResponseCache, SqliteResponseCache
+from flaskr.instrument import RequestQueries
+from flaskr.sessions import MemorySessionStore
+from flaskr.versions import TableVersions
 from models import setup_db, Question, Category, db
 
 
@@ -12,7 +21,7 @@ class TriviaTestCase(unittest.TestCase):
 
     def setUp(self):
         """Define test variables and initialize app."""
-        self.app = create_app()
+        self.app = create_app({'OPS_ENDPOINTS': True})
         self.app.testing = True
         self.client = self.app.test_client
         self.database_name = "trivia_test"
@@ -29,7 +38,9 @@ class TriviaTestCase(unittest.TestCase):
 
     def tearDown(self):
         """Executed after reach test"""
-        pass
+        # Helpers query outside of a request, drop their session so the
+        # next test does not reuse it with this test's app
+        self.db.session.remove()
 
     def create_test_question(self):
         sql = """INSERT INTO QUESTIONS
@@ -75,6 +86,44 @@ class TriviaTestCase(unittest.TestCase):
         self.assertTrue(data['total_questions'])
         self.assertTrue(data['categories'])
 
+    def test_paginate_questions_with_cursor(self):
+        res = self.client().get('/questions?page=1')
+        first_page = json.loads(res.data)
+
+        self.assertEqual(1, first_page['page'])
+        self.assertTrue(first_page['next_cursor'])
+
+        res = self.client().get(
+            '/questions?cursor=' + first_page['next_cursor'])
+        data = json.loads(res.data)
+
+        self.assertEqual(200, res.status_code)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(2, data['page'])
+        self.assertTrue(data['questions'])
+        self.assertGreater(data['questions'][0]['id'],
+                           first_page['questions'][-1]['id'])
+
+        res = self.client().get('/questions?page=2')
+        self.assertEqual(data['questions'], json.loads(res.data)['questions'])
+
+    def test_400_sent_for_invalid_cursor(self):
+        res = self.client().get('/questions?cursor=not-a-cursor')
+        data = json.loads(res.data)
+
+        self.assertEqual(400, res.status_code)
+        self.assertEqual(False, data['success'])
+        self.assertEqual('Invalid page cursor', data['message'])
+
+    def test_400_sent_for_page_below_one(self):
+        for page in (0, -1):
+            res = self.client().get(f'/questions?page={page}')
+            data = json.loads(res.data)
+
+            self.assertEqual(400, res.status_code)
+            self.assertEqual(False, data['success'])
+            self.assertEqual('Invalid page number', data['message'])
+
     def test_404_sent_requesting_beyond_valid_page(self):
         res = self.client().get('/questions?page=1000')
         data = json.loads(res.data)
@@ -128,6 +177,236 @@ class TriviaTestCase(unittest.TestCase):
             Question.question == 'TEST_QUESTION').one_or_none()
         question.delete()
 
+    def test_total_questions_follows_writes(self):
+        res = self.client().get('/questions')
+        total = json.loads(res.data)['total_questions']
+
+        res = self.client().post('/questions',
+                                 json={'question': 'TEST_QUESTION',
+                                       'answer': 'This is a test answer',
+                                       'category': '4',
+                                       'difficulty': 2})
+        data = json.loads(res.data)
+        self.assertEqual(total + 1, data['total_questions'])
+
+        res = self.client().delete('/questions/{}'.format(data['id']))
+        data = json.loads(res.data)
+        self.assertEqual(total, data['total_questions'])
+
+        res = self.client().get('/questions')
+        self.assertEqual(total, json.loads(res.data)['total_questions'])
+
+    def delete_imported_questions(self):
+        Question.query.filter(Question.question.like('TEST_IMPORT%')).delete(
+            synchronize_session=False)
+        self.db.session.commit()
+
+    def test_import_questions(self):
+        self.delete_imported_questions()
+        lines = [
+            json.dumps({'question': 'TEST_IMPORT 1', 'answer': 'A',
+                        'category': 1, 'difficulty': 1}),
+            '',
+            'not json',
+            json.dumps({'question': 'TEST_IMPORT 2', 'answer': 'B',
+                        'category': 2}),
+            json.dumps({'question': 'TEST_IMPORT 3', 'answer': 'C',
+                        'category': 100, 'difficulty': 1}),
+            json.dumps({'id': 5, 'question': 'TEST_IMPORT 4', 'answer': 'D',
+                        'category': '6', 'difficulty': '5'}),
+        ]
+        res = self.client().post('/questions/import', data='\n'.join(lines),
+                                 content_type='application/x-ndjson')
+        data = json.loads(res.data)
+
+        self.assertEqual(200, res.status_code)
+        self.assertEqual(2, data['imported'])
+        self.assertEqual(3, data['failed'])
+        self.assertEqual([3, 4, 5],
+                         [error['line'] for error in data['errors']])
+        self.assertEqual('Missing difficulty property',
+                         data['errors'][1]['message'])
+        self.assertEqual(2, Question.query.filter(
+            Question.question.like('TEST_IMPORT%')).count())
+
+        self.delete_imported_questions()
+
+    def test_import_questions_csv(self):
+        self.delete_imported_questions()
+        body = ('question,answer,category,difficulty\n'
+                '"TEST_IMPORT, with comma",A,3,2\n'
+                'TEST_IMPORT 2,B,3,2,extra\n')
+
+        res = self.client().post('/questions/import', data=body,
+                                 content_type='text/csv')
+        data = json.loads(res.data)
+
+        self.assertEqual(200, res.status_code)
+        self.assertEqual(1, data['imported'])
+        self.assertEqual([{'line': 3, 'message': 'Too many columns'}],
+                         data['errors'])
+
+        self.delete_imported_questions()
+
+    def test_export_questions(self):
+        self.delete_test_question()
+        self.create_test_question()
+
+        res = self.client().get('/questions/export')
+        rows = [json.loads(line) for line in res.data.decode().splitlines()]
+
+        self.assertEqual(200, res.status_code)
+        self.assertEqual('application/x-ndjson', res.mimetype)
+        self.assertEqual(Question.query.count(), len(rows))
+        self.assertIn({'id': 1000, 'question': 'This is a test question',
+                       'answer': 'This is a test answer', 'category': 4,
+                       'difficulty': 2}, rows)
+
+        res = self.client().get('/questions/export?format=csv')
+        lines = res.data.decode().splitlines()
+
+        self.assertEqual('id,question,answer,category,difficulty', lines[0])
+        self.assertEqual(len(rows) + 1, len(lines))
+
+        self.delete_test_question()
+
+    def test_minimal_write_responses(self):
+        res = self.client().post('/questions?response=minimal',
+                                 json={'question': 'TEST_QUESTION',
+                                       'answer': 'This is a test answer',
+                                       'category': '4',
+                                       'difficulty': 2})
+        data = json.loads(res.data)
+
+        self.assertEqual(200, res.status_code)
+        self.assertEqual(['id', 'success', 'total_questions'],
+                         sorted(data))
+
+        res = self.client().delete('/questions/{}'.format(data['id']),
+                                   headers={'Prefer': 'return=minimal'})
+        deleted = json.loads(res.data)
+
+        self.assertEqual(200, res.status_code)
+        self.assertEqual('return=minimal',
+                         res.headers['Preference-Applied'])
+        self.assertEqual(['deleted', 'success', 'total_questions'],
+                         sorted(deleted))
+        self.assertEqual(data['total_questions'] - 1,
+                         deleted['total_questions'])
+
+    def test_question_stats(self):
+        result = self.app.test_cli_runner().invoke(
+            args=['rebuild-question-stats'])
+        self.assertEqual(
+            'Counted {} questions\n'.format(Question.query.count()),
+            result.output)
+
+        res = self.client().get('/questions/stats')
+        data = json.loads(res.data)
+        science = data['categories'][0]
+
+        self.assertEqual(200, res.status_code)
+        self.assertEqual(True, data['success'])
+        self.assertEqual(Question.query.count(), data['total_questions'])
+        self.assertEqual(Question.query.filter(
+            Question.category == science['id']).count(),
+            science['total_questions'])
+        self.assertEqual(Question.query.filter(
+            Question.difficulty == 2).count(), data['difficulties']['2'])
+        self.assertEqual(0, data['uncategorized'])
+
+    def test_question_stats_follow_writes(self):
+        self.delete_imported_questions()
+        self.app.test_cli_runner().invoke(args=['rebuild-question-stats'])
+        before = json.loads(self.client().get('/questions/stats').data)
+
+        question = Question('TEST_IMPORT stats', 'A', '1', 1)
+        question.insert()
+        question.difficulty = 5
+        question.update()
+        question_id = question.id
+        self.client().post('/questions/batch', json={'operations': [
+            {'action': 'update', 'ids': [question_id],
+             'values': {'category': 2}}]})
+        after = json.loads(self.client().get('/questions/stats').data)
+
+        self.assertEqual(before['total_questions'] + 1,
+                         after['total_questions'])
+        self.assertEqual(before['categories'][0],
+                         after['categories'][0])
+        self.assertEqual(
+            before['categories'][1]['difficulties'].get('5', 0) + 1,
+            after['categories'][1]['difficulties']['5'])
+        self.assertEqual(before['difficulties'].get('5', 0) + 1,
+                         after['difficulties']['5'])
+
+        self.client().delete('/questions/{}'.format(question_id))
+        after = json.loads(self.client().get('/questions/stats').data)
+
+        self.assertEqual(before, after)
+
+    def test_batch_questions(self):
+        self.delete_imported_questions()
+        self.app.test_cli_runner().invoke(args=['rebuild-question-stats'])
+        ids = []
+        for number in range(3):
+            question = Question('TEST_IMPORT {}'.format(number), 'A', '1', 1)
+            question.insert()
+            ids.append(question.id)
+
+        res = self.client().post('/questions/batch', json={'operations': [
+            {'action': 'update', 'ids': ids[:2],
+             'values': {'difficulty': 5, 'category': 2}},
+            {'action': 'delete', 'ids': ids,
+             'filter': {'category': 2, 'difficulty': 5}},
+        ]})
+        data = json.loads(res.data)
+
+        self.assertEqual(200, res.status_code)
+        self.assertEqual([2, 2], data['affected'])
+        self.assertEqual(4, data['total_affected'])
+        self.assertEqual([ids[2]], [question.id for question in
+                                    Question.query.filter(
+                                        Question.id.in_(ids)).all()])
+
+        # The batch kept the counters matching a full recount
+        counted = json.loads(self.client().get('/questions/stats').data)
+        self.app.test_cli_runner().invoke(args=['rebuild-question-stats'])
+        self.assertEqual(counted, json.loads(
+            self.client().get('/questions/stats').data))
+
+        self.delete_imported_questions()
+
+    def test_batch_questions_is_all_or_nothing(self):
+        res = self.client().post('/questions/batch', json={'operations': [
+            {'action': 'delete', 'ids': [1000]},
+            {'action': 'update', 'filter': {'category': 1},
+             'values': {'category': 100}},
+        ]})
+        data = json.loads(res.data)
+
+        self.assertEqual(422, res.status_code)
+        self.assertEqual('Unknown category 100', data['message'])
+
+        res = self.client().post('/questions/batch', json={'operations': [
+            {'action': 'delete', 'filter': {}},
+        ]})
+        data = json.loads(res.data)
+
+        self.assertEqual(422, res.status_code)
+        self.assertEqual('Batch operation needs ids or a filter',
+                         data['message'])
+
+        for filters in (['category'], 'category', 1):
+            res = self.client().post('/questions/batch', json={'operations': [
+                {'action': 'delete', 'filter': filters},
+            ]})
+            data = json.loads(res.data)
+
+            self.assertEqual(422, res.status_code)
+            self.assertEqual('Batch filter must be an object',
+                             data['message'])
+
     def test_missing_question(self):
         res = self.client().post('/questions',
                                  json={'answer': 'This is a test answer',
@@ -195,6 +474,32 @@ class TriviaTestCase(unittest.TestCase):
 
         self.delete_test_question()
 
+    def test_search_matches_answer(self):
+        self.delete_test_question()
+        self.create_test_question()
+
+        res = self.client().post('/questions/search',
+                                 json={'searchTerm': 'test answ'})
+        data = json.loads(res.data)
+
+        self.assertEqual(200, res.status_code)
+        self.assertEqual(True, data['success'])
+        self.assertEqual(1000, data['questions'][0]['id'])
+        self.assertEqual(1, data['page'])
+
+        res = self.client().post('/questions/search',
+                                 json={'searchTerm': 'test answ', 'page': 2})
+        self.assertEqual(404, res.status_code)
+
+        for page in (0, -1):
+            res = self.client().post('/questions/search', json={
+                'searchTerm': 'test answ', 'page': page})
+            self.assertEqual(422, res.status_code)
+            self.assertEqual('Invalid page number',
+                             json.loads(res.data)['message'])
+
+        self.delete_test_question()
+
     def test_search_for_question_no_result(self):
         res = self.client().post('/questions/search',
                                  json={'searchTerm': 'zzzz'})
@@ -206,6 +511,22 @@ class TriviaTestCase(unittest.TestCase):
             'Unable to locate any questions based on search term zzzz',
             data['message'])
 
+    def test_search_for_stop_words(self):
+        # Stop words are kept in the search vector, as in InvertedIndex
+        for search_term in ('the', 'Who', 'What is'):
+            res = self.client().post('/questions/search',
+                                     json={'searchTerm': search_term})
+            data = json.loads(res.data)
+
+            self.assertEqual(200, res.status_code, search_term)
+            self.assertEqual(True, data['success'])
+            self.assertTrue(data['totalQuestions'])
+            for question in data['questions']:
+                text = (question['question'] + ' ' +
+                        question['answer']).lower()
+                for word in search_term.lower().split():
+                    self.assertIn(word, text)
+
     def test_get_questions_for_category(self):
         res = self.client().get('/categories/0/questions')
         data = json.loads(res.data)
@@ -214,6 +535,371 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(True, data['success'])
         self.assertTrue(data['questions'])
 
+    def test_get_questions_for_category_in_id_order(self):
+        res = self.client().get('/categories/0/questions')
+        data = json.loads(res.data)
+        ids = [question['id'] for question in data['questions']]
+
+        self.assertEqual(sorted(ids), ids)
+        self.assertEqual({1}, {question['category']
+                               for question in data['questions']})
+        self.assertEqual(Question.query.filter(
+            Question.category == 1).count(), data['total_questions'])
+
+    def test_database_pool(self):
+        res = self.client().get('/db/pool')
+        data = json.loads(res.data)
+
+        self.assertEqual(200, res.status_code)
+        self.assertEqual('MeteredQueuePool', data['pool'])
+        self.assertEqual(0, data['checked_out'])
+        self.assertEqual(0, data['waits'])
+
+        with self.app.app_context():
+            self.assertTrue(self.db.engine.pool._pre_ping)
+
+    def test_ops_endpoints_off_by_default(self):
+        client = create_app().test_client()
+
+        for path in ('/db/pool', '/db/queries', '/metrics'):
+            self.assertEqual(404, client.get(path).status_code)
+
+    def test_database_pool_counts_waits(self):
+        pool = MeteredQueuePool(lambda: sqlite3.connect(':memory:'),
+                                pool_size=1, max_overflow=0, timeout=0.01)
+        connection = pool.connect()
+
+        self.assertRaises(TimeoutError, pool.connect)
+        self.assertEqual(1, pool.waits)
+        self.assertGreater(pool.wait_time, 0)
+
+        connection.close()
+        pool.connect().close()
+        self.assertEqual(1, pool.waits)
+
+    def test_engine_options(self):
+        options = engine_options('postgres://localhost:5432/trivia',
+                                 {'DB_POOL_SIZE': '2',
+                                  'DB_POOL_PRE_PING': 'false',
+                                  'DB_STATEMENT_TIMEOUT': 5000})
+
+        self.assertIs(MeteredQueuePool, options['poolclass'])
+        self.assertEqual(2, options['pool_size'])
+        self.assertFalse(options['pool_pre_ping'])
+        self.assertEqual('-c statement_timeout=5000',
+                         options['connect_args']['options'])
+        self.assertEqual({'pool_pre_ping': True},
+                         engine_options('sqlite:///trivia.db'))
+
+    def test_query_instrumentation(self):
+        res = self.client().get('/questions')
+
+        self.assertEqual(200, res.status_code)
+        self.assertRegex(res.headers['Server-Timing'],
+                         r'^db;dur=[0-9.]+;desc="[1-9][0-9]* queries", '
+                         r'serialize;dur=[0-9.]+, total;dur=[0-9.]+$')
+
+        res = self.client().get('/db/queries')
+        data = json.loads(res.data)
+        stats = data['endpoints']['get_questions']
+
+        self.assertEqual(200, res.status_code)
+        self.assertEqual(1, stats['requests'])
+        self.assertTrue(stats['queries'])
+        self.assertTrue(stats['rows'])
+
+    def test_slow_query_log(self):
+        app = create_app({'SLOW_QUERY_MS': 0})
+
+        with self.assertLogs('flaskr.instrument', 'WARNING') as logs:
+            app.test_client().get('/categories/0/questions')
+
+        self.assertIn('Slow query took', logs.output[0])
+
+    def test_n_plus_one_warning(self):
+        queries = RequestQueries()
+
+        with self.app.test_request_context('/questions'):
+            with self.assertLogs('flaskr.instrument', 'WARNING') as logs:
+                for _ in range(4):
+                    queries.record('SELECT 1', 0.001, 1, 3)
+
+        self.assertEqual(1, len(logs.output))
+        self.assertIn('statement ran 3 times in one request to get_questions',
+                      logs.output[0])
+        self.assertEqual(4, queries.count)
+
+    def test_metrics(self):
+        self.client().get('/questions')
+        res = self.client().get('/metrics')
+        text = res.data.decode('utf-8')
+
+        self.assertEqual(200, res.status_code)
+        self.assertIn('# TYPE http_request_duration_seconds histogram', text)
+        self.assertIn('http_requests_total{method="GET",'
+                      'route="/questions",status="200"} 1\n', text)
+        self.assertIn('http_request_duration_seconds_bucket{le="+Inf",'
+                      'method="GET",route="/questions"} 1\n', text)
+        self.assertIn('http_requests_in_flight 1\n', text)
+        self.assertIn('db_pool_checked_out ', text)
+        self.assertIn('response_cache_misses_total 1\n', text)
+
+    def test_metrics_shared_between_workers(self):
+        directory = tempfile.mkdtemp()
+        # A worker that has exited, its gauges no longer count
+        other = MmapValues(os.path.join(directory, 'metrics_999999999.db'))
+        other.add('counter|http_requests_total{method="GET",'
+                  'route="/questions",status="200"}', 2)
+        other.add('gauge|http_requests_in_flight', 3)
+
+        client = create_app({'METRICS_DIR': directory,
+                             'OPS_ENDPOINTS': True}).test_client()
+        client.get('/questions')
+        text = client.get('/metrics').data.decode('utf-8')
+
+        self.assertIn('http_requests_total{method="GET",'
+                      'route="/questions",status="200"} 3\n', text)
+        self.assertIn('http_requests_in_flight 1\n', text)
+
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+
+    def test_response_cache(self):
+        search = {'searchTerm': 'title'}
+        res = self.client().post('/questions/search', json=search)
+        self.assertEqual('MISS', res.headers['X-Cache'])
+
+        res = self.client().post('/questions/search', json=search)
+        self.assertEqual('HIT', res.headers['X-Cache'])
+        self.assertTrue(json.loads(res.data)['questions'])
+
+        res = self.client().get('/categories/0/questions')
+        total = json.loads(res.data)['total_questions']
+        res = self.client().get('/categories/0/questions')
+        self.assertEqual('HIT', res.headers['X-Cache'])
+
+        res = self.client().post('/questions?response=minimal',
+                                 json={'question': 'TEST_QUESTION',
+                                       'answer': 'This is a test answer',
+                                       'category': '0',
+                                       'difficulty': 2})
+        question_id = json.loads(res.data)['id']
+
+        res = self.client().get('/categories/0/questions')
+        self.assertEqual('MISS', res.headers['X-Cache'])
+        self.assertEqual(total + 1, json.loads(res.data)['total_questions'])
+
+        self.client().delete('/questions/{}'.format(question_id))
+
+        res = self.client().get('/cache/stats')
+        data = json.loads(res.data)
+
+        self.assertEqual(200, res.status_code)
+        self.assertEqual(2, data['hits'])
+        self.assertEqual(3, data['misses'])
+        self.assertTrue(data['invalidations'])
+
+    def test_response_cache_sees_writes_from_other_workers(self):
+        other = create_app()
+        other.testing = True
+        setup_db(other, self.database_path)
+
+        res = self.client().get('/categories/0/questions')
+        total = json.loads(res.data)['total_questions']
+        res = self.client().get('/categories/0/questions')
+        self.assertEqual('HIT', res.headers['X-Cache'])
+
+        res = other.test_client().post(
+            '/questions?response=minimal',
+            json={'question': 'TEST_QUESTION',
+                  'answer': 'This is a test answer',
+                  'category': '0',
+                  'difficulty': 2})
+        question_id = json.loads(res.data)['id']
+
+        res = self.client().get('/categories/0/questions')
+        self.assertEqual('MISS', res.headers['X-Cache'])
+        self.assertEqual(total + 1, json.loads(res.data)['total_questions'])
+
+        other.test_client().delete('/questions/{}'.format(question_id))
+
+    def test_response_cache_eviction(self):
+        cache = MemoryResponseCache(ttl=60, limit=2)
+        cache.set('a', 'A', ['questions'], cache.generation())
+        cache.set('b', 'B', ['category:1'], cache.generation())
+        self.assertEqual('A', cache.get('a'))
+        cache.set('c', 'C', ['category:2'], cache.generation())
+
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(1, cache.invalidate(['category:2']))
+        self.assertIsNone(cache.get('c'))
+
+        generation = cache.generation()
+        cache.invalidate(['questions'])
+        self.assertFalse(cache.set('d', 'D', [], generation))
+        self.assertEqual({'hits': 1, 'misses': 2, 'evictions': 1,
+                          'expirations': 0, 'invalidations': 2,
+                          'entries': 0}, cache.stats())
+
+        cache = MemoryResponseCache(ttl=0)
+        cache.set('e', 'E', [], cache.generation())
+        self.assertIsNone(cache.get('e'))
+        self.assertEqual(1, cache.stats()['expirations'])
+
+    def test_response_cache_shared_through_file(self):
+        fd, path = tempfile.mkstemp(suffix='.db')
+        try:
+            first = SqliteResponseCache(path, ttl=60, limit=2)
+            second = SqliteResponseCache(path, ttl=60, limit=2)
+            value = (200, 'application/json', b'{}')
+
+            first.set('a', value, ['questions'], first.generation())
+            second.set('b', value, ['category:1'], second.generation())
+            self.assertEqual(value, second.get('a'))
+
+            second.set('c', value, ['category:2'], second.generation())
+            self.assertIsNone(first.get('b'))
+
+            self.assertEqual(1, first.invalidate(['questions', 'x']))
+            self.assertIsNone(second.get('a'))
+            self.assertEqual({'hits': 1, 'misses': 2, 'evictions': 1,
+                              'expirations': 0, 'invalidations': 1,
+                              'entries': 1}, second.stats())
+        finally:
+            os.close(fd)
+            os.remove(path)
+            for suffix in ('-wal', '-shm'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+
+    def test_conditional_get(self):
+        res = self.client().get('/categories/0/questions')
+        etag = res.headers['ETag']
+
+        self.assertEqual(200, res.status_code)
+        self.assertIn('must-revalidate', res.headers['Cache-Control'])
+
+        res = self.client().get('/categories/0/questions',
+                                headers={'If-None-Match': etag})
+
+        self.assertEqual(304, res.status_code)
+        self.assertEqual(b'', res.data)
+        self.assertEqual(etag, res.headers['ETag'])
+
+        res = self.client().post('/questions?response=minimal',
+                                 json={'question': 'TEST_QUESTION',
+                                       'answer': 'This is a test answer',
+                                       'category': '0',
+                                       'difficulty': 2})
+        question_id = json.loads(res.data)['id']
+
+        res = self.client().get('/categories/0/questions',
+                                headers={'If-None-Match': etag})
+        data = json.loads(res.data)
+
+        self.assertEqual(200, res.status_code)
+        self.assertNotEqual(etag, res.headers['ETag'])
+        self.assertIn(question_id, [question['id']
+                                    for question in data['questions']])
+
+        self.client().delete('/questions/{}'.format(question_id))
+
+    def test_conditional_get_per_stream_format(self):
+        res = self.client().get('/categories/0/questions')
+        etag = res.headers['ETag']
+
+        self.assertIn('Accept', res.headers['Vary'])
+
+        res = self.client().get(
+            '/categories/0/questions',
+            headers={'Accept': 'application/x-ndjson',
+                     'If-None-Match': etag})
+        ndjson_etag = res.headers['ETag']
+
+        self.assertEqual(200, res.status_code)
+        self.assertEqual('application/x-ndjson', res.mimetype)
+        self.assertNotEqual(etag, ndjson_etag)
+        self.assertIn('Accept', res.headers['Vary'])
+
+        res = self.client().get(
+            '/categories/0/questions',
+            headers={'Accept': 'application/x-ndjson',
+                     'If-None-Match': ndjson_etag})
+
+        self.assertEqual(304, res.status_code)
+
+        res = self.client().get('/categories/0/questions?stream=json',
+                                headers={'If-None-Match': etag})
+
+        self.assertEqual(200, res.status_code)
+        self.assertNotIn(res.headers['ETag'], (etag, ndjson_etag))
+
+    def test_table_versions_shared_between_apps_by_default(self):
+        other = create_app()
+        versions = self.app.extensions['trivia_versions']
+        shared = other.extensions['trivia_versions']
+        version = versions.get('questions')
+
+        self.assertEqual(versions.token, shared.token)
+        self.assertEqual(version + 1, shared.bump('questions'))
+        self.assertEqual(version + 1, versions.get('questions'))
+
+    def test_table_versions_shared_through_file(self):
+        fd, path = tempfile.mkstemp(suffix='.versions')
+        try:
+            first = TableVersions(path=path)
+            second = TableVersions(path=path)
+            etag = second.etag(['questions', 'categories'])
+
+            self.assertEqual(first.token, second.token)
+            self.assertEqual(1, first.bump('questions'))
+            self.assertEqual(1, second.get('questions'))
+            self.assertNotEqual(etag,
+                                second.etag(['questions', 'categories']))
+        finally:
+            os.close(fd)
+            os.remove(path)
+
+    def test_stream_category_questions(self):
+        res = self.client().get('/categories/0/questions')
+        expected = json.loads(res.data)
+
+        res = self.client().get('/categories/0/questions?stream=json')
+
+        self.assertEqual(200, res.status_code)
+        self.assertEqual(expected, json.loads(res.data))
+
+        res = self.client().get(
+            '/categories/0/questions',
+            headers={'Accept': 'application/x-ndjson'})
+        lines = res.data.decode('utf-8').splitlines()
+
+        self.assertEqual(200, res.status_code)
+        self.assertEqual('application/x-ndjson', res.mimetype)
+        self.assertEqual(expected['questions'],
+                         [json.loads(line) for line in lines])
+
+    def test_stream_search_results(self):
+        res = self.client().post('/questions/search?stream=json',
+                                 json={'searchTerm': 'title'})
+        data = json.loads(res.data)
+
+        self.assertEqual(200, res.status_code)
+        self.assertEqual(True, data['success'])
+        self.assertEqual(len(data['questions']), data['totalQuestions'])
+        self.assertEqual(len(data['questions']), data['total_questions'])
+
+        res = self.client().post('/questions/search?stream=ndjson',
+                                 json={'searchTerm': 'NoSuchWordAnywhere'})
+
+        self.assertEqual(404, res.status_code)
+
+        res = self.client().post('/questions/search?stream=xml',
+                                 json={'searchTerm': 'title'})
+
+        self.assertEqual(422, res.status_code)
+
     def test_get_questions_fail_missing_category(self):
         res = self.client().get('/categories/100/questions')
         data = json.loads(res.data)
@@ -238,6 +924,140 @@ class TriviaTestCase(unittest.TestCase):
         self.assertTrue(data['question']['question'])
         self.assertTrue(data['question_count'])
 
+    def test_get_quiz_skips_previous_questions(self):
+        science = [question.id for question in Question.query.filter(
+            Question.category == '1').all()]
+        unseen = science.pop()
+
+        res = self.client().post('/quizzes', json={
+            "previous_questions": science,
+            "quiz_category": {"type": "Science", "id": "0"}})
+        data = json.loads(res.data)
+
+        self.assertEqual(200, res.status_code)
+        self.assertEqual(True, data['success'])
+        self.assertEqual(unseen, data['question']['id'])
+        self.assertEqual(1, data['question_count'])
+
+    def test_get_quiz_category_exhausted(self):
+        science = [question.id for question in Question.query.filter(
+            Question.category == '1').all()]
+
+        res = self.client().post('/quizzes', json={
+            "previous_questions": science,
+            "quiz_category": {"type": "Science", "id": "0"}})
+        data = json.loads(res.data)
+
+        self.assertEqual(200, res.status_code)
+        self.assertEqual(False, data['success'])
+        self.assertEqual(None, data['question'])
+
+    def test_get_quiz_invalid_previous_questions(self):
+        for previous_questions in ('1,2', [{'id': 1}], ['1'], [True], {}):
+            res = self.client().post('/quizzes', json={
+                "previous_questions": previous_questions,
+                "quiz_category": {"type": "Science", "id": "0"}})
+            data = json.loads(res.data)
+
+            self.assertEqual(422, res.status_code)
+            self.assertEqual(False, data['success'])
+
+    def test_get_quiz_malformed_body(self):
+        res = self.client().post('/quizzes')
+
+        self.assertEqual(400, res.status_code)
+
+        for body in ([], 'Science', 1):
+            res = self.client().post('/quizzes', json=body)
+            data = json.loads(res.data)
+
+            self.assertEqual(400, res.status_code)
+            self.assertEqual('Request body must be a JSON object',
+                             data['message'])
+
+        res = self.client().post('/quizzes', json={'previous_questions': []})
+        data = json.loads(res.data)
+
+        self.assertEqual(422, res.status_code)
+        self.assertEqual('Missing quiz category property', data['message'])
+
+        for quiz_category in ('Science', {'id': '0'},
+                              {'type': 'Science'},
+                              {'type': 'Science', 'id': 'one'}):
+            for path in ('/quizzes', '/quizzes/sessions'):
+                res = self.client().post(path, json={
+                    'quiz_category': quiz_category})
+                data = json.loads(res.data)
+
+                self.assertEqual(422, res.status_code)
+                self.assertEqual(False, data['success'])
+
+    def play_quiz_session(self, client):
+        res = client.post('/quizzes/sessions', json={
+            "quiz_category": {"type": "Science", "id": "0"}})
+        data = json.loads(res.data)
+
+        self.assertEqual(200, res.status_code)
+        self.assertEqual(True, data['success'])
+        session_id = data['session_id']
+        question_count = data['question_count']
+
+        seen = set()
+        for remaining in range(question_count, 0, -1):
+            res = client.post(f'/quizzes/sessions/{session_id}/next')
+            data = json.loads(res.data)
+
+            self.assertEqual(True, data['success'])
+            self.assertEqual(remaining, data['question_count'])
+            self.assertNotIn(data['question']['id'], seen)
+            seen.add(data['question']['id'])
+
+        res = client.post(f'/quizzes/sessions/{session_id}/next')
+        data = json.loads(res.data)
+        self.assertEqual(False, data['success'])
+
+        res = client.delete(f'/quizzes/sessions/{session_id}')
+        self.assertEqual(200, res.status_code)
+
+        res = client.post(f'/quizzes/sessions/{session_id}/next')
+        self.assertEqual(404, res.status_code)
+
+    def test_quiz_session(self):
+        self.play_quiz_session(self.client())
+
+    def test_quiz_session_in_local_store(self):
+        fd, path = tempfile.mkstemp(suffix='.db')
+        try:
+            app = create_app({'QUIZ_SESSION_DB': path})
+            app.testing = True
+            self.play_quiz_session(app.test_client())
+        finally:
+            os.close(fd)
+            os.remove(path)
+
+    def test_quiz_session_not_found(self):
+        res = self.client().delete('/quizzes/sessions/nope')
+        data = json.loads(res.data)
+
+        self.assertEqual(404, res.status_code)
+        self.assertEqual(False, data['success'])
+        self.assertEqual('Quiz session nope not found!', data['message'])
+
+    def test_quiz_sessions_are_bounded(self):
+        store = MemorySessionStore(ttl=60, limit=2)
+        first = store.create([1])[0]
+        second = store.create([2])[0]
+        self.assertEqual((1, 1), store.pop(first))
+        third = store.create([3])[0]
+
+        self.assertRaises(KeyError, store.pop, second)
+        self.assertEqual((None, 0), store.pop(first))
+        self.assertEqual((3, 1), store.pop(third))
+
+        store = MemorySessionStore(ttl=0)
+        expired = store.create([4])[0]
+        self.assertRaises(KeyError, store.pop, expired)
+
     def test_get_quiz_no_category(self):
         res = self.client().post('/quizzes', json={"previous_questions": [30],
                                                    "quiz_category": {
@@ -250,6 +1070,123 @@ class TriviaTestCase(unittest.TestCase):
             'Provided category id 1000 not found!', data['message'])
 
 
+class SearchIndexTestCase(unittest.TestCase):
+    """This class covers search on databases without full-text search"""
+
+    def setUp(self):
+        self.app = create_app()
+        self.app.testing = True
+        self.client = self.app.test_client
+        self.db_fd, self.db_file = tempfile.mkstemp(suffix='.db')
+        self.db = setup_db(self.app, 'sqlite:///' + self.db_file)
+
+        with self.app.app_context():
+            self.db.create_all()
+            Question('Who painted the Mona Lisa?', 'Leonardo da Vinci',
+                     '2', 3).insert()
+            Question('Which painter cut off his ear?', 'Van Gogh',
+                     '2', 2).insert()
+            Question('What is the heaviest organ?', 'The liver',
+                     '1', 4).insert()
+
+    def tearDown(self):
+        self.db.session.remove()
+        os.close(self.db_fd)
+        os.remove(self.db_file)
+
+    def test_search_ranks_question_hits_first(self):
+        with self.app.app_context():
+            Question('Name the largest ocean', 'Pacific, not the painter',
+                     '3', 1).insert()
+
+        res = self.client().post('/questions/search',
+                                 json={'searchTerm': 'PAINT'})
+        data = json.loads(res.data)
+
+        self.assertEqual(200, res.status_code)
+        self.assertEqual(3, data['totalQuestions'])
+        self.assertEqual('Name the largest ocean',
+                         data['questions'][-1]['question'])
+
+    def test_search_requires_every_word(self):
+        res = self.client().post('/questions/search',
+                                 json={'searchTerm': 'painter ear'})
+        data = json.loads(res.data)
+
+        self.assertEqual(200, res.status_code)
+        self.assertEqual(1, data['totalQuestions'])
+        self.assertEqual('Van Gogh', data['questions'][0]['answer'])
+
+
+class ReadReplicaTestCase(unittest.TestCase):
+    """This class covers routing reads to a read replica"""
+
+    def setUp(self):
+        self.db_files = [tempfile.mkstemp(suffix='.db') for _ in range(2)]
+        primary, replica = ['sqlite:///' + path
+                            for fd, path in self.db_files]
+        self.app = create_app({'SQLALCHEMY_DATABASE_URI': primary,
+                               'DATABASE_REPLICA_URLS': replica,
+                               'RESPONSE_CACHE_SIZE': 0})
+        self.app.testing = True
+        self.client = self.app.test_client
+
+        with self.app.app_context():
+            db.create_all()
+            db.Model.metadata.create_all(
+                db.get_engine(self.app, bind='replica_1'))
+            Question('Which ocean is the largest?', 'Pacific',
+                     2, 1).insert()
+            db.get_engine(self.app, bind='replica_1').execute(
+                Question.__table__.insert(),
+                question='Which sea is the saltiest?', answer='Dead Sea',
+                category=2, difficulty=1)
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.get_engine(self.app).dispose()
+            db.get_engine(self.app, bind='replica_1').dispose()
+
+        for fd, path in self.db_files:
+            os.close(fd)
+            os.remove(path)
+
+    def test_reads_go_to_replica(self):
+        res = self.client().get('/categories/1/questions')
+        data = json.loads(res.data)
+
+        self.assertEqual(200, res.status_code)
+        self.assertEqual(['Dead Sea'], [question['answer']
+                                        for question in data['questions']])
+
+        res = self.client().post('/questions/search',
+                                 json={'searchTerm': 'sea'})
+        data = json.loads(res.data)
+
+        self.assertEqual(200, res.status_code)
+        self.assertEqual('Dead Sea', data['questions'][0]['answer'])
+
+    def test_writes_go_to_primary(self):
+        res = self.client().post('/questions',
+                                 json={'question': 'Which lake is deepest?',
+                                       'answer': 'Baikal',
+                                       'category': '1',
+                                       'difficulty': 3})
+        data = json.loads(res.data)
+
+        self.assertEqual(200, res.status_code)
+        self.assertEqual(2, data['total_questions'])
+        self.assertEqual(['Pacific', 'Baikal'],
+                         [question['answer']
+                          for question in data['questions']])
+
+        with self.app.app_context():
+            answers = [question.answer for question in Question.query]
+
+        self.assertEqual(['Pacific', 'Baikal'], answers)
+
+
 # Make the tests conveniently executable
 if __name__ == "__main__":
     unittest.main()
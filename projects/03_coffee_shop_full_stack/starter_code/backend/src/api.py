@@ -3,13 +3,17 @@ from flask import Flask, request, jsonify, abort
 from sqlalchemy import exc
 import json
 from flask_cors import CORS
+from fsnd_common.metrics import Metrics, sqlalchemy_pool_collector
+from fsnd_common.pool import pool_stats
 
-from .database.models import db_drop_and_create_all, setup_db, Drink
+from .database.models import db, db_drop_and_create_all, setup_db, Drink
 from .auth.auth import AuthError, requires_auth
 
 app = Flask(__name__)
 setup_db(app)
 CORS(app)
+metrics = Metrics(app)
+metrics.add_collector(sqlalchemy_pool_collector(db))
 
 '''
 @TODO uncomment the following line to initialize the datbase
@@ -19,6 +23,17 @@ CORS(app)
 # db_drop_and_create_all()
 
 ## ROUTES
+
+'''
+GET /db/pool
+    database connection pool state and wait counters
+    it requires the 'get:db-pool' permission
+'''
+@app.route('/db/pool', methods=['GET'])
+@requires_auth('get:db-pool')
+def database_pool_stats(payload):
+    return jsonify(dict(pool_stats(db.engine), success=True))
+
 '''
 @TODO implement endpoint
     GET /drinks